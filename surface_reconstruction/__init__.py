@@ -1,14 +1,33 @@
 from .singleton_meta import SingletonMeta
-from .open3d_surface import Open3dSurface
+from .point_cloud_io import PointCloudData, read_point_cloud
+from .mesh_data import MeshData
+from .result_cache import ResultCache
 from .surface_reconstruction import SurfaceReconstruction
 from .surface_strategy import SurfaceStrategy
-from .pymeshlab_surface import PyMeshlabSurface
 
 __all__ = [
   "SingletonMeta",
   "SurfaceStrategy",
   "Open3dSurface",
   "PyMeshlabSurface",
-  "SurfaceReconstruction"
+  "HeightfieldSurface",
+  "SurfaceReconstruction",
+  "PointCloudData",
+  "read_point_cloud",
+  "MeshData",
+  "ResultCache"
 ]
 
+# The strategies import their library (open3d, pymeshlab) only when accessed
+_lazy_strategies = {
+  "Open3dSurface": "open3d",
+  "PyMeshlabSurface": "pymeshlab",
+  "HeightfieldSurface": "heightfield"
+}
+
+
+def __getattr__(name: str):
+    if name in _lazy_strategies:
+        return SurfaceReconstruction.strategy_type(_lazy_strategies[name])
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,261 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from typing import Callable, List, Optional, Tuple, Union
+import asyncio
+import itertools
+import multiprocessing
+import os
+import time
+
+from .batch import BatchResult, init_worker, load_filters, worker_strategy, _reconstruct
+from .scheduler import core_budget, spawn_environment
+
+_job_ids = itertools.count(1)
+
+
+@dataclass
+class ProgressEvent:
+    """
+    Progress of a job: "queued", "started", "stage_start", "stage_end" (with the stage name
+    of the profiler, e.g a filter/method name), then "done", "failed" or "cancelled"
+    """
+
+    job_id: int
+    event: str
+    point_cloud_file: str
+    stage: str = ''
+    wall_time: float = 0.0
+    time: float = 0.0
+
+
+def _run_jobs(connection, method_type: str, filter_script_file: str, threads: Optional[int] = None):
+    """
+    Warm worker process: creates the strategy once, then runs the jobs received on the connection
+    (point cloud file, output file, filters) until None, sending the stages events then the result
+    of each job
+    """
+    init_worker(method_type, filter_script_file, threads=threads)
+    strategy = worker_strategy()
+
+    def send_stage(event: str, metrics):
+        connection.send(('stage_' + event, metrics.name, metrics.wall_time))
+
+    strategy.profiler.listeners.append(send_stage)
+
+    try:
+        while True:
+            try:
+                job = connection.recv()
+            except EOFError:
+                break
+
+            if job is None:
+                break
+
+            connection.send(('result', _reconstruct(*job)))
+    finally:
+        connection.close()
+
+
+def _pump(connection, process, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+    """
+    Forward the messages of a job of a worker process to the event loop, until its result or the
+    exit of the process
+    """
+    def put(message):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+        except RuntimeError:  # The event loop was closed
+            pass
+
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            break
+
+        put(message)
+        if message[0] == 'result':
+            return
+
+    process.join()
+    put(('exit', process.exitcode))
+
+
+class AsyncReconstructor:
+    """
+    Run reconstructions from an asyncio event loop. The jobs run in warm worker processes (at most
+    ``workers`` at the same time, the next ones are queued), started on the first jobs and reused by
+    the next ones, so the strategy library is imported once by process. A queued or running job is
+    cancelled by cancelling its task: its worker process is killed, and replaced by the next job.
+
+    ``await reconstructor.poisson(...)`` returns a BatchResult and reports the progress events
+    of the job to the ``on_progress`` callback.
+    """
+
+    def __init__(
+            self,
+            method_type='default',
+            workers: Optional[int] = None,
+            filter_script_file="",
+            cores: Optional[int] = None
+    ):
+        """
+        :param method_type: The strategy registered in SurfaceReconstruction
+        :param workers: Maximum number of jobs at the same time. Defaults to the number of CPUs
+        :param filter_script_file: A .mlx filter script (pymeshlab only)
+        :param cores: A core budget shared by the running jobs (at most the available cores), each
+            one getting ``cores // workers`` threads, instead of all the cores for each job
+        """
+        self.method_type = method_type
+        self.workers = workers or os.cpu_count() or 1
+        self.filter_script_file = filter_script_file
+        self.threads = max(1, core_budget(cores) // self.workers) if cores else None
+        self._context = multiprocessing.get_context('spawn')
+        self._threads = ThreadPoolExecutor(self.workers, thread_name_prefix='reconstruction')
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # The worker processes (process, connection) waiting for a job, and the running ones
+        self._idle: List[Tuple[multiprocessing.Process, Connection]] = []
+        self._processes = set()
+
+    async def __aenter__(self) -> AsyncReconstructor:
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    async def poisson(
+            self,
+            point_cloud_file: str,
+            output_file="",
+            filters: Union[str, dict] = "",
+            on_progress: Optional[Callable[[ProgressEvent], None]] = None
+    ) -> BatchResult:
+        """
+        Reconstruct a point cloud file in a worker process
+
+        :param point_cloud_file: The point cloud file
+        :param output_file: The mesh file. Defaults to "<point cloud name>_mesh.ply"
+        :param filters: The filters as a dictionary, a JSON string or a .json file path
+        :param on_progress: Called with each ProgressEvent of the job
+        :return: The job result, with the metrics of each stage
+        """
+        if not os.path.exists(point_cloud_file):
+            raise FileNotFoundError(f'The point cloud file "{point_cloud_file}" was not found')
+
+        output_file = output_file or os.path.splitext(point_cloud_file)[0] + '_mesh.ply'
+        filters = filters if isinstance(filters, dict) else load_filters(filters)
+        job_id = next(_job_ids)
+
+        def emit(event: str, stage='', wall_time=0.0):
+            if on_progress is not None:
+                on_progress(
+                    ProgressEvent(job_id, event, point_cloud_file, stage, wall_time, time.time())
+                )
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+
+        emit('queued')
+
+        try:
+            async with self._semaphore:
+                result = await self._run(point_cloud_file, output_file, filters, emit)
+        except asyncio.CancelledError:
+            emit('cancelled')
+            raise
+
+        emit('done' if result.ok else 'failed')
+        return result
+
+    def _worker(self) -> Tuple[multiprocessing.Process, Connection]:
+        """
+        An idle worker process, or a new one
+        """
+        while self._idle:
+            process, connection = self._idle.pop()
+
+            if process.is_alive():
+                return process, connection
+
+            connection.close()
+
+        connection, worker_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=_run_jobs,
+            args=(worker_connection, self.method_type, self.filter_script_file, self.threads),
+            daemon=True
+        )
+
+        with spawn_environment(self.threads):
+            process.start()
+        worker_connection.close()
+
+        return process, connection
+
+    async def _run(
+            self, point_cloud_file: str, output_file: str, filters: dict, emit: Callable
+    ) -> BatchResult:
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        process, connection = self._worker()
+        connection.send((point_cloud_file, output_file, filters))
+
+        self._processes.add(process)
+        emit('started')
+
+        pump = loop.run_in_executor(self._threads, _pump, connection, process, loop, queue)
+        result = None
+
+        try:
+            while True:
+                message = await queue.get()
+
+                if message[0] == 'result':
+                    result = message[1]
+                    break
+                elif message[0] == 'exit':
+                    break
+                else:
+                    emit(message[0], message[1], message[2])
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+        finally:
+            self._processes.discard(process)
+
+        await pump
+
+        if result is None:
+            connection.close()
+
+            result = BatchResult(
+                point_cloud_file, output_file, status='failed', worker=process.pid or 0
+            )
+            result.error = f'The worker process exited with code {process.exitcode}'
+        else:
+            self._idle.append((process, connection))
+
+        return result
+
+    def close(self):
+        """
+        Kill the running worker processes, and stop the idle ones
+        """
+        for process in list(self._processes):
+            process.kill()
+
+        for process, connection in self._idle:
+            try:
+                connection.send(None)
+            except OSError:  # The process exited
+                pass
+
+            connection.close()
+
+        self._idle = []
+
+        self._threads.shutdown(wait=False)
@@ -0,0 +1,624 @@
+from __future__ import annotations
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Iterable, List, Optional, Sequence
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from .result_cache import default_cache_dir
+
+# Fraction of the cells of a level crossed by the surface and its neighbors (the octree "band")
+SURFACE_BAND = 3.0
+
+# Coefficients of (intercept, points, octree nodes), measured on a single core x86_64 worker
+# with the terrains of the "files" folder. Calibrate with "python -m
+# surface_reconstruction.auto_depth" on the target machines, as the time depends on the number of
+# cores
+DEFAULT_MODELS = {
+    'open3d': {
+        'time_coefficients': [0.0, 2.5e-5, 2.7e-5],
+        'memory_coefficients': [6.0e6, 0.0, 120.0]
+    },
+    'pymeshlab': {
+        'time_coefficients': [2.1, 0.0, 6.1e-5],
+        'memory_coefficients': [3.1e7, 0.0, 430.0]
+    }
+}
+
+
+@dataclass
+class CloudStats:
+    """
+    The point cloud properties that drive the Poisson cost: the number of points,
+    the bounding box extent and the mean distance between neighbor points
+    """
+
+    points: int
+    extent: np.ndarray
+    spacing: float
+
+    @classmethod
+    def from_points(cls, points: np.ndarray, sample_size=10000, seed=0) -> CloudStats:
+        """
+        Measure a point cloud. The spacing is the median distance to the nearest
+        neighbor of a random sample of points
+
+        :param points: The points with shape ``(N, 3)``
+        :param sample_size: Number of points used to measure the spacing
+        :param seed: The random generator seed of the sample
+        """
+        from .spatial import KDTree
+
+        points = np.asarray(points)
+        extent = np.ptp(points, axis=0) if len(points) else np.zeros(3)
+
+        if len(points) < 2:
+            return cls(len(points), extent, float(extent.max()))
+
+        sample = points
+        if len(points) > sample_size:
+            sample = points[
+                np.random.default_rng(seed).choice(len(points), sample_size, replace=False)
+            ]
+
+        distances, _ = KDTree(points).query(sample, k=2)
+        spacing = float(np.median(distances[:, 1]))
+
+        return cls(
+            len(points),
+            extent,
+            spacing if spacing > 0 else float(extent.max()) / math.sqrt(len(points))
+        )
+
+    @property
+    def area(self) -> float:
+        """
+        Estimated surface area: each point covers a square of the spacing side
+        """
+        return self.points * self.spacing ** 2
+
+    def resampled(self, points: int) -> CloudStats:
+        """
+        The stats of the same surface with another number of points (e.g after a simplification)
+        """
+        return CloudStats(
+            points, self.extent, self.spacing * math.sqrt(self.points / max(points, 1))
+        )
+
+    def useful_depth(self, scale=1.1) -> int:
+        """
+        The depth whose cells have the size of the point spacing: deeper levels don't add details
+        """
+        side = scale * float(np.max(self.extent))
+        return max(1, math.ceil(math.log2(max(side / self.spacing, 2))))
+
+
+def octree_nodes(
+        stats: CloudStats, depth: int, scale=1.1, samples_per_node=1.5, full_depth=0
+) -> float:
+    """
+    Estimated number of octree nodes of a screened Poisson reconstruction. Each level has the
+    cells crossed by the surface, bounded by the complete level and by the adaptive refinement
+    (cells with less than ``samples_per_node`` points are not subdivided)
+    """
+    side = scale * max(float(np.max(stats.extent)), np.finfo(np.float64).eps)
+    adaptive_limit = SURFACE_BAND * stats.points / max(samples_per_node, np.finfo(np.float64).eps)
+    nodes = 0.0
+
+    for level in range(depth + 1):
+        complete = 8.0 ** level
+
+        if level <= full_depth:
+            nodes += complete
+            continue
+
+        cell = side / 2 ** level
+        nodes += min(complete, SURFACE_BAND * stats.area / cell ** 2, adaptive_limit)
+
+    return nodes
+
+
+def complete_depth(depth: int, full_depth=5) -> int:
+    """
+    The complete octree levels of a reconstruction: ``full_depth``, at least 2 levels above the
+    leaves
+    """
+    return min(full_depth, max(depth - 2, 1))
+
+
+def cost_options(poisson: dict, depth: Optional[int] = None) -> dict:
+    """
+    The cost model options of the Poisson parameters of a strategy, with the library defaults
+    (open3d has no "samplespernode"/"fulldepth" parameters, it uses 1.5 and 5)
+
+    :param poisson: The "surface_reconstruction_screened_poisson" parameters
+    :param depth: The depth of the prediction, instead of the "depth" parameter
+    :return: The CostModel.predict() keyword arguments
+    """
+    depth = poisson.get('depth', 8) if depth is None else depth
+
+    return dict(
+        depth=depth,
+        scale=poisson.get('scale', 1.1),
+        samples_per_node=poisson.get('samplespernode', 1.5),
+        full_depth=complete_depth(depth, poisson.get('fulldepth', 5))
+    )
+
+
+@dataclass
+class CostModel:
+    """
+    Linear model of the wall time (seconds) and the memory growth (bytes) of the
+    Poisson stage, from the number of points and the estimated octree nodes
+    """
+
+    time_coefficients: List[float]
+    memory_coefficients: List[float]
+    samples: int = 0
+
+    @staticmethod
+    def features(
+            stats: CloudStats, depth: int, scale=1.1, samples_per_node=1.5, full_depth=0
+    ) -> np.ndarray:
+        return np.array(
+            [1.0, stats.points, octree_nodes(stats, depth, scale, samples_per_node, full_depth)]
+        )
+
+    def predict(
+            self, stats: CloudStats, depth: int, scale=1.1, samples_per_node=1.5, full_depth=0
+    ) -> tuple:
+        """
+        :return: The predicted ``(wall time, memory growth)`` of the Poisson stage
+        """
+        features = self.features(stats, depth, scale, samples_per_node, full_depth)
+
+        return (
+            float(features @ np.asarray(self.time_coefficients)),
+            float(features @ np.asarray(self.memory_coefficients))
+        )
+
+    @classmethod
+    def fit(
+            cls, features: np.ndarray, wall_times: Sequence[float], memory: Sequence[float]
+    ) -> CostModel:
+        """
+        Least squares fit of measured runs. The coefficients are kept non negative (the
+        negative ones are dropped and the others refitted), so the cost always grows with
+        the points and the nodes
+
+        :param features: The features of each run, with shape ``(runs, 3)``
+        :param wall_times: The measured wall time of each run
+        :param memory: The measured memory growth of each run
+        """
+        features = np.asarray(features, dtype=np.float64)
+
+        # Scale the columns, as points and nodes are orders of magnitude above the intercept
+        norms = np.maximum(np.abs(features).max(axis=0), np.finfo(np.float64).eps)
+
+        def solve(values) -> List[float]:
+            values = np.asarray(values, dtype=np.float64)
+            active = np.ones(features.shape[1], dtype=bool)
+            coefficients = np.zeros(features.shape[1])
+
+            while active.any():
+                coefficients[:] = 0
+                coefficients[active] = (
+                    np.linalg.lstsq(features[:, active] / norms[active], values, rcond=None)[0]
+                    / norms[active]
+                )
+
+                if np.all(coefficients >= 0):
+                    break
+                active &= coefficients > 0
+
+            return coefficients.tolist()
+
+        return cls(solve(wall_times), solve(memory), len(features))
+
+    @staticmethod
+    def path(method_type: str) -> str:
+        return default_cache_dir('cost_models', f'{method_type}.json')
+
+    @classmethod
+    def load(cls, method_type: str) -> CostModel:
+        """
+        The calibrated model of a strategy, or the default coefficients when not calibrated yet
+        """
+        try:
+            with open(cls.path(method_type)) as file:
+                return cls(**json.load(file))
+        except (OSError, ValueError, TypeError):
+            return cls(**DEFAULT_MODELS.get(method_type, DEFAULT_MODELS['open3d']))
+
+    def save(self, method_type: str) -> str:
+        file_path = self.path(method_type)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        with open(file_path, 'w') as file:
+            json.dump(asdict(self), file, indent=2)
+
+        return file_path
+
+
+@dataclass
+class DepthBudget:
+    """
+    Limits of the Poisson stage: wall time in seconds and peak RSS of the process in bytes
+    """
+
+    wall_time: Optional[float] = None
+    peak_rss: Optional[int] = None
+    min_depth: int = 5
+    max_depth: int = 12
+
+    def __post_init__(self):
+        if self.min_depth > self.max_depth:
+            raise ValueError(
+                f'The minimum depth {self.min_depth} is above the maximum depth {self.max_depth}'
+            )
+
+
+@dataclass
+class DepthChoice:
+    depth: int
+    samples_per_node: float
+    full_depth: int
+    useful_depth: int
+    predicted_time: float
+    predicted_rss: int
+    within_budget: bool
+    actual_time: Optional[float] = None
+    actual_rss: Optional[int] = None
+    stats: Dict[str, float] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        summary = (
+            f'Poisson depth {self.depth}: predicted {self.predicted_time:.2f}s '
+            f'{self.predicted_rss / 2 ** 20:.0f}MB'
+        )
+
+        if self.actual_time is not None:
+            summary += f', actual {self.actual_time:.2f}s {(self.actual_rss or 0) / 2 ** 20:.0f}MB'
+
+        return summary
+
+
+def choose_depth(
+        stats: CloudStats,
+        budget: DepthBudget,
+        model: CostModel,
+        start_rss=0,
+        scale=1.1,
+        samples_per_node: Iterable[float] = (1.5,),
+        full_depth=5
+) -> DepthChoice:
+    """
+    The deepest reconstruction predicted within the budget, up to the depth whose cells have
+    the size of the point spacing. With several ``samples_per_node`` candidates (pymeshlab),
+    a higher value trading smoothness for a smaller octree is used only to reach a deeper level.
+    When no depth fits, the cheapest one is chosen (``within_budget`` is False)
+
+    :param stats: The point cloud stats
+    :param budget: The time/memory budget
+    :param model: The cost model of the strategy
+    :param start_rss: The current RSS of the process, added to the predicted memory growth
+    :param scale: The Poisson "scale" parameter
+    :param samples_per_node: The candidate minimum number of samples by octree node
+    :param full_depth: The maximum depth of the complete octree levels
+    :raises ValueError: If there is no ``samples_per_node`` candidate
+    """
+    samples_per_node = tuple(samples_per_node)
+    if not samples_per_node:
+        raise ValueError('choose_depth() needs at least one "samples_per_node" candidate')
+
+    useful_depth = min(max(stats.useful_depth(scale), budget.min_depth), budget.max_depth)
+    cheapest = None
+
+    for depth in range(useful_depth, budget.min_depth - 1, -1):
+        level = complete_depth(depth, full_depth)
+
+        for samples in samples_per_node:
+            wall_time, memory = model.predict(stats, depth, scale, samples, level)
+            choice = DepthChoice(
+                depth,
+                samples,
+                level,
+                useful_depth,
+                wall_time,
+                int(start_rss + memory),
+                True,
+                stats={
+                    'points': stats.points,
+                    'spacing': stats.spacing,
+                    'extent': float(np.max(stats.extent))
+                }
+            )
+
+            fits_time = budget.wall_time is None or wall_time <= budget.wall_time
+            fits_memory = budget.peak_rss is None or choice.predicted_rss <= budget.peak_rss
+
+            if fits_time and fits_memory:
+                return choice
+
+            cheapest = choice
+
+    cheapest.within_budget = False
+    return cheapest
+
+
+def apply_auto_depth(
+        points: np.ndarray, poisson: dict, budget: DepthBudget, model: CostModel, start_rss=0
+) -> DepthChoice:
+    """
+    Choose the Poisson depth of a point cloud within the budget (see choose_depth()) and set it in
+    the Poisson parameters, with the "samplespernode"/"fulldepth" parameters when the method has
+    them
+
+    :param points: The points with shape ``(N, 3)``
+    :param poisson: The Poisson parameters, updated
+    :param budget: The time/memory budget
+    :param model: The cost model of the strategy
+    :param start_rss: The current RSS of the process, added to the predicted memory growth
+    :return: The depth choice
+    """
+    tune_samples = 'samplespernode' in poisson
+
+    choice = choose_depth(
+        CloudStats.from_points(points),
+        budget,
+        model,
+        start_rss=start_rss,
+        scale=poisson.get('scale', 1.1),
+        samples_per_node=(1.5, 3, 6, 12) if tune_samples else (1.5,),
+        full_depth=poisson.get('fulldepth', 5)
+    )
+
+    poisson['depth'] = choice.depth
+    if tune_samples:
+        poisson['samplespernode'] = choice.samples_per_node
+        poisson['fulldepth'] = choice.full_depth
+
+    return choice
+
+
+MEMORY_POLICIES = ('downsample', 'depth')
+
+
+@dataclass
+class MemoryDecision:
+    """
+    The reduction of a Poisson reconstruction to fit a peak RSS budget (bytes): the point cloud
+    downsampled to ``target_points`` (with a voxel grid of ``voxel_size``) and/or the depth lowered
+    """
+
+    peak_rss: int
+    policy: str
+    points: int
+    depth: int
+    target_points: int
+    target_depth: int
+    predicted_rss: int
+    within_budget: bool = True
+    voxel_size: float = 0.0
+    actual_rss: Optional[int] = None
+
+    @property
+    def reduced(self) -> bool:
+        return self.target_points < self.points or self.target_depth < self.depth
+
+    def summary(self) -> str:
+        summary = (
+            f'Memory budget {self.peak_rss / 2 ** 20:.0f}MB ({self.policy}): '
+            f'{self.points} points depth {self.depth}'
+        )
+
+        if self.reduced:
+            summary += (
+                f' -> {self.target_points} points (voxel {self.voxel_size:.4g}) '
+                f'depth {self.target_depth}'
+            )
+
+        summary += f', predicted peak {self.predicted_rss / 2 ** 20:.0f}MB'
+        summary += '' if self.within_budget else ', over budget'
+
+        if self.actual_rss is not None:
+            summary += f', measured {self.actual_rss / 2 ** 20:.0f}MB'
+
+        return summary
+
+
+def fit_memory(
+        stats: CloudStats,
+        depth: int,
+        peak_rss: int,
+        model: CostModel,
+        start_rss=0,
+        policy='downsample',
+        min_depth=5,
+        min_points=1000,
+        scale=1.1,
+        samples_per_node=1.5,
+        full_depth=5
+) -> MemoryDecision:
+    """
+    Reduce a Poisson reconstruction until its predicted peak RSS fits the budget. The "downsample"
+    policy keeps the depth and reduces the points (fewer points make a smaller adaptive octree). The
+    "depth" policy lowers the depth first, down to ``min_depth``, then reduces the points if needed
+
+    :param stats: The point cloud stats
+    :param depth: The Poisson depth
+    :param peak_rss: The peak RSS budget, in bytes
+    :param model: The cost model of the strategy
+    :param start_rss: The current RSS of the process, added to the predicted memory growth
+    :param policy: "downsample" or "depth"
+    :param min_depth: The minimum depth of the "depth" policy
+    :param min_points: The minimum number of points kept by the downsampling
+    :param scale: The Poisson "scale" parameter
+    :param samples_per_node: The minimum number of samples by octree node
+    :param full_depth: The maximum depth of the complete octree levels
+    :raises ValueError: If the policy is unknown
+    :return: The decision. ``within_budget`` is False when the minimum points/depth are still over
+        budget
+    """
+    if policy not in MEMORY_POLICIES:
+        raise ValueError(
+            f'Unknown memory budget policy "{policy}", expected one of {MEMORY_POLICIES}'
+        )
+
+    def predicted(points: int, level: int) -> int:
+        growth = model.predict(
+            stats.resampled(points),
+            level,
+            scale,
+            samples_per_node,
+            complete_depth(level, full_depth)
+        )[1]
+        return int(start_rss + growth)
+
+    points, level = stats.points, depth
+
+    if policy == 'depth':
+        while level > min_depth and predicted(points, level) > peak_rss:
+            level -= 1
+
+    if predicted(points, level) > peak_rss:
+        # The largest number of points within the budget: the prediction grows with the points
+        low, high = min(min_points, points), points
+
+        while low < high:
+            middle = (low + high + 1) // 2
+            if predicted(middle, level) <= peak_rss:
+                low = middle
+            else:
+                high = middle - 1
+
+        points = low
+
+    predicted_rss = predicted(points, level)
+    return MemoryDecision(
+        peak_rss,
+        policy,
+        stats.points,
+        depth,
+        points,
+        level,
+        predicted_rss,
+        predicted_rss <= peak_rss
+    )
+
+
+def calibrate(
+        point_cloud_files: List[str],
+        method_types: Iterable[str] = ('open3d', 'pymeshlab'),
+        depths: Iterable[int] = (6, 7, 8, 9),
+        sizes: Iterable[int] = (),
+        save=True
+) -> Dict[str, CostModel]:
+    """
+    Fit the cost models from measured runs, each one in a new process (see the benchmark)
+
+    :param point_cloud_files: The point clouds of the runs
+    :param method_types: The strategies to calibrate
+    :param depths: The Poisson depths of the runs
+    :param sizes: Resampled sizes of the point clouds, for a wider range of points
+    :param save: Save the models, used by the next auto depth choices
+    :return: The models by strategy
+    """
+    from .benchmark import benchmark_cases, prepare_clouds, run_benchmark
+    from .point_cloud_io import read_point_cloud
+    from .surface_reconstruction import SurfaceReconstruction
+
+    models = {}
+
+    with tempfile.TemporaryDirectory() as work_folder:
+        prepared = prepare_clouds(point_cloud_files, sizes, work_folder)
+        stats = {
+            file_path: CloudStats.from_points(read_point_cloud(file_path).points)
+            for _, _, file_path in prepared
+        }
+
+        for method_type in method_types:
+            cases = benchmark_cases(prepared, [method_type], {'depth': list(depths)})
+
+            # The Poisson parameters of each run: the strategy defaults, with the parameters of the
+            # case
+            parameters = SurfaceReconstruction.strategy_type(method_type).parameters[
+                'surface_reconstruction_screened_poisson'
+            ]
+            defaults = {item['name']: item['value'] for item in parameters}
+            features, wall_times, memory = [], [], []
+
+            for case, result in zip(cases, run_benchmark(cases, verbose=False)):
+                stage = next(
+                    (
+                        item
+                        for item in result.stages
+                        if item['name'] == 'surface_reconstruction_screened_poisson'
+                    ),
+                    None
+                )
+                if result.status != 'ok' or stage is None:
+                    continue
+
+                # The points reaching the Poisson stage (e.g after a simplification)
+                points = stage['input_sizes'].get('points', case.points)
+                case_stats = stats[case.point_cloud_file].resampled(points)
+
+                poisson = {
+                    **defaults,
+                    **case.filters().get('surface_reconstruction_screened_poisson', {})
+                }
+                features.append(CostModel.features(case_stats, **cost_options(poisson)))
+                wall_times.append(stage['wall_time'])
+                memory.append(stage['stage_peak_rss'] - stage['start_rss'])
+
+            if not features:
+                continue
+
+            models[method_type] = CostModel.fit(np.array(features), wall_times, memory)
+
+            if save:
+                print(
+                    f'Cost model of {method_type} saved in '
+                    f'"{models[method_type].save(method_type)}"'
+                )
+
+    return models
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m surface_reconstruction.auto_depth',
+        description='Calibrate the Poisson cost models used by the automatic depth selection'
+    )
+    parser.add_argument(
+        'point_cloud_files',
+        nargs='*',
+        help='Point clouds of the runs. Defaults to the terrains of the "files" folder'
+    )
+    parser.add_argument(
+        '--methods', nargs='+', default=list(DEFAULT_MODELS), choices=list(DEFAULT_MODELS)
+    )
+    parser.add_argument('--depths', nargs='+', type=int, default=[6, 7, 8, 9])
+    parser.add_argument('--sizes', nargs='*', type=int, default=[20000, 100000])
+    args = parser.parse_args(argv)
+
+    from .benchmark import SOURCE_CLOUDS
+
+    models = calibrate(
+        args.point_cloud_files or list(SOURCE_CLOUDS), args.methods, args.depths, args.sizes
+    )
+
+    for method_type, model in models.items():
+        print(f'{method_type}: {json.dumps(asdict(model))}')
+
+    return 0 if models else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
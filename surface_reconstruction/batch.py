@@ -0,0 +1,450 @@
+from __future__ import annotations
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, asdict, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+from .mesh_writer import COMPACT_ENCODING, MeshWriter
+from .scheduler import THREAD_POLICIES, core_budget, limit_threads, spawn_environment, thread_plan
+from .surface_reconstruction import SurfaceReconstruction
+from .surface_strategy import SurfaceStrategy
+
+# Strategy instance of each worker process, created once by the pool initializer
+_worker_strategy: Optional[SurfaceStrategy] = None
+
+# Threads of each job of the worker process, given by the thread scheduler (None: the library
+# default)
+_worker_threads: Optional[int] = None
+
+# Background writes of the jobs of the worker process, until they are done (output file, future)
+_worker_writes: List[Tuple[str, Future]] = []
+
+
+@dataclass
+class BatchResult:
+    point_cloud_file: str
+    output_file: str
+    status: str = 'pending'
+    elapsed: float = 0.0
+    error: str = ''
+    worker: int = 0
+    threads: int = 0
+    stages: list = field(default_factory=list)
+    # The failed background writes of the jobs of the worker, by output file (this job or the
+    # previous ones)
+    write_errors: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 'ok'
+
+
+def expand_files(point_cloud_files: Union[str, Iterable[str]]) -> List[str]:
+    """
+    Expand glob patterns (e.g ``files/**/*.ply``) and remove duplicated files
+
+    :param point_cloud_files: A glob pattern, or a list of file paths/glob patterns
+    :return: The point cloud files, in the given order
+    """
+    if isinstance(point_cloud_files, str):
+        point_cloud_files = [point_cloud_files]
+
+    files = {}
+    for pattern in point_cloud_files:
+        matches = (
+            sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        )
+        files.update(dict.fromkeys(matches))
+
+    return list(files)
+
+
+def output_files(
+        point_cloud_files: List[str], output_folder="", suffix='_mesh', extension='.ply'
+) -> List[str]:
+    """
+    Output file of each point cloud: next to the point cloud file, or inside the
+    output folder (named by the path relative to the common folder of all files, avoiding conflicts)
+    """
+    if not output_folder:
+        return [
+            os.path.splitext(file_path)[0] + suffix + extension for file_path in point_cloud_files
+        ]
+
+    paths = [os.path.abspath(file_path) for file_path in point_cloud_files]
+    common = os.path.commonpath(paths) if len(paths) > 1 else os.path.dirname(paths[0])
+    if common in paths:
+        common = os.path.dirname(common)
+
+    names = [
+        os.path.splitext(os.path.relpath(path, common))[0].replace(os.sep, '_') for path in paths
+    ]
+    return [os.path.join(output_folder, name + suffix + extension) for name in names]
+
+
+def load_filters(json_filters: str) -> dict:
+    """
+    Load the filters from a JSON string or a .json file path
+    """
+    if not json_filters:
+        return {}
+
+    if os.path.isfile(json_filters):
+        with open(json_filters) as file:
+            return json.load(file)
+
+    return json.loads(json_filters)
+
+
+def init_worker(
+        method_type: str,
+        filter_script_file="",
+        background_write=False,
+        encoding: Optional[dict] = None,
+        threads: Optional[int] = None
+):
+    """
+    Process pool initializer: create the strategy of the worker process
+
+    :param method_type: The strategy registered in SurfaceReconstruction
+    :param filter_script_file: A .mlx filter script (pymeshlab only)
+    :param background_write: Write the meshes in a background thread, overlapped with the next file
+    :param encoding: MeshData.write_ply() options of the meshes (e.g the compact encoding)
+    :param threads: The threads of each job (the library threads and the OpenMP limit). Defaults to
+        all the cores
+    """
+    global _worker_strategy, _worker_threads
+
+    # Before the strategy imports its library, so its OpenMP runtime starts with the limit (NumPy
+    # was imported with this module: its BLAS runtime is limited by the environment of the spawned
+    # process)
+    _worker_threads = threads
+    if threads:
+        limit_threads(threads)
+
+    # Each process has its own SurfaceReconstruction singleton: one strategy per worker
+    _worker_strategy = SurfaceReconstruction(method_type=method_type)
+
+    if filter_script_file:
+        _worker_strategy.filter_script_file = filter_script_file
+
+    if encoding is not None:
+        _worker_strategy.mesh_encoding = encoding
+
+    if background_write:
+        _worker_strategy.mesh_writer = MeshWriter()
+
+
+def worker_strategy() -> SurfaceStrategy:
+    """
+    The strategy of the current worker process, created by init_worker()
+    """
+    return _worker_strategy
+
+
+def worker_filters(filters: dict) -> dict:
+    """
+    The filters of a job of the current worker process, with the thread count given to init_worker()
+    """
+    return _worker_strategy.thread_filters(filters, _worker_threads) if _worker_threads else filters
+
+
+def _format_error(error: BaseException) -> str:
+    return ''.join(traceback.format_exception_only(type(error), error)).strip()
+
+
+def _write_errors() -> Dict[str, str]:
+    """
+    The failed background writes of the worker process done since the previous job, by output file
+    """
+    global _worker_writes
+
+    errors = {
+        output_file: _format_error(future.exception())
+        for output_file, future in _worker_writes
+        if future.done() and future.exception() is not None
+    }
+    _worker_writes = [
+        (output_file, future) for output_file, future in _worker_writes if not future.done()
+    ]
+
+    return errors
+
+
+def _reconstruct(point_cloud_file: str, output_file: str, filters: dict) -> BatchResult:
+    result = BatchResult(
+        point_cloud_file, output_file, worker=os.getpid(), threads=_worker_threads or 0
+    )
+    start = time.perf_counter()
+
+    try:
+        _worker_strategy.reset(point_cloud_file, output_file)
+
+        filters = worker_filters(filters)
+        params = {'filters': filters} if filters else {}
+        mesh = _worker_strategy.poisson_mesh(save_file=True, **params)
+
+        if mesh is None:
+            raise RuntimeError(f'The mesh file "{output_file}" was not written')
+
+        # Only queued: its write error is reported by this job or the next ones of the worker
+        if _worker_strategy.pending_write is not None:
+            _worker_writes.append((output_file, _worker_strategy.pending_write))
+
+        result.status = 'ok'
+    except Exception as error:
+        result.status = 'failed'
+        result.error = _format_error(error)
+
+    result.elapsed = time.perf_counter() - start
+    result.stages = _worker_strategy.profiler.report()['stages']
+    result.write_errors = _write_errors()
+    return result
+
+
+def _write_failed(result: BatchResult, error: str) -> bool:
+    """
+    Mark a reconstructed file as failed by its background write
+
+    :return: If the result was reported as reconstructed before
+    """
+    reported = result.ok
+    result.status = 'failed'
+    result.error = f'The mesh file "{result.output_file}" was not written: {error}'
+
+    return reported
+
+
+def reconstruct_batch(
+        point_cloud_files: Union[str, Iterable[str]],
+        method_type='default',
+        json_filters="",
+        output_folder="",
+        filter_script_file="",
+        workers: Optional[int] = None,
+        on_result: Optional[Callable[[BatchResult], None]] = None,
+        background_write=False,
+        encoding: Optional[dict] = None,
+        thread_policy: Optional[Union[str, int]] = None,
+        cores: Optional[int] = None
+) -> List[BatchResult]:
+    """
+    Reconstruct many point cloud files in a process pool, with one strategy
+    instance per worker process. A failed file doesn't stop the batch.
+
+    :param point_cloud_files: A glob pattern, or a list of file paths/glob patterns
+    :param method_type: The strategy registered in SurfaceReconstruction
+    :param json_filters: The filters applied to all files, as a JSON string or .json file path
+    :param output_folder: Folder of the generated meshes. Defaults to the folder of each point cloud
+    :param filter_script_file: A .mlx filter script (pymeshlab only)
+    :param workers: Number of worker processes. Defaults to the number of CPUs
+    :param on_result: Called with each result, as soon as the file is done
+    :param background_write: Write each mesh in a background thread of the worker, while it
+        reconstructs the next file. The meshes are complete once the batch returns. A failed write
+        marks its file as failed (``on_result`` is called again when the file was already reported)
+    :param encoding: MeshData.write_ply() options of the meshes, e.g ``COMPACT_ENCODING``
+    :param thread_policy: Split the ``cores`` between the workers (see scheduler.thread_plan()),
+        replacing ``workers``: "narrow", "balanced", "wide" or the threads by job. Without a policy,
+        each job uses all the cores
+    :param cores: The core budget of the thread policy, at most the available cores
+    :return: The status and timing of each file, in the given order
+    """
+    files = expand_files(point_cloud_files)
+    if not files:
+        return []
+
+    if output_folder:
+        os.makedirs(output_folder, exist_ok=True)
+
+    filters = load_filters(json_filters)
+    results = [
+        BatchResult(file_path, output_file)
+        for file_path, output_file in zip(files, output_files(files, output_folder))
+    ]
+    by_output = {result.output_file: result for result in results}
+    pending = []
+
+    for result in results:
+        if os.path.exists(result.point_cloud_file):
+            pending.append(result)
+        else:
+            result.status = 'failed'
+            result.error = f'The point cloud file "{result.point_cloud_file}" was not found'
+            if on_result:
+                on_result(result)
+
+    threads = None
+    if thread_policy is not None and pending:
+        plan = thread_plan(thread_policy, core_budget(cores), len(pending))
+        workers, threads = plan.workers, plan.threads
+
+    # Spawn (instead of fork) the workers: the OpenMP thread pools of open3d/pymeshlab don't survive
+    # a fork
+    context = multiprocessing.get_context('spawn')
+
+    # A crashed worker (e.g killed by the OS) breaks the whole pool: retry its files once in a new
+    # pool
+    for _ in range(2):
+        if not pending:
+            break
+
+        broken = []
+        initargs = (method_type, filter_script_file, background_write, encoding, threads)
+
+        with ProcessPoolExecutor(workers, context, init_worker, initargs) as pool:
+            # The submissions spawn the workers, with the thread limits in their environment
+            with spawn_environment(threads):
+                futures = {
+                    pool.submit(_reconstruct, r.point_cloud_file, r.output_file, filters): r
+                    for r in pending
+                }
+
+            for future in as_completed(futures):
+                result = futures[future]
+
+                try:
+                    done = future.result()
+                except BrokenProcessPool:
+                    broken.append(result)
+                    continue
+
+                result.status, result.elapsed, result.error = done.status, done.elapsed, done.error
+                result.worker, result.threads = done.worker, done.threads
+                result.stages, result.write_errors = done.stages, done.write_errors
+
+                # The write errors of the previous jobs of the worker are reported again by their
+                # own result
+                for output_file, error in done.write_errors.items():
+                    failed = by_output[output_file]
+                    if failed is not result and _write_failed(failed, error) and on_result:
+                        on_result(failed)
+
+                if result.write_errors.get(result.output_file):
+                    _write_failed(result, result.write_errors[result.output_file])
+
+                if on_result:
+                    on_result(result)
+
+        pending = broken
+
+    for result in pending:
+        result.status = 'failed'
+        result.error = 'The worker process was terminated abruptly'
+        if on_result:
+            on_result(result)
+
+    # The last writes of each worker were done when it exited, without any next job reporting them
+    if background_write:
+        for result in results:
+            if result.ok and not os.path.exists(result.output_file):
+                _write_failed(result, 'the background write failed')
+                if on_result:
+                    on_result(result)
+
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='surface-reconstruction-batch',
+        description='Poisson surface reconstruction of many point cloud files in parallel'
+    )
+    parser.add_argument(
+        'files', nargs='+', help='Point cloud files or glob patterns (e.g "files/**/*.ply")'
+    )
+    parser.add_argument(
+        '-m', '--method-type', default='default', help='Strategy/library (e.g open3d, pymeshlab)'
+    )
+    parser.add_argument(
+        '-f', '--filters', default='', help='Filters as a JSON string or .json file'
+    )
+    parser.add_argument(
+        '-s', '--filter-script', default='', help='A .mlx filter script (pymeshlab only)'
+    )
+    parser.add_argument('-o', '--output-folder', default='', help='Folder of the generated meshes')
+    parser.add_argument(
+        '-w', '--workers', type=int, default=None, help='Number of worker processes'
+    )
+    parser.add_argument(
+        '-r', '--report', default='', help='Write the results of each file in a .json file'
+    )
+    parser.add_argument(
+        '--background-write',
+        action='store_true',
+        help='Write the meshes while reconstructing the next files'
+    )
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='Write float32 positions/normals and uint16 indices when possible'
+    )
+    parser.add_argument('--no-normals', action='store_true', help="Don't write the vertex normals")
+    parser.add_argument('--no-colors', action='store_true', help="Don't write the vertex colors")
+    parser.add_argument(
+        '--thread-policy',
+        default=None,
+        help=f'Split the cores between the workers: {", ".join(THREAD_POLICIES)} or threads by job'
+    )
+    parser.add_argument('--cores', type=int, default=None, help='Core budget of the thread policy')
+    args = parser.parse_args(argv)
+
+    encoding = None
+    if args.compact or args.no_normals or args.no_colors:
+        encoding = dict(
+            COMPACT_ENCODING if args.compact else {},
+            normals=not args.no_normals,
+            colors=not args.no_colors
+        )
+
+    files = [file_path for file_path in expand_files(args.files) if os.path.exists(file_path)]
+    if args.thread_policy is not None and files:
+        print(thread_plan(args.thread_policy, core_budget(args.cores), len(files)).summary())
+
+    start = time.perf_counter()
+
+    def print_result(result: BatchResult):
+        line = (
+            f'[{result.status}] {result.point_cloud_file} -> {result.output_file} '
+            f'({result.elapsed:.2f}s)'
+        )
+        print(line if result.ok else f'{line}: {result.error}', flush=True)
+
+    results = reconstruct_batch(
+        args.files,
+        method_type=args.method_type,
+        json_filters=args.filters,
+        output_folder=args.output_folder,
+        filter_script_file=args.filter_script,
+        workers=args.workers,
+        on_result=print_result,
+        background_write=args.background_write,
+        encoding=encoding,
+        thread_policy=args.thread_policy,
+        cores=args.cores
+    )
+
+    elapsed = time.perf_counter() - start
+    failed = [result for result in results if not result.ok]
+    print(f'{len(results) - len(failed)}/{len(results)} files reconstructed in {elapsed:.2f}s')
+
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump(
+                {'elapsed': elapsed, 'results': [asdict(result) for result in results]},
+                file,
+                indent=2
+            )
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,518 @@
+from __future__ import annotations
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Iterable, List, Optional
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from .point_cloud_io import PointCloudData, read_point_cloud, write_ply
+from .profiling import memory_usage
+from .surface_reconstruction import SurfaceReconstruction
+
+FILES_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'files')
+
+SOURCE_CLOUDS = {
+    'simple_terrain': os.path.join(FILES_FOLDER, 'simple_terrain', 'list_vertex.ply'),
+    'complex_terrain': os.path.join(FILES_FOLDER, 'complex_terrain', 'list_vertex.ply')
+}
+
+# Filter/method parameter changed by each grid parameter, by strategy
+GRID_PARAMETERS = {
+    'open3d': {
+        'depth': ('surface_reconstruction_screened_poisson', 'depth'),
+        'k': ('orient_normals_consistent_tangent_plane', 'k')
+    },
+    'pymeshlab': {
+        'depth': ('surface_reconstruction_screened_poisson', 'depth'),
+        'k': ('compute_normals_for_point_sets', 'k'),
+        'samplenum': ('point_cloud_simplification', 'samplenum')
+    },
+    # Without Poisson parameters: a single case by cloud
+    'heightfield': {}
+}
+
+# Statements of the startup benchmark: the package import alone, then the first use of each strategy
+STARTUP_CASES = {
+    'import': 'import surface_reconstruction',
+    'cli_help': 'from surface_reconstruction.batch import main',
+    'open3d': (
+        'from surface_reconstruction import SurfaceReconstruction; '
+        "SurfaceReconstruction(method_type='open3d')"
+    ),
+    'pymeshlab': (
+        'from surface_reconstruction import SurfaceReconstruction; '
+        "SurfaceReconstruction(method_type='pymeshlab')"
+    )
+}
+
+# Measures a statement in a new interpreter: its wall time and the heavy libraries it imported
+_STARTUP_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+exec(sys.argv[1])
+import_time = time.perf_counter() - start
+modules = [name for name in ('open3d', 'pymeshlab') if name in sys.modules]
+print(json.dumps({'import_time': import_time, 'modules': modules}))
+'''
+
+
+@dataclass
+class BenchmarkCase:
+    method_type: str
+    cloud: str
+    points: int
+    point_cloud_file: str
+    parameters: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def id(self) -> str:
+        parameters = ','.join(f'{name}={value}' for name, value in sorted(self.parameters.items()))
+        return f'{self.method_type}/{self.cloud}/{self.points}/{parameters}'
+
+    def filters(self) -> dict:
+        filters = {}
+
+        for name, value in self.parameters.items():
+            filter_name, parameter = GRID_PARAMETERS[self.method_type][name]
+            filters.setdefault(filter_name, {})[parameter] = value
+
+        return filters
+
+
+@dataclass
+class BenchmarkResult:
+    id: str
+    method_type: str
+    cloud: str
+    points: int
+    parameters: Dict[str, int]
+    status: str = 'ok'
+    error: str = ''
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    peak_rss: int = 0
+    vertices: int = 0
+    triangles: int = 0
+    chamfer: float = 0.0
+    hausdorff: float = 0.0
+    within_tolerance: float = 0.0
+    normal_consistency: Optional[float] = None
+    quality_time: float = 0.0
+    stages: list = field(default_factory=list)
+
+
+def resample(data: PointCloudData, points: int, seed=0) -> PointCloudData:
+    """
+    Synthetic point cloud with the given number of points. Downsampling picks random points,
+    upsampling adds copies of the points jittered by a fraction of the mean point spacing.
+
+    :param data: The source point cloud
+    :param points: The number of points of the new point cloud
+    :param seed: The random generator seed, for reproducible point clouds
+    :return: The resampled point cloud
+    """
+    rng = np.random.default_rng(seed)
+    count = len(data)
+    source_points = np.asarray(data.points)
+
+    if points <= count:
+        indexes = np.sort(rng.choice(count, size=points, replace=False))
+        offsets = None
+    else:
+        indexes = np.concatenate([np.arange(count), rng.integers(0, count, size=points - count)])
+
+        # Mean spacing of a 2.5D cloud with that many points over the XY bounding box
+        extent = np.ptp(source_points, axis=0)
+        area = max(extent[0] * extent[1], np.finfo(np.float64).eps)
+        spacing = np.sqrt(area / count)
+
+        offsets = np.zeros((points, 3))
+        offsets[count:] = rng.normal(scale=spacing * 0.25, size=(points - count, 3))
+
+    new_points = source_points[indexes]
+    if offsets is not None:
+        new_points += offsets
+
+    return PointCloudData(
+        points=new_points,
+        colors=None if data.colors is None else np.asarray(data.colors)[indexes],
+        normals=None if data.normals is None else np.asarray(data.normals)[indexes]
+    )
+
+
+def prepare_clouds(clouds: Iterable[str], sizes: Iterable[int], work_folder: str) -> List[tuple]:
+    """
+    Write the source and resampled point clouds used by the benchmark
+
+    :return: A list of ``(cloud name, number of points, file path)``
+    """
+    os.makedirs(work_folder, exist_ok=True)
+    prepared = []
+
+    for cloud in clouds:
+        source_file = SOURCE_CLOUDS.get(cloud, cloud)
+        name = cloud if cloud in SOURCE_CLOUDS else os.path.splitext(os.path.basename(cloud))[0]
+        data = read_point_cloud(source_file)
+
+        prepared.append((name, len(data), source_file))
+
+        for size in sizes:
+            if size == len(data):
+                continue
+
+            file_path = os.path.join(work_folder, f'{name}_{size}.ply')
+            if not os.path.exists(file_path):
+                write_ply(file_path, resample(data, size))
+
+            prepared.append((name, size, file_path))
+
+    return prepared
+
+
+def benchmark_cases(
+        prepared_clouds: List[tuple],
+        method_types: Iterable[str],
+        grid: Dict[str, List[int]]
+) -> List[BenchmarkCase]:
+    """
+    Combine the point clouds with each strategy and each parameter of the grid.
+    A parameter not used by a strategy (e.g ``samplenum`` in open3d) is ignored.
+    """
+    cases = []
+
+    for method_type in method_types:
+        names = [name for name in grid if name in GRID_PARAMETERS[method_type]]
+
+        for cloud, points, file_path in prepared_clouds:
+            for values in itertools.product(*(grid[name] for name in names)):
+                cases.append(
+                    BenchmarkCase(method_type, cloud, points, file_path, dict(zip(names, values)))
+                )
+
+    return cases
+
+
+def run_case(case: BenchmarkCase) -> BenchmarkResult:
+    """
+    Reconstruct a benchmark case, usually inside a new worker process. The quality metrics compare
+    the input point cloud with the mesh, after the wall time is measured
+    """
+    from .quality import compare
+
+    result = BenchmarkResult(case.id, case.method_type, case.cloud, case.points, case.parameters)
+
+    # Import the library of the strategy before the timer, startup_benchmark() measures the import
+    # time
+    try:
+        SurfaceReconstruction.strategy_type(case.method_type)
+    except (KeyError, ImportError):
+        # Reported as the error of the case by the reconstruction
+        pass
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    try:
+        surface = SurfaceReconstruction(
+            method_type=case.method_type, point_cloud_file=case.point_cloud_file
+        )
+        surface.poisson_mesh(save_file=False, filters=case.filters())
+
+        sizes = surface.geometry_sizes()
+        result.vertices = sizes.get('vertices', 0)
+        result.triangles = sizes.get('triangles', 0)
+        result.stages = surface.profiler.report()['stages']
+    except Exception as error:
+        result.status = 'failed'
+        result.error = repr(error)
+
+    result.wall_time = time.perf_counter() - wall_start
+    result.cpu_time = time.process_time() - cpu_start
+    result.peak_rss = memory_usage()[1]
+
+    if result.status == 'ok' and result.triangles > 0:
+        quality_start = time.perf_counter()
+        data = read_point_cloud(case.point_cloud_file)
+        quality = compare(data.points, surface.mesh_data(), data.normals)
+
+        result.chamfer = quality.chamfer
+        result.hausdorff = quality.hausdorff
+        result.within_tolerance = quality.within_tolerance
+        result.normal_consistency = quality.normal_consistency
+        result.quality_time = time.perf_counter() - quality_start
+
+    return result
+
+
+def run_benchmark(
+        cases: List[BenchmarkCase], repeat=1, timeout: Optional[float] = None, verbose=True
+) -> List[BenchmarkResult]:
+    """
+    Run each case in a new process. With ``repeat`` > 1, the fastest run is kept.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = []
+
+    for case in cases:
+        best = None
+
+        for _ in range(repeat):
+            with context.Pool(1, maxtasksperchild=1) as pool:
+                try:
+                    result = pool.apply_async(run_case, (case,)).get(timeout)
+                except multiprocessing.TimeoutError:
+                    result = BenchmarkResult(
+                        case.id, case.method_type, case.cloud, case.points, case.parameters
+                    )
+                    result.status = 'timeout'
+                    result.wall_time = timeout
+
+            if best is None or (
+                result.status == 'ok' and (best.status != 'ok' or result.wall_time < best.wall_time)
+            ):
+                best = result
+
+        results.append(best)
+
+        if verbose:
+            print(
+                f'[{best.status}] {best.id}: {best.wall_time:.3f}s, '
+                f'{best.peak_rss / 2 ** 20:.1f}MB, {best.triangles} triangles, chamfer '
+                f'{best.chamfer:.4g}',
+                flush=True
+            )
+
+    return results
+
+
+def startup_benchmark(cases: Optional[Dict[str, str]] = None, repeat=5) -> List[dict]:
+    """
+    Measure the startup cost of short-lived processes (workers, CLI tools): each statement runs
+    in a new interpreter, keeping the fastest of ``repeat`` runs. The process time includes
+    the interpreter start, the import time only the statement
+
+    :param cases: Statements by name. Defaults to the package import and the first use of each
+        strategy
+    :param repeat: Runs of each statement
+    :return: The ``name``, ``process_time``, ``import_time`` and imported heavy ``modules`` of each
+        case
+    """
+    results = []
+    package_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [package_folder, os.environ.get('PYTHONPATH')]))
+    )
+
+    for name, statement in (cases or STARTUP_CASES).items():
+        best = None
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, '-c', _STARTUP_SCRIPT, statement],
+                capture_output=True, text=True, env=env, check=True
+            ).stdout
+            process_time = time.perf_counter() - start
+
+            result = {
+                'name': name,
+                'process_time': process_time,
+                **json.loads(output.strip().splitlines()[-1])
+            }
+            if best is None or result['process_time'] < best['process_time']:
+                best = result
+
+        results.append(best)
+
+    return results
+
+
+def environment() -> dict:
+    versions = {}
+
+    for module in ('numpy', 'open3d', 'pymeshlab'):
+        try:
+            versions[module] = __import__(module).__version__
+        except (ImportError, AttributeError):
+            versions[module] = None
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        **versions
+    }
+
+
+def compare_results(
+        results: List[dict],
+        baseline: List[dict],
+        time_tolerance=0.2,
+        memory_tolerance=0.2,
+        size_tolerance=0.05,
+        quality_tolerance=0.1
+) -> List[dict]:
+    """
+    Compare the results with a baseline of the same cases (matched by id)
+
+    :param results: The current results (as dictionaries)
+    :param baseline: The baseline results (as dictionaries)
+    :param time_tolerance: Accepted relative increase of the wall time
+    :param memory_tolerance: Accepted relative increase of the peak memory
+    :param size_tolerance: Accepted relative change of the number of triangles
+    :param quality_tolerance: Accepted relative increase of the Chamfer and Hausdorff distances
+    :return: The regressions found, one dictionary by metric
+    """
+    baseline_by_id = {result['id']: result for result in baseline}
+    regressions = []
+
+    for result in results:
+        previous = baseline_by_id.get(result['id'])
+        if previous is None:
+            continue
+
+        if result['status'] != 'ok':
+            if previous['status'] == 'ok':
+                regressions.append(
+                    {
+                        'id': result['id'],
+                        'metric': 'status',
+                        'baseline': 'ok',
+                        'current': result['status']
+                    }
+                )
+            continue
+
+        checks = (
+            ('wall_time', time_tolerance, False),
+            ('peak_rss', memory_tolerance, False),
+            ('triangles', size_tolerance, True),
+            ('chamfer', quality_tolerance, False),
+            ('hausdorff', quality_tolerance, False)
+        )
+
+        for metric, tolerance, both_ways in checks:
+            if not previous.get(metric):
+                continue
+
+            change = (result[metric] - previous[metric]) / previous[metric]
+            if change > tolerance or (both_ways and change < -tolerance):
+                regressions.append({
+                    'id': result['id'],
+                    'metric': metric,
+                    'baseline': previous[metric],
+                    'current': result[metric],
+                    'change': change
+                })
+
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m surface_reconstruction.benchmark',
+        description='Benchmark the surface reconstruction strategies across point cloud sizes and '
+                    'parameters. Each run is executed in a new process, isolating its peak memory'
+    )
+    parser.add_argument(
+        '--methods', nargs='+', default=['open3d', 'pymeshlab'], choices=list(GRID_PARAMETERS)
+    )
+    parser.add_argument(
+        '--clouds', nargs='+', default=list(SOURCE_CLOUDS), help='Source clouds names or .ply files'
+    )
+    parser.add_argument(
+        '--sizes',
+        nargs='*',
+        type=int,
+        default=[10000, 100000, 1000000],
+        help='Resampled cloud sizes'
+    )
+    parser.add_argument('--depths', nargs='+', type=int, default=[6, 8])
+    parser.add_argument('--ks', nargs='+', type=int, default=[100])
+    parser.add_argument('--samplenums', nargs='+', type=int, default=[1000])
+    parser.add_argument(
+        '--repeat', type=int, default=1, help='Runs of each case, keeping the fastest'
+    )
+    parser.add_argument(
+        '--timeout', type=float, default=None, help='Timeout of each run, in seconds'
+    )
+    parser.add_argument(
+        '--work-folder', default='benchmark_files', help='Folder of the resampled clouds'
+    )
+    parser.add_argument(
+        '-o', '--output', default='benchmark_results.json', help='The results .json file'
+    )
+    parser.add_argument(
+        '-b',
+        '--baseline',
+        default='',
+        help='Compare the results with a previous results .json file'
+    )
+    parser.add_argument('--time-tolerance', type=float, default=0.2)
+    parser.add_argument('--memory-tolerance', type=float, default=0.2)
+    parser.add_argument('--quality-tolerance', type=float, default=0.1)
+    parser.add_argument(
+        '--startup',
+        action='store_true',
+        help='Only measure the import/startup time of new processes'
+    )
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        for result in startup_benchmark(repeat=max(args.repeat, 5)):
+            modules = ', '.join(result['modules']) or '-'
+            print(
+                f'{result["name"]}: process {result["process_time"]:.3f}s, import '
+                f'{result["import_time"]:.3f}s, libraries: {modules}'
+            )
+        return 0
+
+    prepared = prepare_clouds(args.clouds, args.sizes, args.work_folder)
+    grid = {'depth': args.depths, 'k': args.ks, 'samplenum': args.samplenums}
+    cases = benchmark_cases(prepared, args.methods, grid)
+
+    print(f'Running {len(cases)} benchmark cases')
+    results = [asdict(result) for result in run_benchmark(cases, args.repeat, args.timeout)]
+
+    report = {
+        'environment': environment(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results
+    }
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+
+        report['regressions'] = compare_results(
+            results,
+            baseline,
+            args.time_tolerance,
+            args.memory_tolerance,
+            quality_tolerance=args.quality_tolerance
+        )
+
+        for regression in report['regressions']:
+            print(
+                f'REGRESSION {regression["id"]} {regression["metric"]}: '
+                f'{regression["baseline"]} -> {regression["current"]}'
+            )
+
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    print(f'Results written in "{args.output}"')
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,472 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import os
+
+import numpy as np
+
+from .mesh_data import MeshData
+from .mesh_writer import snapshot
+from .point_cloud_io import PointCloudData, read_point_cloud
+from .surface_strategy import SurfaceStrategy
+from .strategy_hooks import StrategyHooks
+
+
+@dataclass
+class HeightfieldCheck:
+    """
+    The 2.5D test of a point cloud: the cells of a XY grid whose height range exceeds ``max_step``
+    cell sizes hold several surfaces (e.g overhangs, walls of buildings). The point cloud is a
+    heightfield ``z = f(x, y)`` when their fraction stays below ``max_multilayer``
+    """
+
+    cell_size: float
+    cells: int
+    multilayer_cells: int
+    max_multilayer: float
+
+    @property
+    def multilayer_fraction(self) -> float:
+        return self.multilayer_cells / max(self.cells, 1)
+
+    @property
+    def is_heightfield(self) -> bool:
+        return self.multilayer_fraction <= self.max_multilayer
+
+
+def grid_cells(points: np.ndarray, cell_size: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The XY grid cell of each point
+
+    :return: The flat cell index of each point (``row * columns + column``, the rows along x) and
+        the grid shape
+    """
+    indices = np.floor((points[:, :2] - points[:, :2].min(axis=0)) / cell_size).astype(np.int64)
+    shape = indices.max(axis=0) + 1
+
+    return indices[:, 0] * shape[1] + indices[:, 1], shape
+
+
+def check_heightfield(
+        points: np.ndarray, cell_size: float, max_step=4.0, max_multilayer=0.05
+) -> HeightfieldCheck:
+    """
+    Test if a point cloud is a heightfield, from the height range of the points of each cell
+
+    :param points: The points with shape ``(N, 3)``
+    :param cell_size: The XY grid cell size
+    :param max_step: The height range of a cell with a single surface, in cell sizes
+    :param max_multilayer: The accepted fraction of cells with several surfaces
+    :return: The check
+    """
+    cells, _ = grid_cells(points, cell_size)
+
+    order = np.argsort(cells, kind='stable')
+    heights = points[order, 2]
+    starts = np.flatnonzero(np.diff(cells[order], prepend=-1))
+
+    spread = np.maximum.reduceat(heights, starts) - np.minimum.reduceat(heights, starts)
+
+    return HeightfieldCheck(
+        cell_size, len(starts), int(np.count_nonzero(spread > max_step * cell_size)), max_multilayer
+    )
+
+
+def rasterize_heightfield(data: PointCloudData, cell_size: float, fill_holes=2) -> MeshData:
+    """
+    Triangulate a heightfield point cloud on a XY grid: a vertex by cell, with the mean point (and
+    color) of the cell, and two triangles by complete quad of cells (one when a cell is missing).
+    The empty cells surrounded by at least 5 of their 8 neighbors are filled with the mean of the
+    neighbors, ``fill_holes`` times, closing the gaps of the sampling without growing the borders
+
+    :param data: The point cloud
+    :param cell_size: The XY grid cell size
+    :param fill_holes: The number of hole filling passes
+    :return: The mesh, with the normals facing up and the colors of the points
+    """
+    points = np.asarray(data.points, dtype=np.float64)
+    cells, shape = grid_cells(points, cell_size)
+    size = int(shape[0] * shape[1])
+
+    counts = np.bincount(cells, minlength=size).astype(np.float64)
+    attributes = [points] + ([data.normalized_colors()] if data.colors is not None else [])
+    sums = [
+        np.column_stack(
+            [np.bincount(cells, weights=values[:, axis], minlength=size) for axis in range(3)]
+        )
+        for values in attributes
+    ]
+
+    valid = (counts > 0).reshape(shape)
+    means = [
+        np.where(counts[:, None] > 0, total / np.maximum(counts, 1)[:, None], 0).reshape(*shape, 3)
+        for total in sums
+    ]
+
+    # The empty cells keep the XY of their center
+    rows, columns = np.meshgrid(np.arange(shape[0]), np.arange(shape[1]), indexing='ij')
+    origin = points[:, :2].min(axis=0)
+    centers = np.stack(
+        [origin[0] + (rows + 0.5) * cell_size, origin[1] + (columns + 0.5) * cell_size], axis=-1
+    )
+
+    for _ in range(fill_holes):
+        padded_valid = np.pad(valid, 1)
+        padded_means = [
+            np.pad(values * valid[..., None], ((1, 1), (1, 1), (0, 0))) for values in means
+        ]
+
+        neighbors = np.zeros(shape, dtype=np.int64)
+        neighbor_sums = [np.zeros((*shape, 3)) for _ in means]
+
+        for offset_row in (-1, 0, 1):
+            for offset_column in (-1, 0, 1):
+                if offset_row == 0 and offset_column == 0:
+                    continue
+
+                window = (
+                    slice(1 + offset_row, 1 + offset_row + shape[0]),
+                    slice(1 + offset_column, 1 + offset_column + shape[1])
+                )
+                neighbors += padded_valid[window]
+
+                for total, values in zip(neighbor_sums, padded_means):
+                    total += values[window]
+
+        filled = ~valid & (neighbors >= 5)
+        if not filled.any():
+            break
+
+        for values, total in zip(means, neighbor_sums):
+            values[filled] = total[filled] / neighbors[filled][:, None]
+
+        means[0][filled, :2] = centers[filled]
+        valid |= filled
+
+    ids = np.full(shape, -1, dtype=np.int64)
+    ids[valid] = np.arange(np.count_nonzero(valid))
+
+    # The quads of cells: a (i, j), b (i + 1, j), c (i, j + 1), d (i + 1, j + 1), counterclockwise
+    # seen from above
+    a, b, c, d = (
+        ids[:-1, :-1].ravel(),
+        ids[1:, :-1].ravel(),
+        ids[:-1, 1:].ravel(),
+        ids[1:, 1:].ravel()
+    )
+    present = np.stack([a, b, c, d]) >= 0
+    complete = present.all(axis=0)
+    missing = present.sum(axis=0) == 3
+
+    faces = [
+        np.column_stack([a, b, d])[complete],
+        np.column_stack([a, d, c])[complete],
+        np.column_stack([b, d, c])[missing & ~present[0]],
+        np.column_stack([a, d, c])[missing & ~present[1]],
+        np.column_stack([a, b, d])[missing & ~present[2]],
+        np.column_stack([a, b, c])[missing & ~present[3]]
+    ]
+    faces = np.concatenate(faces).astype(np.int32)
+
+    vertices = means[0][valid]
+
+    # Area weighted vertex normals
+    triangles = vertices[faces]
+    cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    normals = np.column_stack(
+        [
+            np.bincount(
+                faces.ravel(), weights=np.repeat(cross[:, axis], 3), minlength=len(vertices)
+            )
+            for axis in range(3)
+        ]
+    )
+    lengths = np.linalg.norm(normals, axis=1)
+    normals = np.where(
+        lengths[:, None] > 0, normals / np.where(lengths > 0, lengths, 1)[:, None], [0.0, 0.0, 1.0]
+    )
+
+    return MeshData(vertices, faces, normals, means[1][valid] if len(means) > 1 else None)
+
+
+class HeightfieldSurface(SurfaceStrategy, StrategyHooks):
+    """
+    Fast path of the 2.5D clouds (e.g terrain tiles): the mesh is the grid triangulation of the
+    heights along the ``axis`` of the smallest extent (or a given one), without any Poisson solve.
+    The clouds that are not heightfields (overhangs, several surfaces) are reconstructed by the
+    ``fallback`` Poisson strategy instead, with the filters that this strategy doesn't have (e.g
+    ``surface_reconstruction_screened_poisson``, ``density_trimming``)
+    """
+
+    parameters = {
+        # Disabled by default, enabled passing a "min_bound" and/or a "max_bound" in the filters
+        'crop': {},
+        # Disabled by default, enabled passing a "voxel_size" in the filters
+        'voxel_downsample': {},
+        # Disabled by default, enabled passing a "mode" ("statistical" or "radius") and/or its
+        # parameters in the filters
+        'outlier_removal': {},
+        'heightfield': [
+            {
+                'name': 'axis',
+                'description': 'Height axis (0, 1 or 2, -1 for the axis of the smallest extent)',
+                'value': -1
+            },
+            {
+                'name': 'cell_size',
+                'description': 'Grid cell size (0 for 2.5 times the point spacing)',
+                'value': 0
+            },
+            {
+                'name': 'fill_holes',
+                'description': 'Hole filling passes',
+                'value': 2
+            },
+            {
+                'name': 'max_step',
+                'description': 'Height range of a single surface cell, in cell sizes',
+                'value': 4.0
+            },
+            {
+                'name': 'max_multilayer',
+                'description': 'Accepted fraction of cells with several surfaces',
+                'value': 0.05
+            },
+            {
+                'name': 'fallback',
+                'description': 'Poisson strategy of the clouds that are not heightfields '
+                               '(empty to fail)',
+                'value': 'open3d'
+            }
+        ],
+        # Disabled by default, enabled passing a "target_triangles" or a "reduction" in the filters
+        'simplify_mesh': {}
+    }
+
+    def __init__(self, point_cloud_file="", output_file="", clean_up=True):
+        self.point_cloud = PointCloudData(points=np.empty((0, 3)))
+        self.mesh = MeshData(np.empty((0, 3)), np.empty((0, 3), dtype=np.int32))
+        self.heightfield_check: Optional[HeightfieldCheck] = None
+        self.passed_filters = {}
+
+        super().__init__(point_cloud_file, output_file, clean_up=clean_up)
+
+    def reset(self, point_cloud_file="", output_file=""):
+        self.point_cloud = PointCloudData(points=np.empty((0, 3)))
+        self.mesh = MeshData(np.empty((0, 3)), np.empty((0, 3), dtype=np.int32))
+        self.heightfield_check = None
+        self.passed_filters = {}
+
+        super().reset(point_cloud_file, output_file)
+
+    def load_file(self, file_path: str) -> PointCloudData:
+        if self.verbose:
+            print('Load point cloud file')
+
+        return self.load_data(read_point_cloud(file_path))
+
+    def load_data(self, data: PointCloudData) -> PointCloudData:
+        self.point_cloud_data = data
+        self.point_cloud = data
+
+        return self.point_cloud
+
+    def point_cloud_arrays(self) -> PointCloudData:
+        return self.point_cloud
+
+    def set_point_cloud_arrays(self, data: PointCloudData):
+        self.point_cloud = data
+
+    def set_mesh_arrays(self, mesh: MeshData, densities=None):
+        self.mesh = mesh
+        self.densities = densities
+
+    def heightfield(
+            self,
+            axis=-1,
+            cell_size=0.0,
+            fill_holes=2,
+            max_step=4.0,
+            max_multilayer=0.05,
+            fallback='open3d'
+    ) -> MeshData:
+        """
+        Triangulate the point cloud if it is a heightfield, else reconstruct it with the fallback
+        strategy
+
+        :param axis: The height axis. Defaults to the axis of the smallest extent
+        :param cell_size: The grid cell size. Defaults to 2.5 times the point spacing
+        :param fill_holes: The number of hole filling passes
+        :param max_step: The height range of a cell with a single surface, in cell sizes
+        :param max_multilayer: The accepted fraction of cells with several surfaces
+        :param fallback: The method type of the Poisson strategy, or empty to fail
+        :raises ValueError: If the point cloud is not a heightfield and there is no fallback
+        :return: The mesh
+        """
+        from .auto_depth import CloudStats
+
+        data = self.point_cloud_arrays()
+        points = np.asarray(data.points, dtype=np.float64)
+
+        if axis < 0:
+            axis = int(np.argmin(points.max(axis=0) - points.min(axis=0)))
+
+        # The height axis last, with a cyclic permutation keeping the triangles counterclockwise
+        order = [(axis + 1) % 3, (axis + 2) % 3, axis]
+        points = points[:, order]
+
+        cell_size = cell_size or 2.5 * CloudStats.from_points(points).spacing
+        self.heightfield_check = check = check_heightfield(
+            points, cell_size, max_step, max_multilayer
+        )
+
+        if check.is_heightfield:
+            if self.verbose:
+                print(
+                    f'Heightfield: {check.cells} cells of {cell_size:.4g}, '
+                    f'{check.multilayer_fraction:.1%} with several surfaces'
+                )
+
+            mesh = rasterize_heightfield(PointCloudData(points, data.colors), cell_size, fill_holes)
+
+            inverse = np.argsort(order)
+            self.mesh = MeshData(
+                mesh.vertices[:, inverse], mesh.faces, mesh.normals[:, inverse], mesh.colors
+            )
+            self.densities = None
+
+            return self.mesh
+
+        if not fallback:
+            raise ValueError(
+                f'The point cloud is not a heightfield: {check.multilayer_fraction:.1%} of the '
+                'cells have several surfaces'
+            )
+
+        if self.verbose:
+            print(
+                f'Not a heightfield ({check.multilayer_fraction:.1%} of the cells have several '
+                f'surfaces), fallback to {fallback}'
+            )
+
+        # Imported here, the strategies are registered in SurfaceReconstruction
+        from .surface_reconstruction import SurfaceReconstruction
+
+        strategy = SurfaceReconstruction.strategy_type(fallback)()
+        filters = {
+            name: value
+            for name, value in self.passed_filters.items()
+            if name not in self.parameters
+        }
+
+        self.mesh = snapshot(
+            strategy.reconstruct_arrays(data.points, data.colors, data.normals, filters=filters)
+        )
+        self.densities = strategy.densities
+
+        return self.mesh
+
+    def density_trimming(self, quantile=0.0, threshold=0.0):
+        # The grid triangulation has no Poisson densities to trim
+        return self
+
+    def simplify_mesh(self, target_triangles=0, reduction=0.0):
+        import open3d as o3d
+
+        target = self.simplification_target(self.mesh.face_number, target_triangles, reduction)
+        if target is None:
+            return self
+
+        mesh = o3d.geometry.TriangleMesh(
+            o3d.utility.Vector3dVector(self.mesh.vertices),
+            o3d.utility.Vector3iVector(np.asarray(self.mesh.faces, dtype=np.int32))
+        )
+        if self.mesh.colors is not None:
+            mesh.vertex_colors = o3d.utility.Vector3dVector(
+                np.asarray(self.mesh.colors, dtype=np.float64)
+            )
+
+        mesh = mesh.simplify_quadric_decimation(target)
+        mesh.compute_vertex_normals()
+
+        self.mesh = MeshData(
+            vertices=np.asarray(mesh.vertices),
+            faces=np.asarray(mesh.triangles, dtype=np.int32),
+            normals=np.asarray(mesh.vertex_normals),
+            colors=np.asarray(mesh.vertex_colors) if mesh.has_vertex_colors() else None
+        )
+        self.densities = None
+
+        return self
+
+    def geometry_sizes(self) -> dict:
+        return {
+            'points': len(self.point_cloud),
+            'vertices': self.mesh.vertex_number,
+            'triangles': self.mesh.face_number
+        }
+
+    def mesh_data(self) -> MeshData:
+        return self.mesh
+
+    def load_mesh(self, file_path: str) -> MeshData:
+        import open3d as o3d
+
+        mesh = o3d.io.read_triangle_mesh(file_path)
+        self.mesh = MeshData(
+            vertices=np.asarray(mesh.vertices),
+            faces=np.asarray(mesh.triangles, dtype=np.int32),
+            normals=np.asarray(mesh.vertex_normals) if mesh.has_vertex_normals() else None,
+            colors=np.asarray(mesh.vertex_colors) if mesh.has_vertex_colors() else None
+        )
+
+        return self.mesh
+
+    def save_mesh(self, file_path: str) -> bool:
+        if os.path.splitext(file_path)[1].lower() in ('', '.ply'):
+            self.mesh.write_ply(file_path)
+            return True
+
+        import open3d as o3d
+
+        mesh = o3d.geometry.TriangleMesh(
+            o3d.utility.Vector3dVector(self.mesh.vertices),
+            o3d.utility.Vector3iVector(np.asarray(self.mesh.faces, dtype=np.int32))
+        )
+        if self.mesh.normals is not None:
+            mesh.vertex_normals = o3d.utility.Vector3dVector(self.mesh.normals)
+        if self.mesh.colors is not None:
+            mesh.vertex_colors = o3d.utility.Vector3dVector(
+                np.asarray(self.mesh.colors, dtype=np.float64)
+            )
+
+        return o3d.io.write_triangle_mesh(file_path, mesh)
+
+    def apply_filter(self, name: str, params_key_values: dict):
+        if name == 'heightfield':
+            self.heightfield(**params_key_values)
+        elif name == 'simplify_mesh':
+            self.simplify_mesh(**params_key_values)
+
+        self.applied_filters = True
+
+    def poisson_mesh(self, save_file=True, **params: {}) -> MeshData:
+
+        output_file = params.pop('output_file', self.output_file)
+        self.passed_filters = params.get('filters') or {}
+
+        if self.load_cached_result(save_file, output_file, **params):
+            return self.mesh
+
+        self.poisson_filters(callback=self.apply_filter, **params)
+
+        if save_file:
+            with self.profiler.stage('save_mesh', self.geometry_sizes):
+                saved = self.write_mesh(output_file)
+
+            if not saved:
+                return None
+
+        self.store_result(save_file, output_file)
+
+        return self.mesh
@@ -0,0 +1,448 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple, Union
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from .batch import init_worker, load_filters, worker_strategy
+from .mesh_data import MeshData
+from .point_cloud_io import PointCloudData, read_point_cloud
+from .tiling import stitch, trim_to_core
+
+Region = Tuple[int, int]
+
+
+@dataclass
+class IncrementalUpdate:
+    """
+    Summary of an update: the appended points and the regions reconstructed again
+    """
+
+    points: int
+    regions: List[Region] = field(default_factory=list)
+    region_points: int = 0
+    elapsed: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f'Reconstructed {len(self.regions)} regions ({self.region_points} points) '
+            f'in {self.elapsed:.3f}s'
+        )
+
+
+def _reconstruct_region(data: PointCloudData, core: np.ndarray, filters: dict) -> MeshData:
+    strategy = worker_strategy()
+
+    params = {'filters': filters} if filters else {}
+    mesh = strategy.reconstruct_arrays(data.points, data.colors, data.normals, **params)
+
+    return trim_to_core(mesh, core)
+
+
+class IncrementalReconstruction:
+    """
+    Reconstruct a growing point cloud (e.g survey passes appended over time) by regions.
+
+    The points are indexed in a fixed grid of XY cells of ``tile_size``, and the mesh is kept
+    as one piece by cell: the surface of a cell reconstructed with the points of its overlap
+    margin, trimmed to the cell (see the tiled reconstruction). Appending points reconstructs
+    only the cells whose cell + margin contains a new point (normals included, as the filters
+    run on the points of the region), and splices the new pieces in the mesh. The cost of an
+    update follows the size of the change instead of the size of the site: the worker processes
+    are spawned by the first update and kept until ``close()``.
+
+    The state (points and pieces by cell) can be saved in a folder, and loaded by the next run.
+    """
+
+    def __init__(
+            self,
+            tile_size: float,
+            overlap: Optional[float] = None,
+            method_type='default',
+            json_filters: Union[str, dict] = "",
+            workers: Optional[int] = None,
+            tolerance: Optional[float] = None,
+            min_points=20
+    ):
+        """
+        :param tile_size: Width/height of the (square) cells, in point cloud units
+        :param overlap: Margin around each cell, in point cloud units. Defaults to 10% of the cell
+            size
+        :param method_type: The strategy registered in SurfaceReconstruction
+        :param json_filters: The filters of each region, as a dictionary, a JSON string or .json
+            file path
+        :param workers: Number of worker processes, kept for the next updates. Defaults to the
+            number of CPUs
+        :param tolerance: Maximum distance of the vertices welded in the seams
+        :param min_points: Cells (with their margin) with less points have no surface
+        """
+        self.tile_size = float(tile_size)
+        self.overlap = min(
+            0.1 * self.tile_size if overlap is None else float(overlap), 0.99 * self.tile_size
+        )
+        self.method_type = method_type
+        self.filters = (
+            json_filters if isinstance(json_filters, dict) else load_filters(json_filters)
+        )
+        self.workers = workers
+        self.tolerance = tolerance
+        self.min_points = min_points
+
+        self.origin: Optional[np.ndarray] = None
+        self.cells: Dict[Region, PointCloudData] = {}
+        self.pieces: Dict[Region, MeshData] = {}
+
+        self._mesh: Optional[MeshData] = None
+        self._dirty: Set[Region] = set()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def __len__(self):
+        return sum(len(data) for data in self.cells.values())
+
+    def __enter__(self) -> IncrementalReconstruction:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Stop the worker processes. The next update spawns them again
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _worker_pool(self) -> ProcessPoolExecutor:
+        """
+        The worker processes, shared by the updates so they import the library once
+        """
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                self.workers or os.cpu_count() or 1,
+                multiprocessing.get_context('spawn'),
+                init_worker,
+                (self.method_type,)
+            )
+
+        return self._pool
+
+    def cell_core(self, region: Region) -> np.ndarray:
+        """
+        The XY region ``[xmin, ymin, xmax, ymax)`` of a cell
+        """
+        low = self.origin + np.asarray(region) * self.tile_size
+        return np.concatenate([low, low + self.tile_size])
+
+    def cell_indices(self, xy: np.ndarray, offset=0.0) -> np.ndarray:
+        return np.floor((xy + offset - self.origin) / self.tile_size).astype(np.int64)
+
+    def touched_regions(self, points: np.ndarray) -> List[Region]:
+        """
+        The cells (with points) whose region with the overlap margin contains any of the points
+        """
+        xy = np.asarray(points)[:, :2]
+        low = self.cell_indices(xy, -self.overlap)
+        high = self.cell_indices(xy, self.overlap)
+
+        # The margin is smaller than a cell: a point touches at most 2 cells by axis
+        regions = np.concatenate([
+            np.stack([ix, iy], axis=1)
+            for ix in (low[:, 0], high[:, 0])
+            for iy in (low[:, 1], high[:, 1])
+        ])
+
+        # The cells without points have no surface, even with points in their margin
+        return [
+            region
+            for region in map(tuple, np.unique(regions, axis=0).tolist())
+            if region in self.cells
+        ]
+
+    def region_points(self, region: Region) -> PointCloudData:
+        """
+        The points of a cell and of its overlap margin, gathered from the neighbor cells only
+        """
+        core = self.cell_core(region)
+        chunks = []
+
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                data = self.cells.get((region[0] + dx, region[1] + dy))
+                if data is None:
+                    continue
+
+                xy = data.points[:, :2]
+                inside = np.all(xy >= core[:2] - self.overlap, axis=1)
+                mask = inside & np.all(xy < core[2:] + self.overlap, axis=1)
+
+                if mask.any():
+                    chunks.append(data.select(mask))
+
+        if not chunks:
+            return PointCloudData(points=np.empty((0, 3)))
+
+        return PointCloudData.concatenate(chunks)
+
+    def add_points(self, data: PointCloudData) -> List[Region]:
+        """
+        Index the points in their cells, without reconstructing
+
+        :return: The regions touched by the points
+        """
+        if len(data) == 0:
+            return []
+
+        data = PointCloudData(
+            points=np.asarray(data.points, dtype=np.float64),
+            colors=None if data.colors is None else np.asarray(data.colors),
+            normals=None if data.normals is None else np.asarray(data.normals, dtype=np.float64)
+        )
+
+        if self.origin is None:
+            self.origin = data.points[:, :2].min(axis=0)
+
+        if self.cells:
+            previous = next(iter(self.cells.values()))
+            same_colors = (previous.colors is None) == (data.colors is None)
+            same_normals = (previous.normals is None) == (data.normals is None)
+
+            if not (same_colors and same_normals):
+                raise ValueError(
+                    'The appended points should have the same attributes (colors, normals) as the '
+                    'previous ones'
+                )
+
+        cells = self.cell_indices(data.points[:, :2])
+        keys, inverse = np.unique(cells, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+
+        for index, key in enumerate(map(tuple, keys.tolist())):
+            chunk = data.select(inverse == index)
+            if key in self.cells:
+                chunk = PointCloudData.concatenate([self.cells[key], chunk])
+
+            self.cells[key] = chunk
+            self._dirty.add(key)
+
+        return self.touched_regions(data.points)
+
+    def reconstruct_regions(self, regions: List[Region]) -> int:
+        """
+        Reconstruct the pieces of the regions in the worker processes, replacing the previous ones
+
+        :raises RuntimeError: If any region reconstruction fails
+        :return: The number of points reconstructed (with the margins)
+        """
+        jobs = []
+
+        for region in regions:
+            data = self.region_points(region)
+
+            if len(data) < self.min_points:
+                self.pieces.pop(region, None)
+                self._dirty.add(region)
+                continue
+
+            jobs.append((region, data))
+
+        if not jobs:
+            return 0
+
+        pool = self._worker_pool()
+        futures = [
+            pool.submit(_reconstruct_region, data, self.cell_core(region), self.filters)
+            for region, data in jobs
+        ]
+
+        errors = []
+        for (region, _), future in zip(jobs, futures):
+            try:
+                self.pieces[region] = future.result()
+                self._dirty.add(region)
+            except Exception as error:
+                errors.append(f'region {region}: {error!r}')
+
+                # A crashed worker breaks the pool: the next update spawns a new one
+                if isinstance(error, BrokenProcessPool) and self._pool is pool:
+                    self._pool = None
+                    pool.shutdown(wait=False)
+
+        if errors:
+            raise RuntimeError('Region reconstruction failed: ' + json.dumps(errors))
+
+        return sum(len(data) for _, data in jobs)
+
+    def update(self, data: Union[PointCloudData, str]) -> IncrementalUpdate:
+        """
+        Append points (e.g a new survey pass) and reconstruct only the regions they touch.
+        The first update reconstructs all the regions
+
+        :param data: The new points, or their point cloud file
+        :return: The summary of the update (see IncrementalUpdate.summary() for a message)
+        """
+        start = time.perf_counter()
+
+        if isinstance(data, str):
+            data = read_point_cloud(data)
+
+        regions = self.add_points(data)
+        region_points = self.reconstruct_regions(regions)
+        self._mesh = None
+
+        return IncrementalUpdate(len(data), regions, region_points, time.perf_counter() - start)
+
+    def mesh(self) -> MeshData:
+        """
+        The pieces spliced in a single mesh, welding the seams
+        """
+        if self._mesh is None:
+            self._mesh = stitch(
+                [self.pieces[region] for region in sorted(self.pieces)], self.tolerance
+            )
+
+        return self._mesh
+
+    def save(self, folder: str):
+        """
+        Save the state in a folder, writing only the cells and pieces changed since the last save
+        """
+        os.makedirs(os.path.join(folder, 'cells'), exist_ok=True)
+        os.makedirs(os.path.join(folder, 'pieces'), exist_ok=True)
+
+        for region in self._dirty:
+            name = f'{region[0]}_{region[1]}.npz'
+
+            if region in self.cells:
+                cell = self.cells[region]
+                np.savez(
+                    os.path.join(folder, 'cells', name),
+                    **{
+                        key: value
+                        for key, value in (
+                            ('points', cell.points),
+                            ('colors', cell.colors),
+                            ('normals', cell.normals)
+                        )
+                        if value is not None
+                    }
+                )
+
+            piece_file = os.path.join(folder, 'pieces', name)
+            piece = self.pieces.get(region)
+
+            if piece is None:
+                if os.path.exists(piece_file):
+                    os.remove(piece_file)
+                continue
+
+            np.savez(
+                piece_file,
+                **{
+                    key: value
+                    for key, value in (
+                        ('vertices', piece.vertices),
+                        ('faces', piece.faces),
+                        ('normals', piece.normals),
+                        ('colors', piece.colors)
+                    )
+                    if value is not None
+                }
+            )
+
+        state = {
+            'tile_size': self.tile_size,
+            'overlap': self.overlap,
+            'method_type': self.method_type,
+            'filters': self.filters,
+            'tolerance': self.tolerance,
+            'min_points': self.min_points,
+            'origin': None if self.origin is None else self.origin.tolist()
+        }
+
+        with open(os.path.join(folder, 'state.json'), 'w') as file:
+            json.dump(state, file, indent=2)
+
+        self._dirty.clear()
+
+    @classmethod
+    def load(cls, folder: str, workers: Optional[int] = None) -> IncrementalReconstruction:
+        """
+        Load a state saved by ``save()``
+        """
+        with open(os.path.join(folder, 'state.json')) as file:
+            state = json.load(file)
+
+        reconstruction = cls(
+            state['tile_size'],
+            state['overlap'],
+            state['method_type'],
+            state['filters'],
+            workers,
+            state['tolerance'],
+            state['min_points']
+        )
+        reconstruction.origin = None if state['origin'] is None else np.asarray(state['origin'])
+
+        def read(subfolder: str):
+            for name in sorted(os.listdir(os.path.join(folder, subfolder))):
+                region = tuple(int(value) for value in os.path.splitext(name)[0].split('_'))
+
+                with np.load(os.path.join(folder, subfolder, name)) as arrays:
+                    yield region, {key: arrays[key] for key in arrays.files}
+
+        for region, arrays in read('cells'):
+            reconstruction.cells[region] = PointCloudData(**arrays)
+
+        for region, arrays in read('pieces'):
+            reconstruction.pieces[region] = MeshData(**arrays)
+
+        return reconstruction
+
+
+def reconstruct_incremental(
+        point_cloud_file: str,
+        state_folder: str,
+        output_file="",
+        tile_size: Optional[float] = None,
+        **options
+) -> MeshData:
+    """
+    Append a point cloud file (e.g a new survey pass) to the reconstruction saved in the state
+    folder, reconstructing only the regions touched by its points. Without a saved state,
+    the whole point cloud is reconstructed and the state created
+
+    :param point_cloud_file: The new points
+    :param state_folder: The folder of the saved state
+    :param output_file: The spliced mesh .ply file. Not written when empty
+    :param tile_size: The size of the cells of a new state
+    :param options: The other IncrementalReconstruction options of a new state
+    :raises ValueError: If there is no saved state and no ``tile_size``
+    :return: The spliced mesh
+    """
+    if os.path.exists(os.path.join(state_folder, 'state.json')):
+        reconstruction = IncrementalReconstruction.load(state_folder, options.get('workers'))
+    elif tile_size:
+        reconstruction = IncrementalReconstruction(tile_size, **options)
+    else:
+        raise ValueError(
+            f'There is no state in "{state_folder}": pass the "tile_size" of a new state'
+        )
+
+    with reconstruction:
+        reconstruction.update(point_cloud_file)
+
+    reconstruction.save(state_folder)
+
+    mesh = reconstruction.mesh()
+
+    if output_file:
+        mesh.write_ply(output_file)
+
+    return mesh
@@ -0,0 +1,68 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional
+import os
+
+if TYPE_CHECKING:
+    from .surface_strategy import SurfaceStrategy
+
+
+def level_file(output_file: str, depth: int) -> str:
+    """
+    The file of a level of detail: "<output file name>_depth<depth>.<extension>"
+    """
+    stem, extension = os.path.splitext(output_file)
+    return f'{stem}_depth{depth}{extension or ".ply"}'
+
+
+def reconstruct_levels(
+        strategy: SurfaceStrategy,
+        depths: Iterable[int] = (6, 7, 8, 9),
+        save_file=True,
+        on_level: Optional[Callable[[int, str], None]] = None,
+        **params: {}
+) -> List[str]:
+    """
+    Reconstruct several levels of detail sharing a single load and normal estimation: the
+    filters before the Poisson reconstruction are applied once, then the Poisson reconstruction
+    and the next filters (e.g the density trimming) are applied for each depth. The coarse
+    levels are saved first, so they can be shown while the finest levels are solved. The stages
+    deciding the depth at run time (auto_depth, memory_budget) are skipped, the depths are given
+
+    :param strategy: The strategy, with the point cloud loaded
+    :param depths: The Poisson depth of each level
+    :param save_file: Save each level in its level_file()
+    :param on_level: Called with the depth and the file of each level, once saved
+    :param params: The poisson_mesh() parameters (e.g "filters", "output_file")
+    :return: The files of the levels, coarse first
+    """
+    output_file = params.pop('output_file', strategy.output_file)
+    filters = strategy.resolve_filters(**params)
+    poisson = filters['surface_reconstruction_screened_poisson']
+    names = [name for name in filters if name not in strategy.dynamic_stages]
+    index = names.index('surface_reconstruction_screened_poisson')
+
+    strategy.poisson_filters(strategy.apply_filter, names=names[:index])
+
+    original_depth = poisson.get('depth')
+    level_files = []
+
+    try:
+        for depth in sorted(set(depths)):
+            poisson['depth'] = depth
+            file_path = level_file(output_file, depth)
+
+            strategy.select_point_cloud()
+            strategy.poisson_filters(strategy.apply_filter, names=names[index:])
+
+            if save_file:
+                with strategy.profiler.stage('save_mesh', strategy.geometry_sizes):
+                    strategy.write_mesh(file_path)
+
+            level_files.append(file_path)
+
+            if on_level is not None:
+                on_level(depth, file_path)
+    finally:
+        poisson['depth'] = original_depth
+
+    return level_files
@@ -0,0 +1,58 @@
+from __future__ import annotations
+from typing import Optional, Tuple
+
+from .auto_depth import CloudStats, CostModel, MemoryDecision, fit_memory
+from .point_cloud_io import PointCloudData
+from .streaming import downsample_to
+
+
+def apply_memory_budget(
+        data: PointCloudData,
+        poisson: dict,
+        peak_rss: int,
+        model: CostModel,
+        start_rss=0,
+        policy='downsample',
+        min_depth=5,
+        min_points=1000
+) -> Tuple[MemoryDecision, Optional[PointCloudData]]:
+    """
+    Fit the Poisson reconstruction of a point cloud in a peak RSS budget, predicted with the cost
+    model from the points and the depth: voxel downsample the point cloud (the normals are averaged
+    by voxel) and/or lower the depth, per policy (see fit_memory())
+
+    :param data: The point cloud
+    :param poisson: The Poisson parameters, the depth is updated
+    :param peak_rss: The peak RSS budget of the process, in bytes
+    :param model: The cost model of the strategy
+    :param start_rss: The current RSS of the process, added to the predicted memory growth
+    :param policy: "downsample" (keep the depth) or "depth" (lower the depth first, down to
+        ``min_depth``)
+    :param min_depth: The minimum depth of the "depth" policy
+    :param min_points: The minimum number of points kept by the downsampling
+    :return: The decision, and the downsampled point cloud (None when all the points are kept)
+    """
+    stats = CloudStats.from_points(data.points)
+
+    decision = fit_memory(
+        stats,
+        poisson.get('depth', 8),
+        int(peak_rss),
+        model,
+        start_rss=start_rss,
+        policy=policy,
+        min_depth=min_depth,
+        min_points=min_points,
+        scale=poisson.get('scale', 1.1),
+        samples_per_node=poisson.get('samplespernode', 1.5),
+        full_depth=poisson.get('fulldepth', 5)
+    )
+
+    reduced = None
+    if decision.target_points < len(data):
+        reduced, decision.voxel_size = downsample_to(data, decision.target_points, stats.spacing)
+        decision.target_points = len(reduced)
+
+    poisson['depth'] = decision.target_depth
+
+    return decision, reduced
@@ -0,0 +1,169 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+# Largest vertex index of each face index type of the .ply files
+INDEX_LIMITS = {'int32': np.iinfo(np.int32).max, 'uint16': np.iinfo(np.uint16).max}
+
+INDEX_KINDS = {'int32': '<i4', 'uint16': '<u2'}
+
+
+@dataclass
+class MeshData:
+    """
+    Triangle mesh as NumPy arrays, independent of the library that generated it.
+
+    ``vertices``, ``normals`` and ``colors`` (values in the [0, 1] range) have shape
+    ``(N, 3)``, and ``faces`` has shape ``(M, 3)`` with the indices of the vertices.
+    """
+
+    vertices: np.ndarray
+    faces: np.ndarray
+    normals: Optional[np.ndarray] = None
+    colors: Optional[np.ndarray] = None
+
+    @property
+    def vertex_number(self) -> int:
+        return len(self.vertices)
+
+    @property
+    def face_number(self) -> int:
+        return len(self.faces)
+
+    def select_faces(self, mask: np.ndarray) -> MeshData:
+        """
+        Keep only the faces of the mask, removing the vertices not used anymore
+
+        :param mask: Boolean mask (or indices) of the faces to keep
+        :return: A new mesh with the vertices reindexed
+        """
+        faces = self.faces[mask]
+        used, inverse = np.unique(faces, return_inverse=True)
+
+        return MeshData(
+            vertices=self.vertices[used],
+            faces=inverse.reshape(-1, 3).astype(np.int32),
+            normals=None if self.normals is None else self.normals[used],
+            colors=None if self.colors is None else self.colors[used]
+        )
+
+    def face_centers(self) -> np.ndarray:
+        return self.vertices[self.faces].mean(axis=1)
+
+    def edge_lengths(self) -> np.ndarray:
+        triangles = self.vertices[self.faces]
+        return np.linalg.norm(triangles - np.roll(triangles, 1, axis=1), axis=2).ravel()
+
+    @staticmethod
+    def merge(meshes: List[MeshData]) -> MeshData:
+        """
+        Concatenate meshes in a single one, offsetting the face indices. The normals
+        and colors are kept only if all meshes have them
+        """
+        meshes = [mesh for mesh in meshes if mesh.vertex_number > 0]
+        if not meshes:
+            return MeshData(np.empty((0, 3)), np.empty((0, 3), dtype=np.int32))
+
+        offsets = np.cumsum([0] + [mesh.vertex_number for mesh in meshes[:-1]])
+
+        def concatenate(name: str) -> Optional[np.ndarray]:
+            arrays = [getattr(mesh, name) for mesh in meshes]
+            return None if any(array is None for array in arrays) else np.concatenate(arrays)
+
+        return MeshData(
+            vertices=np.concatenate([mesh.vertices for mesh in meshes]),
+            faces=np.concatenate(
+                [mesh.faces + offset for mesh, offset in zip(meshes, offsets)]
+            ).astype(np.int32),
+            normals=concatenate('normals'),
+            colors=concatenate('colors')
+        )
+
+    def write_ply(
+            self,
+            file_path: str,
+            binary=True,
+            float32=False,
+            normals=True,
+            colors=True,
+            index_type='int32'
+    ):
+        """
+        Write the mesh in a .ply file (binary little endian by default). The compact encodings
+        (``float32`` positions/normals, without the unused attributes, ``uint16`` indices) reduce
+        the write time and the file size
+
+        :param file_path: The .ply file path
+        :param binary: Write a binary file instead of an ASCII one
+        :param float32: Write the positions and normals as ``float32`` instead of ``float64``
+        :param normals: Write the vertex normals, when the mesh has them
+        :param colors: Write the vertex colors, when the mesh has them
+        :param index_type: The face indices type: "int32", "uint16", or "auto" (uint16 when the
+            vertices fit)
+        :raises ValueError: If the vertices don't fit the index type
+        """
+        if index_type == 'auto':
+            index_type = 'uint16' if self.vertex_number <= INDEX_LIMITS['uint16'] + 1 else 'int32'
+
+        if index_type not in INDEX_LIMITS:
+            raise ValueError(
+                f'Unknown index type "{index_type}", expected one of {list(INDEX_LIMITS)} or "auto"'
+            )
+
+        if self.vertex_number > INDEX_LIMITS[index_type] + 1:
+            raise ValueError(f'{self.vertex_number} vertices don\'t fit "{index_type}" indices')
+
+        real = '<f4' if float32 else '<f8'
+        write_normals = normals and self.normals is not None
+        write_colors = colors and self.colors is not None
+
+        fields = [('x', real), ('y', real), ('z', real)]
+        if write_normals:
+            fields += [('nx', real), ('ny', real), ('nz', real)]
+        if write_colors:
+            fields += [('red', 'u1'), ('green', 'u1'), ('blue', 'u1')]
+
+        vertices = np.empty(self.vertex_number, dtype=fields)
+        vertices['x'], vertices['y'], vertices['z'] = self.vertices.T
+
+        if write_normals:
+            vertices['nx'], vertices['ny'], vertices['nz'] = self.normals.T
+        if write_colors:
+            colors = np.clip(np.round(self.colors * 255), 0, 255)
+            vertices['red'], vertices['green'], vertices['blue'] = colors.T
+
+        index_kind = INDEX_KINDS[index_type]
+        faces = np.empty(self.face_number, dtype=[('count', 'u1'), ('indices', index_kind, (3,))])
+        faces['count'] = 3
+        faces['indices'] = self.faces
+
+        ply_types = {'<f8': 'double', '<f4': 'float', 'u1': 'uchar', '<u2': 'ushort', '<i4': 'int'}
+        header = ['ply', f'format {"binary_little_endian" if binary else "ascii"} 1.0']
+        header.append(f'element vertex {self.vertex_number}')
+        header += [f'property {ply_types[kind]} {name}' for name, kind in fields]
+        header += [
+            f'element face {self.face_number}',
+            f'property list uchar {ply_types[index_kind]} vertex_indices',
+            'end_header'
+        ]
+
+        with open(file_path, 'wb') as file:
+            file.write(('\n'.join(header) + '\n').encode('ascii'))
+
+            if binary:
+                vertices.tofile(file)
+                faces.tofile(file)
+            else:
+                np.savetxt(
+                    file,
+                    vertices,
+                    fmt=' '.join(
+                        '%d' if kind == 'u1' else '%.9g' if float32 else '%.17g'
+                        for _, kind in fields
+                    )
+                )
+                np.savetxt(
+                    file, np.hstack([np.full((self.face_number, 1), 3), self.faces]), fmt='%d'
+                )
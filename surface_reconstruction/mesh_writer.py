@@ -0,0 +1,130 @@
+from __future__ import annotations
+from concurrent.futures import Future
+from multiprocessing import util
+from typing import List
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from .mesh_data import MeshData
+
+# The compact encoding: float32 positions/normals and uint16 indices when the vertices fit
+COMPACT_ENCODING = {'float32': True, 'index_type': 'auto'}
+
+
+class MeshWriter:
+    """
+    Write meshes in a background thread, so the next job starts while the previous mesh is
+    still written (the NumPy writes release the GIL). The meshes are written in a temporary
+    file renamed when complete, so a mesh file is never seen partially written. At most
+    ``max_pending`` meshes wait in memory: ``submit()`` blocks beyond that.
+
+    The pending meshes are written before the process exits (including pool worker processes).
+    """
+
+    def __init__(self, max_pending=2, **encoding: {}):
+        """
+        :param max_pending: Maximum number of meshes waiting to be written
+        :param encoding: The default MeshData.write_ply() options, e.g ``COMPACT_ENCODING``
+        """
+        self.encoding = encoding
+        self.written = 0
+        self.bytes_written = 0
+        self.write_time = 0.0
+        self.errors: List[str] = []
+
+        self._queue = queue.Queue(max_pending)
+        self._thread = threading.Thread(target=self._run, name='mesh-writer', daemon=True)
+        self._thread.start()
+        self._closed = False
+
+        # Flush at exit: the daemon thread would be stopped with the pending meshes
+        self._finalizer = util.Finalize(
+            self, MeshWriter._stop, (self._queue, self._thread), exitpriority=10
+        )
+
+    def __enter__(self) -> MeshWriter:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def submit(self, mesh: MeshData, file_path: str, **encoding: {}) -> Future:
+        """
+        Queue a mesh to be written
+
+        :param mesh: The mesh arrays, not modified until written
+        :param file_path: The .ply file path
+        :param encoding: MeshData.write_ply() options, overriding the writer ones
+        :return: A future of the file path, failed with the write error
+        """
+        if self._closed:
+            raise RuntimeError('The mesh writer was closed')
+
+        future = Future()
+        self._queue.put((mesh, file_path, {**self.encoding, **encoding}, future))
+
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+
+            if item is None:
+                self._queue.task_done()
+                return
+
+            mesh, file_path, encoding, future = item
+            temp_file = f'{file_path}.part'
+            start = time.perf_counter()
+
+            try:
+                mesh.write_ply(temp_file, **encoding)
+                os.replace(temp_file, file_path)
+
+                self.written += 1
+                self.bytes_written += os.path.getsize(file_path)
+                future.set_result(file_path)
+            except Exception as error:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+
+                self.errors.append(f'{file_path}: {error!r}')
+                future.set_exception(error)
+            finally:
+                self.write_time += time.perf_counter() - start
+                self._queue.task_done()
+
+    def flush(self):
+        """
+        Wait until the queued meshes are written
+        """
+        self._queue.join()
+
+    def close(self):
+        """
+        Write the queued meshes and stop the thread
+        """
+        if not self._closed:
+            self._closed = True
+            self._finalizer()
+
+    @staticmethod
+    def _stop(pending: queue.Queue, thread: threading.Thread):
+        pending.put(None)
+        thread.join()
+
+
+def snapshot(mesh: MeshData) -> MeshData:
+    """
+    A copy of the mesh arrays, which may be views of the library buffers reused by the next job
+    """
+    return MeshData(
+        *(
+            None if array is None else np.array(array)
+            for array in (mesh.vertices, mesh.faces, mesh.normals, mesh.colors)
+        )
+    )
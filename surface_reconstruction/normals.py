@@ -0,0 +1,155 @@
+from __future__ import annotations
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+ORIENTATION_MODES = ('up', 'viewpoint', 'hybrid')
+
+
+def orientation_scores(
+        points: np.ndarray,
+        normals: np.ndarray,
+        up: Sequence[float] = (0, 0, 1),
+        viewpoint: Optional[Sequence[float]] = None
+) -> np.ndarray:
+    """
+    Cosine between each normal and its expected direction: the up vector, or the direction
+    from the point to the viewpoint (e.g the scanner position) when given
+
+    :param points: The points with shape ``(N, 3)``
+    :param normals: The unoriented normals with shape ``(N, 3)``
+    :param up: The up vector
+    :param viewpoint: The sensor/viewpoint position
+    :return: The cosines with shape ``(N,)``, negative for the normals to flip
+    """
+    normals = np.asarray(normals, dtype=np.float64)
+
+    if viewpoint is None:
+        directions = np.asarray(up, dtype=np.float64)[None, :]
+    else:
+        directions = np.asarray(viewpoint, dtype=np.float64) - np.asarray(points, dtype=np.float64)
+
+    lengths = np.linalg.norm(normals, axis=1) * np.linalg.norm(directions, axis=1)
+
+    dots = np.einsum('ij,ij->i', normals, np.broadcast_to(directions, normals.shape))
+    return dots / np.where(lengths > 0, lengths, 1)
+
+
+def propagate_signs(
+        points: np.ndarray,
+        normals: np.ndarray,
+        resolved: np.ndarray,
+        k=10,
+        iterations=100,
+        batch_size=1 << 18
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Orient the unresolved normals like their resolved neighbors: each unresolved normal is flipped
+    when the sum of its dot products with the resolved normals among its ``k`` nearest neighbors is
+    negative. The newly resolved normals vote in the next iteration, so the orientation spreads from
+    the resolved regions. Only the unresolved points are queried, all of them in a single batched
+    KD-tree search
+
+    :param points: The points with shape ``(N, 3)``
+    :param normals: The normals with shape ``(N, 3)``, modified in place
+    :param resolved: The mask of the normals already oriented, modified in place
+    :param k: The number of neighbors of each unresolved point
+    :param iterations: Maximum number of propagation steps
+    :param batch_size: Maximum number of query points by KD-tree search, bounding the memory
+    :return: The normals and the resolved mask
+    """
+    from .spatial import KDTree
+
+    pending = np.flatnonzero(~resolved)
+    if len(pending) == 0 or not resolved.any():
+        return normals, resolved
+
+    # The first neighbor of each point is itself
+    _, neighbors = KDTree(points).query(points[pending], k=k + 1, batch_size=batch_size)
+    neighbors = neighbors[:, 1:]
+
+    for _ in range(iterations):
+        voters = resolved[neighbors]
+        votes = np.einsum('ij,ikj->ik', normals[pending], normals[neighbors]) * voters
+        decided = voters.any(axis=1)
+
+        if not decided.any():
+            break
+
+        flip = decided & (votes.sum(axis=1) < 0)
+        normals[pending[flip]] *= -1
+        resolved[pending[decided]] = True
+
+        pending, neighbors = pending[~decided], neighbors[~decided]
+        if len(pending) == 0:
+            break
+
+    return normals, resolved
+
+
+def orient_normals(
+        points: np.ndarray,
+        normals: np.ndarray,
+        mode='up',
+        up: Sequence[float] = (0, 0, 1),
+        viewpoint: Optional[Sequence[float]] = None,
+        ambiguity=0.2,
+        k=10,
+        iterations=100
+) -> Tuple[np.ndarray, dict]:
+    """
+    Orient the normals of a 2.5D (terrain) or scanned point cloud without the tangent plane graph
+    propagation:
+
+    - "up": flip the normals pointing down
+    - "viewpoint": flip the normals pointing away from the viewpoint
+    - "hybrid": the "up" (or "viewpoint" when given) rule for the normals far from the horizontal
+      plane (or from the plane facing the viewpoint), then the signs of the ambiguous ones (cosine
+      below ``ambiguity``, e.g cliffs) are propagated from their neighbors
+
+    :param points: The points with shape ``(N, 3)``
+    :param normals: The unoriented normals with shape ``(N, 3)``
+    :param mode: "up", "viewpoint" or "hybrid"
+    :param up: The up vector
+    :param viewpoint: The sensor/viewpoint position, required by the "viewpoint" mode
+    :param ambiguity: The cosine below which the rule is ambiguous, in the "hybrid" mode
+    :param k: The neighbors of the ambiguous normals, in the "hybrid" mode
+    :param iterations: Maximum number of propagation steps, in the "hybrid" mode
+    :raises ValueError: On an unknown mode, or without a viewpoint in the "viewpoint" mode
+    :return: The oriented normals, and the number of ``flipped``, ``ambiguous`` and ``propagated``
+        normals
+    """
+    if mode not in ORIENTATION_MODES:
+        raise ValueError(
+            f'Unknown normal orientation mode "{mode}", expected one of {ORIENTATION_MODES}'
+        )
+
+    if mode == 'viewpoint' and viewpoint is None:
+        raise ValueError('The "viewpoint" orientation mode needs a viewpoint position')
+
+    points = np.asarray(points, dtype=np.float64)
+    oriented = np.array(normals, dtype=np.float64)
+    scores = orientation_scores(points, oriented, up, viewpoint)
+    counts = {'flipped': 0, 'ambiguous': 0, 'propagated': 0}
+
+    if mode != 'hybrid':
+        oriented[scores < 0] *= -1
+        counts['flipped'] = int(np.count_nonzero(scores < 0))
+        return oriented, counts
+
+    resolved = np.abs(scores) >= ambiguity
+    oriented[resolved & (scores < 0)] *= -1
+    counts['ambiguous'] = int(len(scores) - np.count_nonzero(resolved))
+
+    oriented, propagated = propagate_signs(points, oriented, resolved.copy(), k, iterations)
+    counts['propagated'] = int(np.count_nonzero(propagated & ~resolved))
+
+    # The ambiguous normals without any resolved neighbor keep the rule
+    isolated = ~propagated & (scores < 0)
+    oriented[isolated] *= -1
+
+    counts['flipped'] = int(
+        np.count_nonzero(np.einsum('ij,ij->i', oriented, np.asarray(normals, dtype=np.float64)) < 0)
+    )
+
+    return oriented, counts
@@ -2,10 +2,20 @@ import open3d as o3d
 import numpy as np
 from open3d.cpu.pybind.geometry import PointCloud, TriangleMesh
 from .surface_strategy import SurfaceStrategy
+from .strategy_hooks import StrategyHooks
+from .mesh_data import MeshData
+from .point_cloud_io import PointCloudData, is_ply, read_point_cloud
 
 
-class Open3dSurface(SurfaceStrategy):
+class Open3dSurface(SurfaceStrategy, StrategyHooks):
     parameters = {
+        # Disabled by default, enabled passing a "min_bound" and/or a "max_bound" in the filters
+        'crop': {},
+        # Disabled by default, enabled passing a "voxel_size" in the filters
+        'voxel_downsample': {},
+        # Disabled by default, enabled passing a "mode" ("statistical" or "radius") and/or its
+        # parameters in the filters
+        'outlier_removal': {},
         'estimate_normals': [
             {
                 'name': 'fast_normal_computation',
@@ -25,6 +35,14 @@ class Open3dSurface(SurfaceStrategy):
                 'value': 100
             }
         ],
+        # Disabled by default, enabled passing a "mode" ("up", "viewpoint" or "hybrid") in the
+        # filters. Replaces the tangent plane propagation, unless it is passed in the filters too
+        'orient_normals': {},
+        # Disabled by default, enabled passing a "wall_time" and/or a "peak_rss" budget in the
+        # filters
+        'auto_depth': {},
+        # Disabled by default, enabled passing a "peak_rss" budget (bytes) in the filters
+        'memory_budget': {},
         'surface_reconstruction_screened_poisson': [
             {
                 'name': 'depth',
@@ -51,9 +69,21 @@ class Open3dSurface(SurfaceStrategy):
                 'description': 'Number of threads used for reconstruction',
                 'value': -1
             }
-        ]
+        ],
+        # Disabled by default, enabled passing a "quantile" and/or a "threshold" in the filters
+        'density_trimming': {},
+        # Disabled by default, enabled passing a "target_triangles" or a "reduction" in the filters
+        'simplify_mesh': {}
     }
 
+    normal_stages = (
+        'estimate_normals',
+        'orient_normals_consistent_tangent_plane',
+        'orient_normals'
+    )
+
+    thread_parameter = ('surface_reconstruction_screened_poisson', 'n_threads')
+
     def __init__(self, point_cloud_file="", output_file="", clean_up=True):
 
         self.point_cloud = PointCloud()
@@ -61,11 +91,35 @@ class Open3dSurface(SurfaceStrategy):
 
         # raise ValueError(f"Contains the {point_cloud_file} attribute: {output_file}")
 
-        super().__init__(point_cloud_file, output_file, clean_up)
+        super().__init__(point_cloud_file, output_file, clean_up=clean_up)
+
+    def reset(self, point_cloud_file="", output_file=""):
+        self.point_cloud = PointCloud()
+        self.mesh = TriangleMesh()
+
+        super().reset(point_cloud_file, output_file)
+
+    def resolve_filters(self, **params: {}) -> dict:
+        filters = super().resolve_filters(**params)
+        passed = params.get('filters') or {}
+
+        tangent_plane = passed.get('orient_normals_consistent_tangent_plane')
+
+        if passed.get('orient_normals') and not tangent_plane:
+            filters['orient_normals_consistent_tangent_plane'] = {}
+
+        return filters
 
     def load_file(self, file_path: str) -> PointCloud:
         print('Load point cloud file')
 
+        if is_ply(file_path):
+            try:
+                return self.load_data(read_point_cloud(file_path))
+            except ValueError as error:
+                if self.verbose:
+                    print(f'Fallback to the open3d reader: {error}')
+
         self.point_cloud = o3d.io.read_point_cloud(
             file_path,
             print_progress=True
@@ -75,6 +129,72 @@ class Open3dSurface(SurfaceStrategy):
 
         return self.point_cloud
 
+    def load_data(self, data: PointCloudData) -> PointCloud:
+        """
+        Load a point cloud from NumPy arrays, without any file
+
+        :param data: The point cloud arrays
+        :return: The open3d point cloud
+        """
+        self.point_cloud_data = data
+        self.point_cloud = self.create_point_cloud(data)
+
+        return self.point_cloud
+
+    @staticmethod
+    def create_point_cloud(data: PointCloudData) -> PointCloud:
+        """
+        Create an open3d point cloud from NumPy arrays, without parsing any file
+
+        :param data: The point cloud arrays
+        :return: The open3d point cloud
+        """
+        point_cloud = PointCloud()
+        point_cloud.points = o3d.utility.Vector3dVector(np.asarray(data.points, dtype=np.float64))
+
+        if data.colors is not None:
+            point_cloud.colors = o3d.utility.Vector3dVector(data.normalized_colors())
+
+        if data.normals is not None:
+            point_cloud.normals = o3d.utility.Vector3dVector(
+                np.asarray(data.normals, dtype=np.float64)
+            )
+
+        return point_cloud
+
+    def point_cloud_arrays(self) -> PointCloudData:
+        colors = None
+        if self.point_cloud.has_colors():
+            colors = np.round(np.asarray(self.point_cloud.colors) * 255)
+            colors = np.clip(colors, 0, 255).astype(np.uint8)
+
+        return PointCloudData(
+            points=np.asarray(self.point_cloud.points),
+            colors=colors,
+            normals=np.asarray(self.point_cloud.normals) if self.point_cloud.has_normals() else None
+        )
+
+    def set_point_cloud_arrays(self, data: PointCloudData):
+        self.point_cloud = self.create_point_cloud(data)
+
+    def set_mesh_arrays(self, mesh: MeshData, densities=None):
+        self.mesh = TriangleMesh(
+            o3d.utility.Vector3dVector(np.asarray(mesh.vertices, dtype=np.float64)),
+            o3d.utility.Vector3iVector(np.asarray(mesh.faces, dtype=np.int32))
+        )
+
+        if mesh.normals is not None:
+            self.mesh.vertex_normals = o3d.utility.Vector3dVector(
+                np.asarray(mesh.normals, dtype=np.float64)
+            )
+
+        if mesh.colors is not None:
+            self.mesh.vertex_colors = o3d.utility.Vector3dVector(
+                np.asarray(mesh.colors, dtype=np.float64)
+            )
+
+        self.densities = densities
+
     def estimate_normals(self, **params):
 
         # invalidate existing normals
@@ -86,54 +206,108 @@ class Open3dSurface(SurfaceStrategy):
 
         return self
 
-    def poisson_mesh(self, save_file=True, **params: {}) -> TriangleMesh:
+    def density_trimming(self, quantile=0.0, threshold=0.0):
+        threshold = self.density_threshold(quantile, threshold)
+        if threshold is None:
+            return self
 
-        def apply_filter(name: str, params_key_values: dict):
+        mask = self.densities < threshold
+        self.mesh.remove_vertices_by_mask(mask)
+        self.densities = self.densities[~mask]
 
-            if not self.normals_estimated and hasattr(self, name):
-                fn = getattr(self, name)
+        return self
 
-                if callable(fn):
-                    fn(**params_key_values)
+    def simplify_mesh(self, target_triangles=0, reduction=0.0):
+        target = self.simplification_target(len(self.mesh.triangles), target_triangles, reduction)
+        if target is None:
+            return self
 
-                self.applied_filters = True
-            elif self.point_cloud and hasattr(self.point_cloud, name):
-                fn = getattr(self.point_cloud, name)
+        self.mesh = self.mesh.simplify_quadric_decimation(target)
 
-                if callable(fn):
-                    fn(**params_key_values)
+        # The vertices were merged, their densities are gone
+        self.densities = None
 
+        return self
+
+    def geometry_sizes(self) -> dict:
+        return {
+            'points': len(self.point_cloud.points),
+            'vertices': len(self.mesh.vertices),
+            'triangles': len(self.mesh.triangles)
+        }
+
+    def mesh_data(self) -> MeshData:
+        return MeshData(
+            vertices=np.asarray(self.mesh.vertices),
+            faces=np.asarray(self.mesh.triangles),
+            normals=(
+                np.asarray(self.mesh.vertex_normals) if self.mesh.has_vertex_normals() else None
+            ),
+            colors=np.asarray(self.mesh.vertex_colors) if self.mesh.has_vertex_colors() else None
+        )
+
+    def load_mesh(self, file_path: str) -> TriangleMesh:
+        self.mesh = o3d.io.read_triangle_mesh(file_path)
+        return self.mesh
+
+    def save_mesh(self, file_path: str) -> bool:
+        return o3d.io.write_triangle_mesh(
+            file_path,
+            self.mesh,
+            compressed=True,
+            write_vertex_colors=True,
+            write_vertex_normals=True,
+            print_progress=True
+        )
+
+    def apply_filter(self, name: str, params_key_values: dict):
+
+        if name == 'density_trimming':
+            self.density_trimming(**params_key_values)
+        elif name == 'simplify_mesh':
+            self.simplify_mesh(**params_key_values)
+        elif not self.normals_estimated and hasattr(self, name):
+            fn = getattr(self, name)
+
+            if callable(fn):
+                fn(**params_key_values)
+
+            self.applied_filters = True
+        elif self.point_cloud and hasattr(self.point_cloud, name):
+            fn = getattr(self.point_cloud, name)
+
+            if callable(fn):
+                fn(**params_key_values)
+
+            self.applied_filters = True
+
+        if name == 'surface_reconstruction_screened_poisson':
+            with o3d.utility.VerbosityContextManager(o3d.utility.VerbosityLevel.Debug):
+                self.mesh, densities = TriangleMesh.create_from_point_cloud_poisson(
+                    self.point_cloud,
+                    **params_key_values
+                )
+                self.densities = np.array(densities)
                 self.applied_filters = True
 
-            if name == 'surface_reconstruction_screened_poisson':
-                with o3d.utility.VerbosityContextManager(o3d.utility.VerbosityLevel.Debug):
-                    self.mesh, densities = TriangleMesh.create_from_point_cloud_poisson(
-                        self.point_cloud,
-                        **params_key_values
-                    )
-                    self.applied_filters = True
+    def poisson_mesh(self, save_file=True, **params: {}) -> TriangleMesh:
 
-        self.poisson_filters(callback=apply_filter, **params)
+        output_file = params.pop('output_file', self.output_file)
 
-        if save_file:
+        if self.load_cached_result(save_file, output_file, **params):
+            return self.mesh
 
-            output_file = self.output_file
+        self.poisson_filters(callback=self.apply_filter, **params)
 
-            if 'output_file' in params:
-                output_file = params.get('output_file')
-                del params['output_file']
+        if save_file:
 
             # Save the generated Surface in a .ply file
-            result = o3d.io.write_triangle_mesh(
-                output_file,
-                self.mesh,
-                compressed=True,
-                write_vertex_colors=True,
-                write_vertex_normals=True,
-                print_progress=True
-            )
+            with self.profiler.stage('save_mesh', self.geometry_sizes):
+                saved = self.write_mesh(output_file)
 
-            if not result:
+            if not saved:
                 return None
 
+        self.store_result(save_file, output_file)
+
         return self.mesh
@@ -0,0 +1,121 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .point_cloud_io import PointCloudData
+
+OUTLIER_MODES = ('statistical', 'radius')
+
+
+@dataclass
+class OutlierReport:
+    """
+    The points dropped by the outlier removal, with the Poisson cost predicted by the cost model of
+    the strategy with and without them. ``poisson_time`` is the measured time of the Poisson stage
+    that followed, so ``poisson_time + predicted_time_saved`` estimates the time with the outliers
+    """
+
+    mode: str
+    points: int
+    removed: int
+    radius: float = 0.0
+    predicted_time_saved: float = 0.0
+    predicted_memory_saved: float = 0.0
+    poisson_time: Optional[float] = None
+
+    @property
+    def kept(self) -> int:
+        return self.points - self.removed
+
+    def summary(self) -> str:
+        return (
+            f'Outlier removal ({self.mode}): {self.removed} of {self.points} points dropped, '
+            f'predicted Poisson time saved {self.predicted_time_saved:.2f}s, '
+            f'memory {self.predicted_memory_saved / 2 ** 20:.0f}MB'
+        )
+
+
+def statistical_mask(
+        points: np.ndarray, nb_neighbors=20, std_ratio=2.0, batch_size=1 << 18
+) -> np.ndarray:
+    """
+    Keep the points whose mean distance to their ``nb_neighbors`` nearest neighbors is below the
+    mean of these distances plus ``std_ratio`` standard deviations (like
+    ``remove_statistical_outlier`` of open3d)
+
+    :param points: The points with shape ``(N, 3)``
+    :param nb_neighbors: The number of neighbors of each point
+    :param std_ratio: The accepted deviation from the mean distance, in standard deviations
+    :param batch_size: Maximum number of query points by KD-tree search, bounding the memory
+    :return: The mask of the kept points
+    """
+    from .spatial import KDTree
+
+    if len(points) <= nb_neighbors:
+        return np.ones(len(points), dtype=bool)
+
+    # The first neighbor of each point is itself
+    distances, _ = KDTree(points).query(points, k=nb_neighbors + 1, batch_size=batch_size)
+    mean_distances = distances[:, 1:].mean(axis=1)
+
+    return mean_distances <= mean_distances.mean() + std_ratio * mean_distances.std()
+
+
+def radius_mask(points: np.ndarray, radius: float, nb_points=16, batch_size=1 << 18) -> np.ndarray:
+    """
+    Keep the points with at least ``nb_points`` points (themselves included) within the radius
+    (like ``remove_radius_outlier`` of open3d)
+
+    :param points: The points with shape ``(N, 3)``
+    :param radius: The search radius
+    :param nb_points: The minimum number of points within the radius
+    :param batch_size: Maximum number of query points by KD-tree search, bounding the memory
+    :return: The mask of the kept points
+    """
+    from .spatial import KDTree
+
+    if len(points) == 0:
+        return np.ones(0, dtype=bool)
+
+    return KDTree(points).count_within_radius(points, radius, batch_size=batch_size) >= nb_points
+
+
+def remove_outliers(
+        data: PointCloudData,
+        mode='statistical',
+        nb_neighbors=20,
+        std_ratio=2.0,
+        nb_points=16,
+        radius=0.0,
+        spacing=0.0
+) -> Tuple[PointCloudData, OutlierReport]:
+    """
+    Remove the isolated points of a point cloud: the points with a mean distance to their neighbors
+    far above the others ("statistical"), or with too few points within a radius ("radius")
+
+    :param data: The point cloud
+    :param mode: "statistical" or "radius"
+    :param nb_neighbors: The neighbors of the "statistical" mode
+    :param std_ratio: The accepted deviation of the "statistical" mode, in standard deviations
+    :param nb_points: The minimum number of points within the radius of the "radius" mode
+    :param radius: The radius of the "radius" mode. Defaults to 3 times the point spacing
+    :param spacing: The mean distance between neighbor points
+    :raises ValueError: On an unknown mode
+    :return: The kept points (the same point cloud when nothing is removed) and the report
+    """
+    if mode not in OUTLIER_MODES:
+        raise ValueError(f'Unknown outlier removal mode "{mode}", expected one of {OUTLIER_MODES}')
+
+    points = np.asarray(data.points)
+
+    if mode == 'statistical':
+        mask = statistical_mask(points, nb_neighbors, std_ratio)
+    else:
+        radius = radius or 3 * spacing
+        mask = radius_mask(points, radius, nb_points)
+
+    report = OutlierReport(mode, len(points), int(len(points) - np.count_nonzero(mask)), radius)
+
+    return (data.select(mask) if report.removed > 0 else data), report
@@ -0,0 +1,448 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import hashlib
+import json
+import os
+import warnings
+
+import numpy as np
+
+SIDECAR_SUFFIX = '.cache'
+SIDECAR_VERSION = 1
+
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1',
+    'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2',
+    'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4',
+    'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4',
+    'double': 'f8', 'float64': 'f8'
+}
+
+PLY_FORMATS = {
+    'ascii': None,
+    'binary_little_endian': '<',
+    'binary_big_endian': '>'
+}
+
+POINTS_PROPERTIES = ('x', 'y', 'z')
+COLORS_PROPERTIES = ('red', 'green', 'blue')
+NORMALS_PROPERTIES = ('nx', 'ny', 'nz')
+
+
+@dataclass
+class PointCloudData:
+    """
+    Point cloud attributes as contiguous NumPy arrays, shared by all strategies.
+
+    ``points`` and ``normals`` are ``float64`` arrays with shape ``(N, 3)``,
+    ``colors`` keeps the ``uint8`` RGB values of the PLY file (or floats in the [0, 1]
+    range when given as arrays). When loaded from a sidecar cache, the arrays are
+    copy-on-write memory maps.
+    """
+
+    points: np.ndarray
+    colors: Optional[np.ndarray] = None
+    normals: Optional[np.ndarray] = None
+    digest: str = ''
+
+    def __len__(self):
+        return len(self.points)
+
+    def normalized_colors(self) -> Optional[np.ndarray]:
+        """
+        Colors as ``float64`` values in the [0, 1] range, as expected by open3d/pymeshlab
+        """
+        if self.colors is None:
+            return None
+
+        if self.colors.dtype.kind == 'f':
+            return np.ascontiguousarray(self.colors, dtype=np.float64)
+
+        return self.colors.astype(np.float64) / 255.0
+
+    def select(self, mask: np.ndarray) -> PointCloudData:
+        """
+        The points of a boolean mask (or an index array), with their colors and normals
+        """
+        return PointCloudData(
+            points=np.asarray(self.points)[mask],
+            colors=None if self.colors is None else np.asarray(self.colors)[mask],
+            normals=None if self.normals is None else np.asarray(self.normals)[mask]
+        )
+
+    @classmethod
+    def concatenate(cls, chunks: List[PointCloudData]) -> PointCloudData:
+        """
+        The points of several point clouds (e.g the chunks of a file), with their colors and normals
+        when all of them have them
+        """
+        if len(chunks) == 1:
+            return chunks[0]
+
+        def attribute(name: str) -> Optional[np.ndarray]:
+            arrays = [getattr(chunk, name) for chunk in chunks]
+            return None if any(array is None for array in arrays) else np.concatenate(arrays)
+
+        return cls(
+            points=np.concatenate([chunk.points for chunk in chunks]),
+            colors=attribute('colors'),
+            normals=attribute('normals')
+        )
+
+
+@dataclass
+class PlyHeader:
+    format: str
+    vertex_count: int
+    properties: List[Tuple[str, str]]
+    elements: List[str]
+    offset: int
+
+
+def is_ply(file_path: str) -> bool:
+    return os.path.splitext(file_path)[1].lower() == '.ply'
+
+
+def read_ply_header(file_path: str) -> PlyHeader:
+    """
+    Parse the header of a .ply file, keeping only the "vertex" element properties
+
+    :param file_path: The .ply file path
+    :raises ValueError: If the file is not a point cloud .ply supported by this reader
+    :return: The parsed header with the byte offset where the body starts
+    """
+    ply_format = None
+    vertex_count = 0
+    properties = []
+    elements = []
+
+    with open(file_path, 'rb') as file:
+        if file.readline().strip() != b'ply':
+            raise ValueError(f'The file "{file_path}" is not a .ply file')
+
+        while True:
+            line = file.readline()
+            if not line:
+                raise ValueError(f'The .ply file "{file_path}" has no "end_header" line')
+
+            words = line.decode('ascii', errors='replace').split()
+            if not words or words[0] in ('comment', 'obj_info'):
+                continue
+
+            if words[0] == 'end_header':
+                break
+            elif words[0] == 'format':
+                ply_format = words[1]
+            elif words[0] == 'element':
+                elements.append(words[1])
+                if words[1] == 'vertex':
+                    vertex_count = int(words[2])
+            elif words[0] == 'property' and elements and elements[-1] == 'vertex':
+                if words[1] == 'list':
+                    raise ValueError(
+                        f'List properties in the vertex element of "{file_path}" are not supported'
+                    )
+                if words[1] not in PLY_TYPES:
+                    raise ValueError(f'Unknown property type "{words[1]}" in "{file_path}"')
+
+                properties.append((words[2], PLY_TYPES[words[1]]))
+
+        offset = file.tell()
+
+    if ply_format not in PLY_FORMATS:
+        raise ValueError(f'Unsupported .ply format "{ply_format}" in "{file_path}"')
+
+    if 'vertex' not in elements:
+        raise ValueError(f'The .ply file "{file_path}" has no "vertex" element')
+
+    missing = [name for name in POINTS_PROPERTIES if name not in dict(properties)]
+    if missing:
+        raise ValueError(f'The .ply file "{file_path}" has no {missing} vertex properties')
+
+    return PlyHeader(ply_format, vertex_count, properties, elements, offset)
+
+
+def ply_has_colors(file_path: str) -> bool:
+    """
+    If the vertices of a .ply file have colors, reading only its header
+
+    :param file_path: The .ply file path
+    :raises ValueError: If the file is not a point cloud .ply supported by this reader
+    :return: If the vertex element has the color properties
+    """
+    properties = dict(read_ply_header(file_path).properties)
+
+    return all(name in properties for name in COLORS_PROPERTIES)
+
+
+def _columns(table: np.ndarray, header: PlyHeader, names: tuple, dtype) -> Optional[np.ndarray]:
+    property_names = [name for name, _ in header.properties]
+
+    if not all(name in property_names for name in names):
+        return None
+
+    if table.dtype.names:
+        columns = np.empty((len(table), len(names)), dtype=dtype)
+        for i, name in enumerate(names):
+            columns[:, i] = table[name]
+        return columns
+
+    indexes = [property_names.index(name) for name in names]
+    return np.ascontiguousarray(table[:, indexes], dtype=dtype)
+
+
+def parse_ply(file_path: str) -> PointCloudData:
+    """
+    Read the vertices of a .ply point cloud in bulk with NumPy, without any per line parsing
+
+    :param file_path: The .ply file path
+    :return: The points, colors and normals found in the file
+    """
+    header = read_ply_header(file_path)
+    count = header.vertex_count
+
+    if header.format == 'ascii':
+        with open(file_path, 'rb') as file:
+            file.seek(header.offset)
+            body = file.read()
+
+        if header.elements != ['vertex']:
+            # Other elements (e.g faces) come after the vertices, keep only the first lines
+            body = b'\n'.join(body.split(b'\n', count)[:count])
+
+        values = np.fromstring(body.decode('ascii'), dtype=np.float64, sep=' ')
+        expected = count * len(header.properties)
+
+        if values.size < expected:
+            raise ValueError(
+                f'The .ply file "{file_path}" has {values.size} values, expected {expected}'
+            )
+
+        table = values[:expected].reshape(count, len(header.properties))
+    else:
+        byte_order = PLY_FORMATS[header.format]
+        dtype = np.dtype([(name, byte_order + kind) for name, kind in header.properties])
+        table = np.fromfile(file_path, dtype=dtype, count=count, offset=header.offset)
+
+    return PointCloudData(
+        points=_columns(table, header, POINTS_PROPERTIES, np.float64),
+        colors=_columns(table, header, COLORS_PROPERTIES, np.uint8),
+        normals=_columns(table, header, NORMALS_PROPERTIES, np.float64)
+    )
+
+
+def sidecar_path(file_path: str) -> str:
+    return os.path.abspath(file_path) + SIDECAR_SUFFIX
+
+
+def _hash_file(file_path: str, chunk_size=1 << 20) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def data_digest(data: PointCloudData) -> str:
+    """
+    Content hash of the point cloud arrays, identifying point clouds not loaded from a file
+
+    :param data: The point cloud arrays
+    :return: The hexadecimal digest
+    """
+    digest = hashlib.blake2b(digest_size=20)
+
+    for name in ('points', 'colors', 'normals'):
+        array = getattr(data, name)
+        digest.update(name.encode('ascii'))
+
+        if array is not None:
+            array = np.ascontiguousarray(array)
+            digest.update(f'{array.dtype.str}{array.shape}'.encode('ascii'))
+            digest.update(memoryview(array).cast('B'))
+
+    return digest.hexdigest()
+
+
+def _read_meta(sidecar: str) -> dict:
+    try:
+        with open(os.path.join(sidecar, 'meta.json')) as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+    return meta if meta.get('version') == SIDECAR_VERSION else {}
+
+
+def _write_meta(sidecar: str, meta: dict):
+    meta_file = os.path.join(sidecar, 'meta.json')
+
+    with open(meta_file + '.tmp', 'w') as file:
+        json.dump(meta, file)
+
+    os.replace(meta_file + '.tmp', meta_file)
+
+
+def _validate_sidecar(file_path: str, sidecar: str) -> Tuple[dict, bool]:
+    """
+    Check if the sidecar matches the file. Size and mtime are checked first,
+    and the file is only hashed again when the mtime changed.
+
+    :return: The file metadata (size, mtime, digest) and if the sidecar is valid
+    """
+    stat = os.stat(file_path)
+    meta = _read_meta(sidecar)
+
+    if meta.get('size') == stat.st_size and meta.get('mtime_ns') == stat.st_mtime_ns:
+        return meta, True
+
+    digest = _hash_file(file_path)
+    current = {
+        'version': SIDECAR_VERSION,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'digest': digest
+    }
+
+    if meta.get('size') == stat.st_size and meta.get('digest') == digest:
+        # Touched but unchanged file: only refresh the mtime
+        meta.update(current)
+        try:
+            _write_meta(sidecar, meta)
+        except OSError:
+            pass
+        return meta, True
+
+    return current, False
+
+
+def file_digest(file_path: str) -> str:
+    """
+    Content hash of a file. Reuses the digest stored in the sidecar cache when
+    the file size and mtime were not changed
+
+    :param file_path: Any file path
+    :return: The hexadecimal digest
+    """
+    meta, _ = _validate_sidecar(file_path, sidecar_path(file_path))
+    return meta['digest']
+
+
+def _load_sidecar(sidecar: str, meta: dict, mmap: bool) -> PointCloudData:
+    mmap_mode = 'c' if mmap else None
+    arrays = {}
+
+    for name in meta['arrays']:
+        arrays[name] = np.load(os.path.join(sidecar, f'{name}.npy'), mmap_mode=mmap_mode)
+
+    return PointCloudData(digest=meta['digest'], **arrays)
+
+
+def _write_sidecar(sidecar: str, meta: dict, data: PointCloudData):
+    os.makedirs(sidecar, exist_ok=True)
+
+    # Invalidate first, so an interrupted write is never read back
+    meta_file = os.path.join(sidecar, 'meta.json')
+    if os.path.exists(meta_file):
+        os.remove(meta_file)
+
+    names = []
+    for name in ('points', 'colors', 'normals'):
+        array = getattr(data, name)
+        if array is not None:
+            np.save(os.path.join(sidecar, f'{name}.npy'), array)
+            names.append(name)
+
+    _write_meta(sidecar, dict(meta, arrays=names, vertex_count=len(data)))
+
+
+def read_point_cloud(file_path: str, use_cache=True, mmap=True) -> PointCloudData:
+    """
+    Load a .ply point cloud. The first read parses the file in bulk and writes a
+    binary sidecar (``<file>.cache`` folder) keyed by size, mtime and content hash.
+    Next reads memory-map the sidecar arrays, without parsing the file again.
+
+    :param file_path: The .ply point cloud file path
+    :param use_cache: Read/write the binary sidecar cache
+    :param mmap: Memory-map the sidecar arrays instead of read them into memory
+    :raises ValueError: If the file is not a point cloud .ply supported by this reader
+    :return: The point cloud arrays
+    """
+    if not use_cache:
+        data = parse_ply(file_path)
+        data.digest = _hash_file(file_path)
+        return data
+
+    sidecar = sidecar_path(file_path)
+    meta, valid = _validate_sidecar(file_path, sidecar)
+
+    if valid:
+        try:
+            return _load_sidecar(sidecar, meta, mmap)
+        except (OSError, KeyError, ValueError):
+            pass
+
+    data = parse_ply(file_path)
+    data.digest = meta['digest']
+
+    try:
+        _write_sidecar(sidecar, meta, data)
+    except OSError as error:
+        warnings.warn(f'Could not write the sidecar cache "{sidecar}": {error}')
+        return data
+
+    return _load_sidecar(sidecar, _read_meta(sidecar), mmap) if mmap else data
+
+
+def write_ply(file_path: str, data: PointCloudData, binary=True):
+    """
+    Write a point cloud .ply file (binary little endian by default), with
+    ``double`` positions/normals and ``uchar`` colors
+
+    :param file_path: The .ply file path
+    :param data: The point cloud arrays
+    :param binary: Write a binary file instead of an ASCII one
+    """
+    fields = [(name, '<f8') for name in POINTS_PROPERTIES]
+    arrays = [(POINTS_PROPERTIES, data.points)]
+
+    if data.normals is not None:
+        fields += [(name, '<f8') for name in NORMALS_PROPERTIES]
+        arrays.append((NORMALS_PROPERTIES, data.normals))
+
+    if data.colors is not None:
+        colors = data.colors
+        if colors.dtype.kind == 'f':
+            colors = np.round(colors * 255)
+
+        fields += [(name, 'u1') for name in COLORS_PROPERTIES]
+        arrays.append((COLORS_PROPERTIES, colors))
+
+    table = np.empty(len(data.points), dtype=fields)
+    for names, array in arrays:
+        for i, name in enumerate(names):
+            table[name] = array[:, i]
+
+    ply_types = {'<f8': 'double', 'u1': 'uchar'}
+    header = [
+        'ply',
+        f'format {"binary_little_endian" if binary else "ascii"} 1.0',
+        f'element vertex {len(table)}'
+    ]
+    header += [f'property {ply_types[kind]} {name}' for name, kind in fields]
+    header.append('end_header')
+
+    with open(file_path, 'wb') as file:
+        file.write(('\n'.join(header) + '\n').encode('ascii'))
+
+        if binary:
+            table.tofile(file)
+        else:
+            formats = ' '.join('%d' if kind == 'u1' else '%.17g' for _, kind in fields)
+            np.savetxt(file, table, fmt=formats)
@@ -0,0 +1,188 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, List, Optional, Tuple
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Peak RSS of the process before the last reset_peak_rss()
+_cleared_peak_rss = 0
+
+
+def _kernel_peak_rss() -> int:
+    if resource is None:
+        return 0
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak_rss * (1 if sys.platform == 'darwin' else 1024)
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the peak RSS tracked by the kernel (Linux only), so the next reading measures
+    the peak of a single stage. memory_usage() still reports the peak of the whole process
+
+    :return: If the peak was reset
+    """
+    global _cleared_peak_rss
+    peak_rss = memory_usage()[1]
+
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+    except OSError:
+        return False
+
+    _cleared_peak_rss = peak_rss
+    return True
+
+
+def memory_usage() -> Tuple[int, int]:
+    """
+    Current and peak resident set size (RSS) of this process, in bytes.
+    Returns zeros when the platform doesn't provide them
+
+    :return: The tuple ``(rss, peak_rss)``
+    """
+    rss = 0
+    peak_rss = max(_kernel_peak_rss(), _cleared_peak_rss)
+
+    try:
+        with open('/proc/self/statm') as file:
+            rss = int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        rss = peak_rss
+
+    return rss, peak_rss
+
+
+@dataclass
+class StageMetrics:
+    name: str
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    start_rss: int = 0
+    rss_delta: int = 0
+    peak_rss: int = 0
+    stage_peak_rss: int = 0
+    peak_rss_delta: int = 0
+    python_memory_peak: int = 0
+    input_sizes: Dict[str, int] = field(default_factory=dict)
+    output_sizes: Dict[str, int] = field(default_factory=dict)
+    error: str = ''
+
+
+class StageProfiler:
+    """
+    Measure each stage of a reconstruction: wall time, CPU time of all threads,
+    RSS growth, peak RSS and the sizes of the geometries (points, vertices, triangles)
+    before and after the stage. On Linux, the kernel peak RSS is reset at the start of each
+    stage, so ``stage_peak_rss`` is the peak of the stage itself.
+
+    Python allocations (including NumPy arrays) are measured with ``tracemalloc``
+    when ``trace_python_memory`` is enabled, since tracing slows down the allocations.
+    """
+
+    def __init__(self, trace_python_memory=False):
+        self.trace_python_memory = trace_python_memory
+        self.stages: List[StageMetrics] = []
+
+        # Called with "start"/"end" and the stage metrics, e.g to report the progress
+        self.listeners: List[Callable[[str, StageMetrics], None]] = []
+
+    def clear(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name: str, sizes: Optional[Callable[[], dict]] = None):
+        """
+        Context manager that records the metrics of the code inside it as a stage
+
+        :param name: The stage name (e.g a filter/method name)
+        :param sizes: Returns the current geometry sizes, called before and after the stage
+        """
+        metrics = StageMetrics(name, input_sizes=sizes() if sizes else {})
+        self._notify('start', metrics)
+        tracing = self.trace_python_memory
+
+        if tracing:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            elif hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+
+        python_memory_start = tracemalloc.get_traced_memory()[0] if tracing else 0
+        rss_start, peak_rss_start = memory_usage()
+        peak_reset = reset_peak_rss()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+
+        try:
+            yield metrics
+        except BaseException as error:
+            metrics.error = repr(error)
+            raise
+        finally:
+            metrics.wall_time = time.perf_counter() - wall_start
+            metrics.cpu_time = time.process_time() - cpu_start
+
+            rss, metrics.peak_rss = memory_usage()
+            metrics.start_rss = rss_start
+            metrics.stage_peak_rss = _kernel_peak_rss() if peak_reset else metrics.peak_rss
+            metrics.rss_delta = rss - rss_start
+            metrics.peak_rss_delta = metrics.peak_rss - peak_rss_start
+
+            if tracing:
+                metrics.python_memory_peak = max(
+                    0, tracemalloc.get_traced_memory()[1] - python_memory_start
+                )
+
+            if sizes:
+                metrics.output_sizes = sizes()
+
+            self.stages.append(metrics)
+            self._notify('end', metrics)
+
+    def _notify(self, event: str, metrics: StageMetrics):
+        for listener in self.listeners:
+            listener(event, metrics)
+
+    def report(self) -> dict:
+        """
+        The metrics of all stages, and their totals
+
+        :return: A JSON serializable dictionary
+        """
+        return {
+            'stages': [asdict(stage) for stage in self.stages],
+            'wall_time': sum(stage.wall_time for stage in self.stages),
+            'cpu_time': sum(stage.cpu_time for stage in self.stages),
+            'peak_rss': max((stage.peak_rss for stage in self.stages), default=0)
+        }
+
+    def format_report(self) -> str:
+        """
+        The stages metrics as a text table, slowest stage first
+        """
+        header = (
+            f'{"stage":<45}{"wall (s)":>10}{"cpu (s)":>10}{"rss +MB":>10}{"peak MB":>10}  sizes'
+        )
+        lines = [header, '-' * len(header)]
+
+        for stage in sorted(self.stages, key=lambda item: item.wall_time, reverse=True):
+            sizes = ' '.join(f'{key}={value}' for key, value in stage.output_sizes.items())
+            lines.append(
+                f'{stage.name:<45}{stage.wall_time:>10.3f}{stage.cpu_time:>10.3f}'
+                f'{stage.rss_delta / 2 ** 20:>10.1f}{stage.peak_rss / 2 ** 20:>10.1f}  {sizes}'
+            )
+
+        return '\n'.join(lines)
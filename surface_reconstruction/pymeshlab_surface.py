@@ -1,10 +1,24 @@
 from .surface_strategy import SurfaceStrategy
+from .strategy_hooks import StrategyHooks
+from .mesh_data import MeshData
+from .point_cloud_io import PointCloudData, is_ply, ply_has_colors, read_point_cloud
+from typing import Optional
+import numpy as np
 import pymeshlab
+import os
+import warnings
 
 
-class PyMeshlabSurface(SurfaceStrategy):
+class PyMeshlabSurface(SurfaceStrategy, StrategyHooks):
 
     parameters = {
+      # Disabled by default, enabled passing a "min_bound" and/or a "max_bound" in the filters
+      'crop': {},
+      # Disabled by default, enabled passing a "voxel_size" in the filters
+      'voxel_downsample': {},
+      # Disabled by default, enabled passing a "mode" ("statistical" or "radius") and/or its
+      # parameters in the filters
+      'outlier_removal': {},
       'point_cloud_simplification': [
         {
           'name': 'samplenum',
@@ -54,6 +68,12 @@ class PyMeshlabSurface(SurfaceStrategy):
           'value': [0, 0, 0]
         }
       ],
+      # Disabled by default, enabled passing a "mode" ("up", "viewpoint" or "hybrid") in the filters
+      'orient_normals': {},
+      # Disabled by default, enabled passing a "wall_time" and/or a "peak_rss" budget in the filters
+      'auto_depth': {},
+      # Disabled by default, enabled passing a "peak_rss" budget (bytes) in the filters
+      'memory_budget': {},
       'surface_reconstruction_screened_poisson': [
         {
           'name': 'depth',
@@ -105,55 +125,310 @@ class PyMeshlabSurface(SurfaceStrategy):
           'description': 'Pre-Clean',
           'value': False
         }
-      ]
+      ],
+      # Disabled by default, enabled passing a "quantile" and/or a "threshold" in the filters
+      'density_trimming': {},
+      # Disabled by default, enabled passing a "target_triangles" or a "reduction" in the filters
+      'simplify_mesh': {}
     }
 
+    normal_stages = ('compute_normals_for_point_sets', 'orient_normals')
+
     # noinspection PyArgumentList
     def __init__(self, point_cloud_file="", output_file="", filter_script_file="", clean_up=True):
         self.mesh_set = pymeshlab.MeshSet()
         self.point_cloud = pymeshlab.Mesh()
         self.mesh = pymeshlab.Mesh()
+        self._point_cloud_id = 0
 
         super().__init__(point_cloud_file, output_file, filter_script_file, clean_up)
 
+    # noinspection PyArgumentList
+    def reset(self, point_cloud_file="", output_file=""):
+        # Release the references to the meshes of the set, before clear it
+        self.point_cloud = pymeshlab.Mesh()
+        self.mesh = pymeshlab.Mesh()
+        self.mesh_set.clear()
+
+        super().reset(point_cloud_file, output_file)
+
     def load_file(self, file_path: str) -> pymeshlab.Mesh:
+        data = None
+
+        if is_ply(file_path):
+            try:
+                # A colored point cloud is parsed only by pymeshlab if this version can't receive
+                # the colors from the arrays
+                if self.vertex_colors_supported() or not ply_has_colors(file_path):
+                    data = read_point_cloud(file_path)
+            except ValueError as error:
+                if self.verbose:
+                    print(f'Fallback to the pymeshlab reader: {error}')
+
+        if data is not None:
+            return self.load_data(data, os.path.basename(file_path))
+
+        self.point_cloud_data = None
         self.mesh_set.load_new_mesh(file_path)
 
+        return self._point_cloud_loaded()
+
+    def load_data(self, data: PointCloudData, name='point_cloud') -> pymeshlab.Mesh:
+        """
+        Load a point cloud from NumPy arrays, without any file
+
+        :param data: The point cloud arrays
+        :param name: The name of the point cloud layer in the mesh set
+        :return: The point cloud mesh
+        """
+        self.point_cloud_data = data
+        self.mesh_set.add_mesh(self.create_mesh(data), name)
+
+        return self._point_cloud_loaded()
+
+    def _point_cloud_loaded(self) -> pymeshlab.Mesh:
         if len(self.filter_script_file) > 0:
             self.mesh_set.load_filter_script(self.filter_script_file)
 
         self.point_cloud = self.mesh_set.current_mesh()
+        self._point_cloud_id = self.mesh_set.current_mesh_id()
         return self.mesh_set.current_mesh()
 
+    @staticmethod
+    def vertex_colors_supported() -> bool:
+        # "v_color_matrix" was added to pymeshlab.Mesh in pymeshlab 2021.10
+        return 'v_color_matrix' in (pymeshlab.Mesh.__init__.__doc__ or '')
+
+    @staticmethod
+    def vertex_colors(mesh: pymeshlab.Mesh) -> Optional[np.ndarray]:
+        """
+        The vertex colors of a pymeshlab mesh, without the alpha channel
+
+        :param mesh: The mesh
+        :return: The colors in the [0, 1] range, or None if the mesh has no colors or this pymeshlab
+            version can't return them
+        """
+        # "vertex_color_matrix" is missing from the meshes of the old pymeshlab versions (e.g 0.2)
+        if not hasattr(mesh, 'vertex_color_matrix'):
+            return None
+
+        if hasattr(mesh, 'has_vertex_color') and not mesh.has_vertex_color():
+            return None
+
+        return mesh.vertex_color_matrix()[:, :3]
+
+    @classmethod
+    def create_mesh(cls, data: PointCloudData) -> pymeshlab.Mesh:
+        """
+        Create a pymeshlab mesh from NumPy arrays, without parsing any file.
+        The colors are dropped, with a warning, if this pymeshlab version can't receive them
+
+        :param data: The point cloud arrays
+        :return: The mesh
+        """
+        params = {'vertex_matrix': np.asarray(data.points, dtype=np.float64)}
+
+        if data.normals is not None:
+            params['v_normals_matrix'] = np.asarray(data.normals, dtype=np.float64)
+
+        if data.colors is not None:
+            if cls.vertex_colors_supported():
+                colors = data.normalized_colors()
+                params['v_color_matrix'] = np.hstack([colors, np.ones((len(colors), 1))])
+            else:
+                warnings.warn(
+                    'This pymeshlab version can\'t receive vertex colors, the colors of the point '
+                    'cloud are dropped'
+                )
+
+        # noinspection PyArgumentList
+        return pymeshlab.Mesh(**params)
+
+    def point_cloud_arrays(self) -> PointCloudData:
+        mesh = self.mesh_set.current_mesh()
+
+        # Whatever the reader of the point cloud, except the arrays given without colors
+        colors = None
+        if self.point_cloud_data is None or self.point_cloud_data.colors is not None:
+            colors = self.vertex_colors(mesh)
+
+        if colors is not None:
+            colors = np.clip(np.round(colors * 255), 0, 255).astype(np.uint8)
+
+        return PointCloudData(
+            points=mesh.vertex_matrix(), colors=colors, normals=mesh.vertex_normal_matrix()
+        )
+
+    # noinspection PyArgumentList
+    def set_point_cloud_arrays(self, data: PointCloudData):
+        # Replace the point cloud layer, instead of adding a layer by call (e.g each node of a
+        # sweep)
+        if self.mesh_set.number_meshes() > 0 and self.mesh_set.mesh_id_exists(self._point_cloud_id):
+            self.point_cloud = pymeshlab.Mesh()
+            self.mesh_set.set_current_mesh(self._point_cloud_id)
+            self.mesh_set.delete_current_mesh()
+
+        self.mesh_set.add_mesh(self.create_mesh(data), 'point_cloud')
+        self.point_cloud = self.mesh_set.current_mesh()
+        self._point_cloud_id = self.mesh_set.current_mesh_id()
+
+    def set_mesh_arrays(self, mesh: MeshData, densities=None):
+        params = {
+            'vertex_matrix': np.asarray(mesh.vertices, dtype=np.float64),
+            'face_matrix': np.asarray(mesh.faces, dtype=np.int32)
+        }
+
+        if mesh.normals is not None:
+            params['v_normals_matrix'] = np.asarray(mesh.normals, dtype=np.float64)
+
+        # The screened Poisson filter stores the densities as the vertex quality
+        if densities is not None:
+            params['v_quality_array'] = np.asarray(densities, dtype=np.float64)
+
+        if mesh.colors is not None and self.vertex_colors_supported():
+            colors = np.asarray(mesh.colors, dtype=np.float64)
+            params['v_color_matrix'] = np.hstack([colors, np.ones((len(colors), 1))])
+
+        # noinspection PyArgumentList
+        self.mesh_set.add_mesh(pymeshlab.Mesh(**params), 'cached_mesh')
+        self.mesh = self.mesh_set.current_mesh()
+        self.densities = densities
+
+    def keeps_colors(self) -> bool:
+        # Old pymeshlab versions would drop the colors of the cached point clouds and meshes
+        return self.vertex_colors_supported() or (
+            self.point_cloud_data is not None and self.point_cloud_data.colors is None
+        )
+
+    def normals_key(self, filters: dict):
+        if not self.keeps_colors():
+            return None
+
+        return super().normals_key(filters)
+
+    def stage_keys(self, filters: dict):
+        if not self.keeps_colors():
+            return []
+
+        return super().stage_keys(filters)
+
+    def density_trimming(self, quantile=0.0, threshold=0.0):
+        threshold = self.density_threshold(quantile, threshold)
+        if threshold is None:
+            return self
+
+        # The screened Poisson filter stores the densities as the vertex quality
+        self.mesh_set.apply_filter('conditional_vertex_selection', condselect=f'q < {threshold!r}')
+        self.mesh_set.apply_filter('delete_selected_vertices')
+
+        # The deleted vertices and faces are only flagged, compact the mesh before reading its
+        # arrays (MissingCompactnessException otherwise)
+        self.mesh_set.apply_filter('compact_faces')
+        self.mesh_set.apply_filter('compact_vertices')
+        self.densities = self.mesh_set.current_mesh().vertex_quality_array()
+
+        return self
+
+    def simplify_mesh(self, target_triangles=0, reduction=0.0):
+        target = self.simplification_target(
+            self.mesh_set.current_mesh().face_number(), target_triangles, reduction
+        )
+        if target is None:
+            return self
+
+        self.mesh_set.apply_filter(
+            'simplification_quadric_edge_collapse_decimation',
+            targetfacenum=target,
+            preservenormal=True
+        )
+
+        # The vertices were merged, their densities are gone
+        self.densities = None
+
+        return self
+
+    def geometry_sizes(self) -> dict:
+        if self.mesh_set.number_meshes() == 0:
+            return {'points': 0, 'vertices': 0, 'triangles': 0}
+
+        mesh = self.mesh_set.current_mesh()
+
+        return {
+            'points': self.point_cloud.vertex_number(),
+            'vertices': mesh.vertex_number(),
+            'triangles': mesh.face_number()
+        }
+
+    def mesh_data(self) -> MeshData:
+        mesh = self.mesh_set.current_mesh()
+
+        return MeshData(
+            vertices=mesh.vertex_matrix(),
+            faces=mesh.face_matrix(),
+            normals=mesh.vertex_normal_matrix(),
+            colors=self.vertex_colors(mesh)
+        )
+
+    def load_mesh(self, file_path: str) -> pymeshlab.Mesh:
+        self.mesh_set.load_new_mesh(file_path)
+        self.mesh = self.mesh_set.current_mesh()
+        return self.mesh
+
+    def save_mesh(self, file_path: str) -> bool:
+        self.mesh_set.save_current_mesh(
+          file_path,
+          save_vertex_color=True,
+          save_vertex_normal=True,
+          save_face_color=True,
+          binary=True
+        )
+        return True
+
+    def apply_filter(self, name: str, params_key_values: dict):
+        if name == 'density_trimming':
+            self.density_trimming(**params_key_values)
+        elif name == 'simplify_mesh':
+            self.simplify_mesh(**params_key_values)
+        else:
+            self.mesh_set.apply_filter(name, **params_key_values)
+
+        if name == 'surface_reconstruction_screened_poisson':
+            self.densities = self.mesh_set.current_mesh().vertex_quality_array()
+        elif self.mesh_set.current_mesh().face_number() == 0:
+            # A filter creating a new point cloud layer (e.g the simplification)
+            self.point_cloud = self.mesh_set.current_mesh()
+            self._point_cloud_id = self.mesh_set.current_mesh_id()
+
+        self.applied_filters = True
+
+    def select_point_cloud(self):
+        # Discard the mesh of a previous level, the Poisson filter creates a new layer from the
+        # current one
+        if self.mesh_set.current_mesh_id() != self._point_cloud_id:
+            self.mesh_set.delete_current_mesh()
+            self.mesh_set.set_current_mesh(self._point_cloud_id)
+
     def poisson_mesh(self, save_file=True, **params: {}) -> pymeshlab.Mesh:
 
         self.applied_filters = False
 
+        output_file = params.pop('output_file', self.output_file)
+
+        if self.load_cached_result(save_file, output_file, **params):
+            return self.mesh_set.current_mesh()
+
         if len(self.filter_script_file) > 0:
-            self.mesh_set.apply_filter_script()
+            with self.profiler.stage('apply_filter_script', self.geometry_sizes):
+                self.mesh_set.apply_filter_script()
             self.applied_filters = True
         else:
-            def apply_filter(name: str, params_key_values: dict):
-                self.mesh_set.apply_filter(name, **params_key_values)
-                self.applied_filters = True
-
-            self.poisson_filters(callback=apply_filter, **params)
+            self.poisson_filters(callback=self.apply_filter, **params)
 
         # Save the generated Surface in a .ply file
         if save_file:
+            with self.profiler.stage('save_mesh', self.geometry_sizes):
+                self.write_mesh(output_file)
 
-            output_file = self.output_file
-
-            if 'output_file' in params:
-                output_file = params.get('output_file')
-                del params['output_file']
-
-            self.mesh_set.save_current_mesh(
-              output_file,
-              save_vertex_color=True,
-              save_vertex_normal=True,
-              save_face_color=True,
-              binary=True
-            )
+        self.store_result(save_file, output_file)
 
         return self.mesh_set.current_mesh()
@@ -0,0 +1,145 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .mesh_data import MeshData
+
+
+@dataclass
+class QualityMetrics:
+    """
+    Distances between the input points and the output mesh surface, in point cloud units:
+
+    - ``chamfer``: mean distance from the points to the mesh plus mean distance from the mesh to the
+      points
+    - ``hausdorff_points``: maximum distance from a point to the mesh (missing surface, e.g trimmed
+      holes)
+    - ``hausdorff_mesh``: maximum distance from the mesh to a point (extra surface, e.g Poisson
+      bubbles)
+    - ``hausdorff``: the greatest of both one-sided distances
+    - ``normal_consistency``: mean absolute cosine between the point normals and the nearest face
+      normals
+    - ``within_tolerance``: fraction of points within ``tolerance`` of the mesh
+    """
+
+    points: int
+    samples: int
+    chamfer: float
+    mean_points: float
+    mean_mesh: float
+    hausdorff_points: float
+    hausdorff_mesh: float
+    hausdorff: float
+    tolerance: float
+    within_tolerance: float
+    normal_consistency: Optional[float] = None
+
+
+def sample_surface(mesh: MeshData, count: int, seed=0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Points uniformly distributed on the mesh surface (the triangles picked by area), with the
+    normal of their triangle. The vertices are included, so small meshes are fully covered
+
+    :param mesh: The mesh
+    :param count: The number of random samples, added to the vertices
+    :param seed: The random generator seed
+    :return: The samples and their normals, with shape ``(vertices + count, 3)``
+    """
+    triangles = mesh.vertices[mesh.faces]
+    cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    areas = np.linalg.norm(cross, axis=1)
+    face_normals = cross / np.where(areas > 0, areas, 1)[:, None]
+
+    rng = np.random.default_rng(seed)
+    faces = (
+        rng.choice(len(areas), size=count, p=areas / areas.sum())
+        if areas.sum() > 0
+        else np.zeros(0, dtype=np.int64)
+    )
+
+    # Uniform barycentric coordinates: the samples of the second half of the square are folded back
+    u, v = rng.random((2, len(faces)))
+    folded = u + v > 1
+    u[folded], v[folded] = 1 - u[folded], 1 - v[folded]
+
+    samples = (
+        triangles[faces, 0]
+        + u[:, None] * (triangles[faces, 1] - triangles[faces, 0])
+        + v[:, None] * (triangles[faces, 2] - triangles[faces, 0])
+    )
+
+    # The normal of a vertex: the normal of a face using it
+    vertex_normals = np.zeros_like(mesh.vertices)
+    vertex_normals[mesh.faces.ravel()] = np.repeat(face_normals, 3, axis=0)
+
+    normals = np.concatenate([vertex_normals, face_normals[faces]])
+    return np.concatenate([mesh.vertices, samples]), normals
+
+
+def compare(
+        points: np.ndarray,
+        mesh: MeshData,
+        normals: Optional[np.ndarray] = None,
+        tolerance: Optional[float] = None,
+        samples: Optional[int] = None,
+        seed=0
+) -> QualityMetrics:
+    """
+    Compare the input points with the reconstructed mesh of any strategy. The mesh surface is
+    represented by dense samples, and the nearest neighbors of both sides are found with batched
+    KD-tree queries, so millions of points are compared in seconds
+
+    :param points: The input points with shape ``(N, 3)``
+    :param mesh: The reconstructed mesh
+    :param normals: The point normals, for the normal consistency
+    :param tolerance: The distance of the ``within_tolerance`` fraction. Defaults to the median
+        point spacing
+    :param samples: The number of samples of the mesh surface. Defaults to the number of points or
+        faces (the largest)
+    :param seed: The random generator seed of the samples
+    :raises ValueError: If the mesh has no faces or there are no points
+    :return: The metrics
+    """
+    from .spatial import KDTree
+
+    points = np.asarray(points, dtype=np.float64)
+
+    if mesh.face_number == 0 or len(points) == 0:
+        raise ValueError('The quality metrics need points and a mesh with faces')
+
+    surface, surface_normals = sample_surface(
+        mesh, samples or max(len(points), mesh.face_number), seed
+    )
+
+    points_tree = KDTree(points)
+    to_mesh, nearest = KDTree(surface).query(points)
+    to_points, _ = points_tree.query(surface)
+    to_mesh, nearest, to_points = to_mesh[:, 0], nearest[:, 0], to_points[:, 0]
+
+    if tolerance is None:
+        spacing, _ = points_tree.query(points, k=2)
+        tolerance = float(np.median(spacing[:, -1]))
+
+    consistency = None
+    if normals is not None:
+        normals = np.asarray(normals, dtype=np.float64)
+        lengths = np.linalg.norm(normals, axis=1) * np.linalg.norm(surface_normals[nearest], axis=1)
+        dots = np.einsum('ij,ij->i', normals, surface_normals[nearest])
+        cosines = np.abs(dots) / np.where(lengths > 0, lengths, 1)
+        consistency = float(cosines[lengths > 0].mean()) if (lengths > 0).any() else None
+
+    return QualityMetrics(
+        points=len(points),
+        samples=len(surface),
+        chamfer=float(to_mesh.mean() + to_points.mean()),
+        mean_points=float(to_mesh.mean()),
+        mean_mesh=float(to_points.mean()),
+        hausdorff_points=float(to_mesh.max()),
+        hausdorff_mesh=float(to_points.max()),
+        hausdorff=float(max(to_mesh.max(), to_points.max())),
+        tolerance=tolerance,
+        within_tolerance=float(np.mean(to_mesh <= tolerance)),
+        normal_consistency=consistency
+    )
@@ -0,0 +1,148 @@
+from __future__ import annotations
+from typing import Optional
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+CACHE_ENV = 'SURFACE_RECONSTRUCTION_CACHE'
+
+
+def default_cache_dir(*names: str) -> str:
+    """
+    Cache folder used by this package. Defaults to ``~/.cache/surface_reconstruction``
+    and can be changed with the ``SURFACE_RECONSTRUCTION_CACHE`` environment variable
+
+    :param names: Sub folders inside the cache root
+    :return: The cache folder path
+    """
+    root = os.environ.get(CACHE_ENV) or os.path.join(
+        os.path.expanduser('~'), '.cache', 'surface_reconstruction'
+    )
+    return os.path.join(root, *names)
+
+
+class ResultCache:
+    """
+    Content-addressed, on-disk cache of generated meshes.
+
+    Entries are files named by a key computed from everything that defines a
+    result (input digest, strategy class, resolved filters...). The least recently
+    used entries (by file mtime, refreshed on each hit) are evicted when the total
+    size exceeds ``max_size`` bytes.
+    """
+
+    def __init__(self, cache_dir="", max_size=1 << 30):
+        self.cache_dir = cache_dir or default_cache_dir('results')
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(**parts) -> str:
+        """
+        Hash the given parts (any JSON serializable values) into a cache key
+        """
+        data = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def path(self, key: str, suffix='.ply') -> str:
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def get(self, key: str, suffix='.ply') -> Optional[str]:
+        """
+        Look up an entry, refreshing its LRU position on hit
+
+        :return: The cached file path, or None on a miss
+        """
+        file_path = self.path(key, suffix)
+
+        try:
+            os.utime(file_path)
+        except OSError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return file_path
+
+    def put(self, key: str, file_path: str, suffix='', move=False) -> str:
+        """
+        Store a file as the entry of the given key, then evict old entries
+
+        :param key: The entry key
+        :param file_path: The file to store
+        :param suffix: The entry extension, defaults to the extension of the file
+        :param move: Move the file into the cache instead of copy it
+        :return: The cached file path
+        """
+        target = self.path(key, suffix or os.path.splitext(file_path)[1])
+        descriptor, temp_file = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(descriptor)
+
+        try:
+            if move:
+                shutil.move(file_path, temp_file)
+            else:
+                shutil.copyfile(file_path, temp_file)
+
+            os.replace(temp_file, target)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+        self.evict()
+        return target
+
+    def entries(self) -> list:
+        """
+        The cache entries as ``(mtime, size, path)``, least recently used first
+        """
+        entries = []
+
+        with os.scandir(self.cache_dir) as items:
+            for item in items:
+                if item.is_file() and not item.name.endswith('.tmp'):
+                    stat = item.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, item.path))
+
+        return sorted(entries)
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, file_path in entries:
+            if total <= self.max_size:
+                break
+
+            try:
+                os.remove(file_path)
+            except OSError:
+                continue
+
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        for _, _, file_path in self.entries():
+            os.remove(file_path)
+
+    def stats(self) -> dict:
+        entries = self.entries()
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'size': sum(size for _, size, _ in entries),
+            'max_size': self.max_size
+        }
@@ -0,0 +1,258 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Union
+import ctypes
+import math
+import os
+import threading
+import time
+
+# Thread limits read by the OpenMP/BLAS runtimes when they are loaded
+THREAD_ENVIRONMENT = (
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'NUMEXPR_NUM_THREADS'
+)
+
+# OpenMP runtimes of open3d/pymeshlab (GNU, LLVM, Intel, MSVC), limited at run time when already
+# loaded
+OPENMP_LIBRARIES = (
+    'libgomp.so.1',
+    'libomp.so',
+    'libiomp5.so',
+    'libgomp.1.dylib',
+    'libomp.dylib',
+    'vcomp140.dll'
+)
+
+THREAD_POLICIES = ('narrow', 'balanced', 'wide')
+
+# Serializes the changes of the environment by the threads spawning processes (e.g the dispatchers
+# of the server)
+_environment_lock = threading.RLock()
+
+
+@dataclass
+class ThreadPlan:
+    """
+    The split of a core budget between concurrent jobs: ``workers`` jobs at the same time, each
+    one limited to ``threads`` threads, so ``workers * threads`` never exceeds ``cores``
+    """
+
+    policy: str
+    cores: int
+    workers: int
+    threads: int
+
+    @property
+    def used_cores(self) -> int:
+        return self.workers * self.threads
+
+    def summary(self) -> str:
+        return (
+            f'Thread policy {self.policy}: {self.workers} workers x {self.threads} threads of '
+            f'{self.cores} cores'
+        )
+
+
+@dataclass
+class PolicyRun:
+    """
+    The measured throughput of a batch reconstructed with a thread policy
+    """
+
+    policy: str
+    cores: int
+    workers: int
+    threads: int
+    jobs: int
+    failed: int
+    elapsed: float
+    cpu_time: float
+
+    @property
+    def throughput(self) -> float:
+        """
+        Reconstructed files by second
+        """
+        return (self.jobs - self.failed) / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def cpu_utilization(self) -> float:
+        """
+        Fraction of the core budget used by the reconstructions (below 1 when cores are idle or
+        wait, e.g on I/O)
+        """
+        return self.cpu_time / (self.elapsed * self.cores) if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f'Thread policy {self.policy}: {self.workers} jobs x {self.threads} threads, '
+            f'{self.throughput:.3f} files/s, {self.cpu_utilization:.0%} of {self.cores} cores '
+            f'({self.elapsed:.2f}s)'
+        )
+
+
+def available_cores() -> int:
+    """
+    The cores this process may run on (its CPU affinity, e.g restricted by a container), else all
+    the CPUs
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def core_budget(cores: Optional[int] = None) -> int:
+    """
+    The core budget of the concurrent jobs: the given cores, at most the available ones (a larger
+    budget would oversubscribe them, and some libraries fail with more threads than cores)
+    """
+    return max(1, min(cores or available_cores(), available_cores()))
+
+
+def thread_plan(
+        policy: Union[str, int] = 'narrow', cores: Optional[int] = None, jobs: Optional[int] = None
+) -> ThreadPlan:
+    """
+    Split the core budget between concurrent jobs, instead of letting each job start a thread by
+    core (``n_threads=-1``, the OpenMP default) and oversubscribe the CPUs:
+
+    - "narrow": many single-threaded jobs, one by core (the throughput of many small clouds)
+    - "wide": a single job using all the cores (the latency of a large cloud)
+    - "balanced": about ``sqrt(cores)`` jobs of ``sqrt(cores)`` threads
+    - a number: the threads of each job (the cores left by the division are unused)
+
+    The cores left when there are fewer jobs than workers are shared by the jobs
+
+    :param policy: "narrow", "balanced", "wide", or the threads by job
+    :param cores: The core budget. Defaults to the available cores
+    :param jobs: The number of jobs, if known
+    :raises ValueError: On an unknown policy
+    :return: The plan
+    """
+    cores = max(1, cores or available_cores())
+    threads = None
+
+    if isinstance(policy, int) or str(policy).isdigit():
+        threads = max(1, min(int(policy), cores))
+        workers = max(1, cores // threads)
+    elif policy == 'narrow':
+        workers = cores
+    elif policy == 'wide':
+        workers = 1
+    elif policy == 'balanced':
+        workers = max(1, round(math.sqrt(cores)))
+    else:
+        raise ValueError(
+            f'Unknown thread policy "{policy}", expected one of {THREAD_POLICIES} or a number of '
+            'threads'
+        )
+
+    if jobs and jobs < workers:
+        workers = jobs
+        threads = None
+
+    return ThreadPlan(str(policy), cores, workers, threads or max(1, cores // workers))
+
+
+def limit_threads(threads: int) -> List[str]:
+    """
+    Limit the threads of the OpenMP/BLAS runtimes of the current process: through the environment
+    for the runtimes loaded later (e.g the OpenMP runtime of the library imported by the strategy),
+    and through ``omp_set_num_threads()`` for the OpenMP runtimes already loaded. The BLAS runtime
+    loaded by NumPy is not limited: see spawn_environment() for the worker processes
+
+    :param threads: The threads of the process
+    :return: The OpenMP runtimes already loaded, limited at run time
+    """
+    for name in THREAD_ENVIRONMENT:
+        os.environ[name] = str(threads)
+
+    limited = []
+    for library in OPENMP_LIBRARIES:
+        try:
+            # Only the runtimes already loaded, without loading any new one
+            runtime = ctypes.CDLL(library, mode=getattr(os, 'RTLD_NOLOAD', 0) | ctypes.RTLD_GLOBAL)
+            runtime.omp_set_num_threads(ctypes.c_int(threads))
+        except (OSError, AttributeError):
+            continue
+
+        limited.append(library)
+
+    return limited
+
+
+@contextmanager
+def spawn_environment(threads: Optional[int]):
+    """
+    Limit the threads of the processes spawned inside the block (e.g by the submissions to a process
+    pool) through the environment they start with. A spawned worker imports NumPy with this package,
+    before any pool initializer, and its BLAS runtime only reads the limit when loaded. The
+    environment of the current process is restored after the block
+
+    :param threads: The threads of each process. None keeps the environment
+    """
+    if not threads:
+        yield
+        return
+
+    with _environment_lock:
+        previous = {name: os.environ.get(name) for name in THREAD_ENVIRONMENT}
+        os.environ.update({name: str(threads) for name in THREAD_ENVIRONMENT})
+
+        try:
+            yield
+        finally:
+            for name, value in previous.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+def compare_policies(
+        point_cloud_files: Union[str, Iterable[str]],
+        policies: Iterable[Union[str, int]] = THREAD_POLICIES,
+        cores: Optional[int] = None,
+        **batch_options: {}
+) -> List[PolicyRun]:
+    """
+    Reconstruct the same batch with each thread policy and measure its throughput
+
+    :param point_cloud_files: A glob pattern, or a list of file paths/glob patterns
+    :param policies: The thread policies to compare
+    :param cores: The core budget, at most the available cores
+    :param batch_options: The reconstruct_batch() options (e.g "method_type", "json_filters",
+        "output_folder")
+    :return: The run of each policy (see PolicyRun.summary() for a message)
+    """
+    # Imported here, the batch module imports this one
+    from .batch import reconstruct_batch
+
+    runs = []
+
+    for policy in policies:
+        start = time.perf_counter()
+        results = reconstruct_batch(
+            point_cloud_files, thread_policy=policy, cores=cores, **batch_options
+        )
+        elapsed = time.perf_counter() - start
+
+        plan = thread_plan(policy, core_budget(cores), len(results))
+        run = PolicyRun(
+            policy=str(policy),
+            cores=plan.cores,
+            workers=plan.workers,
+            threads=plan.threads,
+            jobs=len(results),
+            failed=sum(1 for result in results if not result.ok),
+            elapsed=elapsed,
+            cpu_time=sum(stage['cpu_time'] for result in results for stage in result.stages)
+        )
+        runs.append(run)
+
+    return runs
@@ -0,0 +1,698 @@
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, asdict, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+import argparse
+import heapq
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import socketserver
+import sys
+import threading
+import time
+import traceback
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+from .batch import BatchResult, init_worker, load_filters, worker_filters, worker_strategy
+from .scheduler import core_budget, spawn_environment
+from .surface_reconstruction import SurfaceReconstruction
+
+# Completed jobs kept in memory for the status requests
+MAX_FINISHED_JOBS = 10000
+
+# Window of the throughput metric, in seconds
+THROUGHPUT_WINDOW = 60.0
+
+
+@dataclass
+class Job:
+    id: int
+    method_type: str
+    priority: int = 0
+    point_cloud_file: str = ''
+    output_file: str = ''
+    filters: dict = field(default_factory=dict)
+    arrays: Optional[dict] = None
+    return_mesh: bool = False
+    status: str = 'queued'
+    submitted: float = 0.0
+    started: float = 0.0
+    finished: float = 0.0
+    result: Optional[dict] = None
+
+    def __post_init__(self):
+        self.done = threading.Event()
+
+    def summary(self) -> dict:
+        summary = {
+            name: value for name, value in asdict(self).items() if name not in ('arrays', 'filters')
+        }
+        summary['queue_time'] = (
+            (self.started or time.time()) - self.submitted if self.status != 'cancelled' else 0.0
+        )
+        return summary
+
+
+def _warm_up() -> int:
+    # Keep the worker busy a little, so the pool spawns all its processes
+    time.sleep(0.2)
+    return os.getpid()
+
+
+def _server_job(
+        point_cloud_file: str,
+        output_file: str,
+        filters: dict,
+        arrays: Optional[dict],
+        return_mesh: bool
+) -> dict:
+    """
+    Reconstruct a job in a warm worker process, from a point cloud file or arrays
+    """
+    strategy = worker_strategy()
+    result = BatchResult(point_cloud_file, output_file, worker=os.getpid())
+    mesh = None
+    start = time.perf_counter()
+
+    try:
+        filters = worker_filters(filters)
+        params = {'filters': filters} if filters else {}
+
+        if arrays is not None:
+            arrays = {
+                name: np.asarray(values) for name, values in arrays.items() if values is not None
+            }
+            strategy.load_arrays(**arrays)
+        else:
+            strategy.reset(point_cloud_file)
+
+        output = strategy.poisson_mesh(
+            save_file=bool(output_file), output_file=output_file, **params
+        )
+
+        if output is None:
+            raise RuntimeError(f'The mesh file "{output_file}" was not written')
+
+        if return_mesh:
+            mesh = {
+                name: None if array is None else array.tolist()
+                for name, array in asdict(strategy.mesh_data()).items()
+            }
+
+        result.status = 'ok'
+    except Exception as error:
+        result.status = 'failed'
+        result.error = ''.join(traceback.format_exception_only(type(error), error)).strip()
+
+    result.elapsed = time.perf_counter() - start
+    result.stages = strategy.profiler.report()['stages']
+
+    return {**asdict(result), 'mesh': mesh}
+
+
+class JobServer:
+    """
+    Run reconstruction jobs in pools of warm worker processes, one pool by strategy. The
+    workers are spawned and import the libraries once, at start. The jobs of each strategy
+    wait in a priority queue (higher priority first, then by submission order) and are
+    dispatched only when a worker is free, so a later urgent job runs before the queued ones.
+    """
+
+    def __init__(
+            self,
+            workers: Dict[str, int],
+            filter_script_file="",
+            cores: Optional[int] = None,
+            output_folder=""
+    ):
+        """
+        :param workers: Number of worker processes by strategy (method_type), e.g ``{'open3d': 4}``
+        :param filter_script_file: A .mlx filter script (pymeshlab only)
+        :param cores: A core budget shared by all the workers (at most the available cores), each
+            job getting ``cores // workers`` threads, instead of all the cores for each job
+        :param output_folder: The folder of the mesh files of the jobs submitted by the clients of
+            the HTTP API (see output_path()). Defaults to the current folder
+        """
+        self.workers = dict(workers)
+        self.filter_script_file = filter_script_file
+        self.output_folder = os.path.realpath(output_folder or os.getcwd())
+        self.threads = (
+            max(1, core_budget(cores) // max(1, sum(self.workers.values()))) if cores else None
+        )
+        self.jobs: Dict[int, Job] = {}
+
+        self._context = multiprocessing.get_context('spawn')
+        self._condition = threading.Condition()
+        self._ids = itertools.count(1)
+        self._sequence = itertools.count()
+        self._queues: Dict[str, list] = {method_type: [] for method_type in self.workers}
+        self._running: Dict[str, int] = dict.fromkeys(self.workers, 0)
+        self._finished: deque = deque()
+        self._completions: Dict[str, deque] = {method_type: deque() for method_type in self.workers}
+        self._counts: Dict[str, Dict[str, int]] = {
+            method_type: {'ok': 0, 'failed': 0, 'cancelled': 0} for method_type in self.workers
+        }
+        self._pools: Dict[str, ProcessPoolExecutor] = {}
+        self._broken: Dict[str, ProcessPoolExecutor] = {}
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+        self.started = time.time()
+
+    def start(self, warm_up=True) -> JobServer:
+        """
+        Create the worker pools and their dispatcher threads
+
+        :param warm_up: Wait until all worker processes are spawned and have imported the libraries
+        """
+        for method_type in self.workers:
+            self._pools[method_type] = self._create_pool(method_type, warm_up)
+
+            thread = threading.Thread(
+                target=self._dispatch,
+                args=(method_type,),
+                name=f'dispatch-{method_type}',
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+        return self
+
+    def _create_pool(self, method_type: str, warm_up: bool) -> ProcessPoolExecutor:
+        pool = ProcessPoolExecutor(
+            self.workers[method_type],
+            self._context,
+            init_worker,
+            (method_type, self.filter_script_file, False, None, self.threads)
+        )
+
+        if warm_up:
+            with spawn_environment(self.threads):
+                futures = [pool.submit(_warm_up) for _ in range(self.workers[method_type])]
+
+            for future in futures:
+                future.result()
+
+        return pool
+
+    def submit(
+            self,
+            method_type='default',
+            point_cloud_file="",
+            output_file="",
+            filters=None,
+            arrays: Optional[dict] = None,
+            priority=0,
+            return_mesh=False
+    ) -> Job:
+        """
+        Queue a job
+
+        :param method_type: A strategy with a worker pool. "default" (or empty) runs on the pool of
+            the default strategy (open3d), or on the only pool
+        :param point_cloud_file: The point cloud file, or empty with ``arrays``
+        :param output_file: The mesh file. Not written when empty (e.g with ``return_mesh``)
+        :param filters: The filters as a dictionary, a JSON string or a .json file path
+        :param arrays: The "points" (and optionally "colors" and "normals") arrays or lists
+        :param priority: Jobs with a higher priority run first
+        :param return_mesh: Include the mesh arrays (as lists) in the result
+        :raises ValueError: If the strategy has no pool or there is no input
+        :return: The queued job
+        """
+        method_type = self.pool_type(method_type)
+
+        if method_type not in self.workers:
+            raise ValueError(
+                f'The method type "{method_type}" has no worker pool: {list(self.workers)}'
+            )
+
+        if not point_cloud_file and arrays is None:
+            raise ValueError('A job needs a "point_cloud_file" or "points" arrays')
+
+        if point_cloud_file and not os.path.exists(point_cloud_file):
+            raise ValueError(f'The point cloud file "{point_cloud_file}" was not found')
+
+        if point_cloud_file and not output_file and not return_mesh:
+            output_file = os.path.splitext(point_cloud_file)[0] + '_mesh.ply'
+
+        job = Job(
+            next(self._ids),
+            method_type,
+            priority,
+            point_cloud_file,
+            output_file,
+            filters if isinstance(filters, dict) else load_filters(filters or ""),
+            arrays,
+            return_mesh,
+            submitted=time.time()
+        )
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('The job server was closed')
+
+            self.jobs[job.id] = job
+            heapq.heappush(self._queues[method_type], (-priority, next(self._sequence), job))
+            self._condition.notify_all()
+
+        return job
+
+    def output_path(self, output_file: str, point_cloud_file="") -> str:
+        """
+        The mesh file of a job submitted by a client, inside the ``output_folder``: a relative path
+        is resolved from the folder, and a path outside of it is refused
+
+        :param output_file: The requested mesh file, or empty for "<point cloud name>_mesh.ply"
+        :param point_cloud_file: The point cloud file, naming the default mesh file
+        :raises ValueError: If the mesh file is outside of the output folder
+        :return: The absolute mesh file path
+        """
+        if not output_file:
+            output_file = os.path.splitext(os.path.basename(point_cloud_file))[0] + '_mesh.ply'
+
+        file_path = os.path.realpath(os.path.join(self.output_folder, output_file))
+
+        if os.path.commonpath([self.output_folder, file_path]) != self.output_folder:
+            raise ValueError(
+                f'The output file "{output_file}" is outside of the output folder of the server'
+            )
+
+        return file_path
+
+    def pool_type(self, method_type: str) -> str:
+        """
+        The worker pool of a method type, resolving "default" (or empty) like SurfaceReconstruction
+        """
+        if method_type in self.workers or method_type not in ('', 'default'):
+            return method_type
+
+        default_path = SurfaceReconstruction.type_path('default')
+        for pool_type in self.workers:
+            if SurfaceReconstruction.type_path(pool_type) == default_path:
+                return pool_type
+
+        if len(self.workers) == 1:
+            return next(iter(self.workers))
+
+        return method_type
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        Cancel a queued job. Running jobs can't be cancelled, the warm workers are shared
+
+        :return: If the job was cancelled
+        """
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job is None or job.status != 'queued':
+                return False
+
+            queue = self._queues[job.method_type]
+            queue[:] = [item for item in queue if item[2] is not job]
+            heapq.heapify(queue)
+
+            self._finish(job, 'cancelled', None)
+
+        return True
+
+    def wait(self, job_id: int, timeout: Optional[float] = None) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+
+        return job
+
+    def _dispatch(self, method_type: str):
+        queue = self._queues[method_type]
+
+        while True:
+            with self._condition:
+                while not self._closed and (
+                    not queue or self._running[method_type] >= self.workers[method_type]
+                ):
+                    self._condition.wait()
+
+                if self._closed:
+                    return
+
+                _, _, job = heapq.heappop(queue)
+                job.status = 'running'
+                job.started = time.time()
+                self._running[method_type] += 1
+                pool = self._pools[method_type]
+
+                broken = self._broken.pop(method_type, None)
+                if broken is pool:
+                    pool = self._pools[method_type] = self._create_pool(method_type, warm_up=False)
+
+            if broken is not None:
+                # Out of the lock and of the pool callbacks, which may hold the pool shutdown lock
+                broken.shutdown(wait=False)
+
+            try:
+                # The submissions spawn the workers (e.g of a replaced pool), with the thread limits
+                # in their environment
+                with spawn_environment(self.threads):
+                    future = pool.submit(
+                        _server_job,
+                        job.point_cloud_file,
+                        job.output_file,
+                        job.filters,
+                        job.arrays,
+                        job.return_mesh
+                    )
+            except (BrokenProcessPool, RuntimeError) as error:
+                self._job_done(job, pool, None, error)
+                continue
+
+            future.add_done_callback(
+                lambda done, job=job, pool=pool: self._job_done(job, pool, done, None)
+            )
+
+    def _job_done(
+            self, job: Job, pool: ProcessPoolExecutor, future, error: Optional[BaseException]
+    ):
+        result = None
+
+        if future is not None:
+            try:
+                result = future.result()
+            except BaseException as exception:
+                error = exception
+
+        if isinstance(error, BrokenProcessPool):
+            # A crashed worker (e.g killed by the OS) breaks the pool: the dispatcher replaces it
+            # once, before the next submission. The pool can't be shut down from its own callbacks,
+            # which run with its shutdown lock (e.g Python 3.13)
+            with self._condition:
+                if self._pools.get(job.method_type) is pool:
+                    self._broken[job.method_type] = pool
+
+        if result is None:
+            result = asdict(
+                BatchResult(
+                    job.point_cloud_file, job.output_file, status='failed', error=repr(error)
+                )
+            )
+
+        with self._condition:
+            self._running[job.method_type] -= 1
+            self._finish(job, result['status'], result)
+
+    def _finish(self, job: Job, status: str, result: Optional[dict]):
+        # Called with the condition lock
+        job.status = status
+        job.result = result
+        job.finished = time.time()
+        job.arrays = None
+
+        self._counts[job.method_type][status] += 1
+        self._completions[job.method_type].append(job.finished)
+        self._finished.append(job.id)
+
+        while len(self._finished) > MAX_FINISHED_JOBS:
+            self.jobs.pop(self._finished.popleft(), None)
+
+        job.done.set()
+        self._condition.notify_all()
+
+    def metrics(self) -> dict:
+        """
+        Queue depth, running jobs, completed jobs and throughput (jobs by second in the last minute)
+        by strategy
+        """
+        now = time.time()
+        backends = {}
+
+        with self._condition:
+            for method_type in self.workers:
+                completions = self._completions[method_type]
+                while completions and completions[0] < now - THROUGHPUT_WINDOW:
+                    completions.popleft()
+
+                window = min(THROUGHPUT_WINDOW, max(now - self.started, 1e-9))
+                backends[method_type] = {
+                    'workers': self.workers[method_type],
+                    'threads': self.threads or 0,
+                    'queued': len(self._queues[method_type]),
+                    'running': self._running[method_type],
+                    **self._counts[method_type],
+                    'throughput': len(completions) / window
+                }
+
+        return {
+            'uptime': now - self.started,
+            'queued': sum(backend['queued'] for backend in backends.values()),
+            'running': sum(backend['running'] for backend in backends.values()),
+            'backends': backends
+        }
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+        for thread in self._threads:
+            thread.join()
+
+        for pool in self._pools.values():
+            if sys.version_info >= (3, 9):
+                pool.shutdown(wait=True, cancel_futures=True)
+            else:
+                pool.shutdown(wait=True)
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of the job server:
+
+    - ``POST /jobs``: submit a job, returns its id (202). The "output_file" is resolved in the
+      output folder of the job server
+    - ``GET /jobs/<id>[?wait=<seconds>]``: the job status and result, optionally waiting for it
+    - ``DELETE /jobs/<id>``: cancel a queued job
+    - ``GET /metrics``: queue depth and throughput by strategy
+    """
+
+    server_version = 'SurfaceReconstructionServer/1.0'
+
+    @property
+    def job_server(self) -> JobServer:
+        return self.server.job_server
+
+    def address_string(self) -> str:
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def send_json(self, status: int, data: dict):
+        body = json.dumps(data).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def job_id(self) -> Optional[int]:
+        parts = urlparse(self.path).path.strip('/').split('/')
+
+        if len(parts) == 2 and parts[0] == 'jobs' and parts[1].isdigit():
+            return int(parts[1])
+
+        return None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+
+        if url.path == '/metrics':
+            return self.send_json(200, self.job_server.metrics())
+
+        job_id = self.job_id()
+        if job_id is None:
+            return self.send_json(404, {'error': f'Unknown path "{url.path}"'})
+
+        try:
+            wait = float(parse_qs(url.query).get('wait', ['0'])[0])
+        except ValueError:
+            wait = math.nan
+
+        if not math.isfinite(wait):
+            return self.send_json(400, {'error': 'The "wait" parameter is not a number of seconds'})
+
+        job = self.job_server.wait(job_id, wait) if wait > 0 else self.job_server.jobs.get(job_id)
+
+        if job is None:
+            return self.send_json(404, {'error': f'The job {job_id} was not found'})
+
+        self.send_json(200, job.summary())
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/jobs':
+            return self.send_json(404, {'error': f'Unknown path "{self.path}"'})
+
+        try:
+            request = json.loads(
+                self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}'
+            )
+
+            arrays = None
+            if 'points' in request:
+                arrays = {name: request.get(name) for name in ('points', 'colors', 'normals')}
+
+            point_cloud_file = request.get('point_cloud_file', '')
+            return_mesh = bool(request.get('return_mesh', False))
+
+            # The clients write only in the output folder of the server
+            output_file = request.get('output_file', '')
+            if output_file or (point_cloud_file and not return_mesh):
+                output_file = self.job_server.output_path(output_file, point_cloud_file)
+
+            job = self.job_server.submit(
+                method_type=request.get('method_type', 'default'),
+                point_cloud_file=point_cloud_file,
+                output_file=output_file,
+                filters=request.get('filters'),
+                arrays=arrays,
+                priority=int(request.get('priority', 0)),
+                return_mesh=return_mesh
+            )
+        except (ValueError, TypeError) as error:
+            return self.send_json(400, {'error': str(error)})
+        except RuntimeError as error:
+            return self.send_json(503, {'error': str(error)})
+
+        self.send_json(202, job.summary())
+
+    def do_DELETE(self):
+        job_id = self.job_id()
+
+        if job_id is None or job_id not in self.job_server.jobs:
+            return self.send_json(404, {'error': f'The job {job_id} was not found'})
+
+        if not self.job_server.cancel(job_id):
+            return self.send_json(409, {'error': f'The job {job_id} is not queued anymore'})
+
+        self.send_json(200, self.job_server.jobs[job_id].summary())
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+        super().server_bind()
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def create_http_server(job_server: JobServer, host='127.0.0.1', port=8765, unix_socket=""):
+    """
+    Serve the job server API on a TCP port, or on a Unix socket file
+    """
+    if unix_socket:
+        server = UnixHTTPServer(unix_socket, JobRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), JobRequestHandler)
+        server.daemon_threads = True
+
+    server.job_server = job_server
+    return server
+
+
+def request_json(
+        url: str, method='GET', data: Optional[dict] = None, timeout: Optional[float] = None
+) -> dict:
+    """
+    A JSON request to the job server (TCP), e.g
+    ``request_json('http://127.0.0.1:8765/jobs', 'POST', {...})``
+    """
+    body = None if data is None else json.dumps(data).encode('utf-8')
+    request = urllib.request.Request(url, body, {'Content-Type': 'application/json'}, method=method)
+
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return {'status_code': error.code, **json.loads(error.read() or b'{}')}
+
+
+def parse_workers(values: List[str]) -> Dict[str, int]:
+    """
+    Parse "method_type=count" values, e.g ``["open3d=4", "pymeshlab=2"]``
+    """
+    workers = {}
+
+    for value in values:
+        method_type, _, count = value.partition('=')
+        workers[method_type] = int(count) if count else (os.cpu_count() or 1)
+
+    return workers
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='surface-reconstruction-server',
+        description='Local reconstruction job server, with warm worker processes by strategy and '
+                    'a priority queue'
+    )
+    parser.add_argument(
+        '-w',
+        '--workers',
+        nargs='+',
+        default=['open3d=2', 'pymeshlab=2'],
+        help='Workers by strategy, e.g open3d=4'
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=8765)
+    parser.add_argument(
+        '-u', '--unix-socket', default='', help='Serve on a Unix socket file instead of a TCP port'
+    )
+    parser.add_argument(
+        '-s', '--filter-script', default='', help='A .mlx filter script (pymeshlab only)'
+    )
+    parser.add_argument(
+        '-o',
+        '--output-folder',
+        default='',
+        help='Folder of the mesh files of the jobs (the current folder by default)'
+    )
+    parser.add_argument(
+        '--cores',
+        type=int,
+        default=None,
+        help='Core budget shared by the workers (all the cores by job otherwise)'
+    )
+    args = parser.parse_args(argv)
+
+    print('Starting the worker processes...', flush=True)
+    job_server = JobServer(
+        parse_workers(args.workers), args.filter_script, args.cores, args.output_folder
+    ).start()
+    http_server = create_http_server(job_server, args.host, args.port, args.unix_socket)
+
+    print(f'Serving on {args.unix_socket or f"http://{args.host}:{args.port}"}', flush=True)
+
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http_server.server_close()
+        job_server.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
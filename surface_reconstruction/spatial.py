@@ -0,0 +1,103 @@
+from __future__ import annotations
+from typing import Tuple
+
+import numpy as np
+
+
+def neighbor_counts(splits: np.ndarray, query_count: int) -> np.ndarray:
+    """
+    Number of neighbors of each query point from the last array of a fixed radius search: the row
+    splits ``(Q + 1,)`` of the recent open3d versions, or the counts ``(Q,)`` of open3d 0.12
+
+    :param splits: The row splits or the counts of the neighbors
+    :param query_count: The number of query points
+    :raises ValueError: If the array matches neither layout
+    :return: The counts with shape ``(Q,)``
+    """
+    splits = np.asarray(splits, dtype=np.int64).ravel()
+
+    if len(splits) == query_count + 1:
+        return np.diff(splits)
+    elif len(splits) == query_count:
+        return splits
+
+    raise ValueError(
+        f'Unexpected fixed radius search result of {len(splits)} values for {query_count} queries'
+    )
+
+
+class KDTree:
+    """
+    KD-tree of 3D points answering batched queries with NumPy arrays,
+    backed by the open3d nearest neighbor search (multi-threaded C++)
+    """
+
+    def __init__(self, points: np.ndarray):
+        # Imported here: importing this module (e.g by the tiling) doesn't require open3d
+        import open3d.core as o3c
+
+        self._o3c = o3c
+        self.points = np.ascontiguousarray(points, dtype=np.float64)
+        self._search = o3c.nns.NearestNeighborSearch(o3c.Tensor(self.points))
+        self._knn_index = False
+        self._radius = None
+
+    def __len__(self):
+        return len(self.points)
+
+    def query(self, queries: np.ndarray, k=1, batch_size=1 << 20) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k nearest points of each query point
+
+        :param queries: Query points with shape ``(Q, 3)``
+        :param k: The number of neighbors (clipped to the number of points)
+        :param batch_size: Maximum number of query points by search, bounding the memory
+        :return: The euclidean distances and the indices of the neighbors, both with shape
+            ``(Q, k)``
+        """
+        k = min(k, len(self.points))
+        queries = np.ascontiguousarray(queries, dtype=np.float64)
+
+        if not self._knn_index:
+            self._search.knn_index()
+            self._knn_index = True
+
+        distances = np.empty((len(queries), k), dtype=np.float64)
+        indices = np.empty((len(queries), k), dtype=np.int64)
+
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            batch_indices, batch_distances = self._search.knn_search(self._o3c.Tensor(batch), k)
+
+            indices[start:start + len(batch)] = batch_indices.numpy()
+            distances[start:start + len(batch)] = np.sqrt(batch_distances.numpy())
+
+        return distances, indices
+
+    def count_within_radius(
+            self, queries: np.ndarray, radius: float, batch_size=1 << 18
+    ) -> np.ndarray:
+        """
+        Number of points within the radius of each query point (including a point equal to the
+        query)
+
+        :param queries: Query points with shape ``(Q, 3)``
+        :param radius: The search radius
+        :param batch_size: Maximum number of query points by search, bounding the memory
+        :return: The counts with shape ``(Q,)``
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float64)
+
+        if self._radius != radius:
+            self._search.fixed_radius_index(radius)
+            self._radius = radius
+
+        counts = np.empty(len(queries), dtype=np.int64)
+
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            _, _, splits = self._search.fixed_radius_search(self._o3c.Tensor(batch), radius)
+
+            counts[start:start + len(batch)] = neighbor_counts(splits.numpy(), len(batch))
+
+        return counts
@@ -0,0 +1,391 @@
+from __future__ import annotations
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from .mesh_data import MeshData
+from .point_cloud_io import PointCloudData, data_digest, file_digest
+from .result_cache import ResultCache
+
+
+class StrategyCaches:
+    """
+    The caches of a surface strategy, mixed into SurfaceStrategy: the ``result_cache`` of the
+    poisson_mesh() results, the ``normals_cache`` of the point clouds with normals and the
+    ``stage_cache`` of the output of each stage. The caches are disabled (None) by default
+    """
+
+    result_cache: Optional[ResultCache] = None
+
+    normals_cache: Optional[ResultCache] = None
+
+    # Caches the output (point cloud or mesh) of each stage, so changing a stage reuses the stages
+    # before it
+    stage_cache: Optional[ResultCache] = None
+
+    # Filters/methods that estimate or orient the normals, reused from the normals cache
+    normal_stages = ()
+
+    # Stages whose parameters are decided at run time (e.g by the cost model), the stage cache stops
+    # before them
+    dynamic_stages = ('auto_depth', 'memory_budget')
+
+    def input_digest(self) -> Optional[str]:
+        """
+        Digest of the input point cloud: the digest of the loaded arrays or the point cloud file
+        hash
+
+        :return: The digest, or None if there is no point cloud to identify the input
+        """
+        if self.point_cloud_data is not None:
+
+            # Point clouds given as arrays are hashed only when a cache needs it
+            if not self.point_cloud_data.digest:
+                self.point_cloud_data.digest = data_digest(self.point_cloud_data)
+
+            return self.point_cloud_data.digest
+        elif self.point_cloud_file and os.path.exists(self.point_cloud_file):
+            return file_digest(self.point_cloud_file)
+
+        return None
+
+    def normal_stages_prefix(self, filters: dict) -> list:
+        """
+        The enabled filters/methods up to the last normal stage: the stages that define the normals
+        (e.g a simplification before the normal estimation changes the points)
+
+        :param filters: The resolved filters
+        :return: The filter/method names, empty without any enabled normal stage
+        """
+        names = [name for name, params_key_values in filters.items() if params_key_values]
+        last = max(
+            (index for index, name in enumerate(names) if name in self.normal_stages), default=-1
+        )
+
+        return names[:last + 1]
+
+    def normals_key(self, filters: dict) -> Optional[str]:
+        """
+        Key of the normals in the normals cache: the input point cloud hash, the strategy class
+        and the parameters of the normal stages (so changing only the Poisson parameters reuses
+        them)
+
+        :param filters: The resolved filters
+        :return: The key, or None if there are no normal stages or no input digest
+        """
+        stages = self.normal_stages_prefix(filters)
+        input_digest = self.input_digest()
+
+        if not stages or input_digest is None:
+            return None
+
+        cls = self.__class__
+
+        return ResultCache.key(
+            input=input_digest,
+            strategy=f'{cls.__module__}.{cls.__qualname__}',
+            stages={name: filters[name] for name in stages}
+        )
+
+    def load_cached_normals(self, filters: dict) -> list:
+        """
+        Look up the normals in the normals cache. On hit, the cached point cloud with
+        normals replaces the current one, skipping the normal stages.
+
+        :param filters: The resolved filters
+        :return: The skipped filters/methods names, empty on a miss
+        """
+        self._normals_key = None
+
+        if self.normals_cache is None:
+            return []
+
+        self._normals_key = self.normals_key(filters)
+        if self._normals_key is None:
+            return []
+
+        cached_file = self.normals_cache.get(self._normals_key, '.npz')
+        if cached_file is None:
+            return []
+
+        with self.profiler.stage('load_cached_normals', self.geometry_sizes):
+            with np.load(cached_file) as arrays:
+                self.set_point_cloud_arrays(PointCloudData(
+                    points=arrays['points'],
+                    colors=arrays['colors'] if 'colors' in arrays else None,
+                    normals=arrays['normals']
+                ))
+
+        self.normals_estimated = True
+        self.applied_filters = True
+
+        return self.normal_stages_prefix(filters)
+
+    def store_normals(self):
+        """
+        Store the point cloud with the normals computed after a load_cached_normals() miss
+        """
+        key = getattr(self, '_normals_key', None)
+
+        if self.normals_cache is None or key is None:
+            return
+
+        data = self.point_cloud_arrays()
+        arrays = {'points': data.points, 'normals': data.normals}
+        if data.colors is not None:
+            arrays['colors'] = data.colors
+
+        self._put_arrays(self.normals_cache, key, arrays)
+
+    def stage_keys(self, filters: dict) -> List[Tuple[str, str]]:
+        """
+        Fingerprint of each enabled stage: the hash of the previous stage fingerprint (the input
+        point cloud hash for the first stage), the strategy class and the stage parameters (without
+        the thread count). So the key of a stage changes with its parameters and the parameters of
+        any stage before it. The chain stops at the first dynamic stage
+
+        :param filters: The resolved filters
+        :return: The ``(name, key)`` of the stages in order, empty if there is no input digest
+        """
+        previous = self.input_digest()
+        if previous is None:
+            return []
+
+        cls = self.__class__
+        keys = []
+        output_filters = self.output_filters(filters)
+
+        for name, params_key_values in filters.items():
+            if not params_key_values:
+                continue
+
+            if name in self.dynamic_stages:
+                break
+
+            previous = ResultCache.key(
+                previous=previous,
+                strategy=f'{cls.__module__}.{cls.__qualname__}',
+                stage=name,
+                parameters=output_filters[name]
+            )
+            keys.append((name, previous))
+
+        return keys
+
+    def update_stage_keys(self, filters: dict) -> List[Tuple[str, str]]:
+        """
+        Compute the keys used by store_stage() from the current filters
+
+        :param filters: The resolved filters
+        :return: The ``(name, key)`` of the stages in order, empty without a stage cache
+        """
+        keys = self.stage_keys(filters) if self.stage_cache is not None else []
+        self._stage_keys = dict(keys)
+
+        return keys
+
+    def load_cached_stages(self, filters: dict) -> list:
+        """
+        Look up the output of the stages in the stage cache, from the last stage. On hit, the cached
+        point cloud or mesh replaces the current one, skipping the stages up to the cached one
+
+        :param filters: The resolved filters
+        :return: The skipped filters/methods names, empty on a miss
+        """
+        keys = self.update_stage_keys(filters)
+
+        for index in range(len(keys) - 1, -1, -1):
+            cached_file = self.stage_cache.get(keys[index][1], '.npz')
+            if cached_file is None:
+                continue
+
+            with self.profiler.stage('load_cached_stage', self.geometry_sizes):
+                with np.load(cached_file) as arrays:
+                    values = {name: arrays[name] for name in arrays.files}
+
+                if 'faces' in values:
+                    self.set_mesh_arrays(
+                        MeshData(
+                            values['vertices'],
+                            values['faces'],
+                            values.get('normals'),
+                            values.get('colors')
+                        ),
+                        values.get('densities')
+                    )
+                else:
+                    self.set_point_cloud_arrays(
+                        PointCloudData(
+                            values['points'], values.get('colors'), values.get('normals')
+                        )
+                    )
+
+            skipped = [name for name, _ in keys[:index + 1]]
+
+            self.normals_estimated = self.normals_estimated or any(
+                name in self.normal_stages for name in skipped
+            )
+            self.applied_filters = True
+
+            return skipped
+
+        return []
+
+    def store_stage(self, name: str, mesh_stage: bool):
+        """
+        Store the output of a stage computed after a load_cached_stages() miss, or run alone after
+        update_stage_keys()
+
+        :param name: The filter/method name
+        :param mesh_stage: If the stage output is the mesh, instead of the point cloud
+        """
+        key = getattr(self, '_stage_keys', {}).get(name)
+
+        if self.stage_cache is None or key is None:
+            return
+
+        if mesh_stage:
+            mesh = self.mesh_data()
+            arrays = {
+                'vertices': mesh.vertices,
+                'faces': mesh.faces,
+                'normals': mesh.normals,
+                'colors': mesh.colors,
+                'densities': self.densities
+            }
+        else:
+            data = self.point_cloud_arrays()
+            arrays = {'points': data.points, 'colors': data.colors, 'normals': data.normals}
+
+        self._put_arrays(
+            self.stage_cache,
+            key,
+            {field: array for field, array in arrays.items() if array is not None}
+        )
+
+    @staticmethod
+    def _put_arrays(cache: ResultCache, key: str, arrays: dict):
+        descriptor, temp_file = tempfile.mkstemp(suffix='.npz')
+        os.close(descriptor)
+
+        try:
+            np.savez(temp_file, **arrays)
+            cache.put(key, temp_file, move=True)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def output_filters(self, filters: dict) -> dict:
+        """
+        The resolved filters without the thread count of the library (``thread_parameter``): the
+        parameters the output depends on
+
+        :param filters: The resolved filters
+        :return: A copy of the filters
+        """
+        filters = {name: dict(params_key_values) for name, params_key_values in filters.items()}
+
+        if self.thread_parameter is not None:
+            name, parameter = self.thread_parameter
+            filters.get(name, {}).pop(parameter, None)
+
+        return filters
+
+    def result_key(self, output_file="", **params: {}) -> Optional[str]:
+        """
+        Key of the poisson_mesh() result in the result cache: the input point cloud hash,
+        the strategy class, the resolved filters (or the filter script content) without the thread
+        count, and the mesh encoding
+
+        :param output_file: The output file, only its extension is used
+        :param params: The poisson_mesh() parameters
+        :return: The key, or None if there is no point cloud file to identify the input
+        """
+        input_digest = self.input_digest()
+        if input_digest is None:
+            return None
+
+        cls = self.__class__
+        script = self.filter_script_file
+        writer_encoding = self.mesh_writer.encoding if self.mesh_writer is not None else {}
+
+        return ResultCache.key(
+            input=input_digest,
+            strategy=f'{cls.__module__}.{cls.__qualname__}',
+            filters=self.output_filters(self.resolve_filters(**params)),
+            filter_script=file_digest(script) if isinstance(script, str) and script else '',
+            format=os.path.splitext(output_file)[1].lower() or '.ply',
+            encoding=dict(writer_encoding, **(self.mesh_encoding or {}))
+        )
+
+    def load_cached_result(self, save_file: bool, output_file: str, **params: {}) -> bool:
+        """
+        Look up the poisson_mesh() result in the result cache. On hit, the cached mesh
+        is loaded and copied to the output file, without any reconstruction.
+
+        :return: If the result was found in the cache
+        """
+        self._result_key = None
+
+        if self.result_cache is None:
+            return False
+
+        self._result_key = self.result_key(output_file, **params)
+        if self._result_key is None:
+            return False
+
+        suffix = os.path.splitext(output_file)[1].lower() or '.ply'
+        cached_file = self.result_cache.get(self._result_key, suffix)
+
+        if cached_file is None:
+            return False
+
+        if save_file:
+            shutil.copyfile(cached_file, output_file)
+
+        self.load_mesh(cached_file)
+        self.applied_filters = True
+
+        return True
+
+    def store_result(self, save_file: bool, output_file: str):
+        """
+        Store the poisson_mesh() result computed after a load_cached_result() miss
+        """
+        key = getattr(self, '_result_key', None)
+
+        if self.result_cache is None or key is None:
+            return
+
+        if save_file:
+            result_cache = self.result_cache
+            suffix = os.path.splitext(output_file)[1].lower()
+
+            if self.pending_write is None:
+                result_cache.put(key, output_file, suffix=suffix)
+                return
+
+            # Store the file once written by the background writer (on its thread, so its flush()
+            # also waits for the cache), without blocking the reconstruction. A failed write is not
+            # cached
+            def store_written(write: Future):
+                if write.exception() is None:
+                    result_cache.put(key, output_file, suffix=suffix)
+
+            self.pending_write.add_done_callback(store_written)
+            return
+
+        suffix = os.path.splitext(output_file)[1].lower() or '.ply'
+        descriptor, temp_file = tempfile.mkstemp(suffix=suffix)
+        os.close(descriptor)
+
+        try:
+            if self.save_mesh(temp_file):
+                self.result_cache.put(key, temp_file, move=True)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import numpy as np
+
+from .mesh_data import MeshData
+from .point_cloud_io import PointCloudData
+
+
+class StrategyHooks(ABC):
+    """
+    The library hooks of a surface strategy, mixed into the strategies of this package next to
+    SurfaceStrategy: the features built on the current mesh of the library (e.g the result cache)
+    call them. A custom strategy implementing only load_file() and poisson_mesh() can leave them
+    out, without those features
+    """
+
+    @abstractmethod
+    def load_data(self, data: PointCloudData):
+        """
+        Load a point cloud from NumPy arrays (e.g a reduced streamed point cloud), without any file
+
+        :param data: The point cloud arrays
+        :return: The point cloud of the library
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def density_trimming(self, quantile=0.0, threshold=0.0):
+        """
+        Remove the mesh vertices (and their faces) with a Poisson density below the
+        threshold, e.g the low density bubbles far from the points
+
+        :param quantile: Remove the vertices below this quantile of the densities (0 to disable)
+        :param threshold: Remove the vertices below this absolute density (0 to disable)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def simplify_mesh(self, target_triangles=0, reduction=0.0):
+        """
+        Decimate the mesh (quadric edge collapse) down to a number of triangles
+
+        :param target_triangles: The number of triangles to keep (0 to use the reduction)
+        :param reduction: The fraction of triangles to keep, e.g 0.25 (0 to disable)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_mesh(self, file_path: str):
+        """
+        Load a mesh file as the current mesh of the library
+
+        :param file_path: The mesh file path
+        :return: The loaded mesh
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_mesh(self, file_path: str) -> bool:
+        """
+        Save the current mesh of the library in a file
+
+        :param file_path: The mesh file path
+        :return: If the file was written
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def mesh_data(self) -> MeshData:
+        """
+        The current mesh of the library as NumPy arrays
+
+        :return: The vertices, faces, normals and colors of the mesh
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def point_cloud_arrays(self) -> PointCloudData:
+        """
+        The current point cloud of the library (after the filters applied so far) as NumPy arrays
+
+        :return: The points, colors and normals
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_point_cloud_arrays(self, data: PointCloudData):
+        """
+        Replace the current point cloud of the library, e.g by a point cloud with cached normals
+
+        :param data: The points, colors and normals
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def apply_filter(self, name: str, params_key_values: dict):
+        """
+        Apply a filter/method of the library, called by poisson_filters()
+
+        :param name: The filter/method name
+        :param params_key_values: The parameters of the filter/method
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_mesh_arrays(self, mesh: MeshData, densities: Optional[np.ndarray] = None):
+        """
+        Replace the current mesh of the library, e.g by a cached Poisson reconstruction
+
+        :param mesh: The vertices, faces, normals and colors of the mesh
+        :param densities: The Poisson density of each vertex, for the density trimming
+        """
+        raise NotImplementedError
@@ -0,0 +1,260 @@
+from __future__ import annotations
+from typing import Iterator, Optional, Sequence, Tuple
+import hashlib
+import json
+
+import numpy as np
+
+from .point_cloud_io import PointCloudData, read_ply_header, file_digest, _columns
+from .point_cloud_io import PLY_FORMATS, POINTS_PROPERTIES, COLORS_PROPERTIES, NORMALS_PROPERTIES
+
+# Voxel indices are packed in a single int64 key, with 21 bits by axis
+VOXEL_BITS = 21
+VOXEL_LIMIT = 1 << (VOXEL_BITS - 1)
+
+
+def iter_ply_chunks(
+        file_path: str, chunk_size=1 << 20, block_size=1 << 26
+) -> Iterator[PointCloudData]:
+    """
+    Read the vertices of a .ply point cloud in chunks, without loading the whole file
+
+    :param file_path: The .ply file path
+    :param chunk_size: Number of vertices of each chunk (binary files)
+    :param block_size: Number of bytes read at a time (ASCII files)
+    :return: An iterator of point clouds with at most ``chunk_size`` points
+    """
+    header = read_ply_header(file_path)
+    remaining = header.vertex_count
+
+    with open(file_path, 'rb') as file:
+        file.seek(header.offset)
+
+        if header.format != 'ascii':
+            byte_order = PLY_FORMATS[header.format]
+            dtype = np.dtype([(name, byte_order + kind) for name, kind in header.properties])
+
+            while remaining > 0:
+                table = np.fromfile(file, dtype=dtype, count=min(chunk_size, remaining))
+                if len(table) == 0:
+                    break
+
+                remaining -= len(table)
+                yield _chunk(table, header)
+            return
+
+        columns = len(header.properties)
+        rest = b''
+
+        while remaining > 0:
+            block = file.read(block_size)
+            data = rest + block
+
+            if block:
+                # Parse only complete lines, keeping the last partial line for the next block
+                end = data.rfind(b'\n') + 1
+                data, rest = data[:end], data[end:]
+
+            if not data.strip():
+                if not block:
+                    break
+                continue
+
+            values = np.fromstring(data.decode('ascii'), dtype=np.float64, sep=' ')
+            rows = min(len(values) // columns, remaining)
+            remaining -= rows
+
+            yield _chunk(values[:rows * columns].reshape(rows, columns), header)
+
+            if not block:
+                break
+
+
+def _chunk(table: np.ndarray, header) -> PointCloudData:
+    return PointCloudData(
+        points=_columns(table, header, POINTS_PROPERTIES, np.float64),
+        colors=_columns(table, header, COLORS_PROPERTIES, np.uint8),
+        normals=_columns(table, header, NORMALS_PROPERTIES, np.float64)
+    )
+
+
+def crop(
+        data: PointCloudData,
+        min_bound: Optional[Sequence[float]] = None,
+        max_bound: Optional[Sequence[float]] = None
+) -> PointCloudData:
+    """
+    Keep only the points inside the bounding box (bounds included)
+    """
+    points = np.asarray(data.points)
+    mask = np.ones(len(data), dtype=bool)
+
+    if min_bound is not None:
+        mask &= np.all(points >= np.asarray(min_bound, dtype=np.float64), axis=1)
+    if max_bound is not None:
+        mask &= np.all(points <= np.asarray(max_bound, dtype=np.float64), axis=1)
+
+    if mask.all():
+        return data
+
+    return data.select(mask)
+
+
+def voxel_downsample(data: PointCloudData, voxel_size: float) -> PointCloudData:
+    """
+    Replace the points of each voxel by their mean point, color and normal
+    """
+    accumulator = VoxelAccumulator(voxel_size)
+    accumulator.add(data)
+
+    return accumulator.result()
+
+
+def downsample_to(
+        data: PointCloudData, target_points: int, spacing: float, attempts=10
+) -> Tuple[PointCloudData, float]:
+    """
+    Voxel downsample a point cloud to at most ``target_points`` points. The first voxel size assumes
+    a 2.5D surface (the number of points decreases with the square of the voxel size), then it grows
+    until the target is reached, or after the attempts
+
+    :param data: The point cloud
+    :param target_points: The maximum number of points
+    :param spacing: The mean distance between neighbor points
+    :param attempts: Maximum number of voxel sizes tried
+    :return: The downsampled point cloud and its voxel size
+    """
+    voxel_size = spacing * np.sqrt(len(data) / target_points)
+
+    for _ in range(attempts):
+        accumulator = VoxelAccumulator(voxel_size)
+        accumulator.add(data)
+
+        if len(accumulator) <= target_points:
+            break
+        voxel_size *= 1.05 * np.sqrt(len(accumulator) / target_points)
+    else:
+        voxel_size = accumulator.voxel_size
+
+    return accumulator.result(), voxel_size
+
+
+class VoxelAccumulator:
+    """
+    Incremental voxel-grid downsampling: each chunk is reduced to the sum of the points,
+    colors and normals of each voxel, and merged with the previous voxels. The memory is
+    proportional to the number of voxels (the output size), not the number of input points.
+    The result has the mean point/color/normal of each voxel, like ``voxel_down_sample`` of open3d.
+    """
+
+    def __init__(self, voxel_size: float):
+        self.voxel_size = voxel_size
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.sums = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def voxel_keys(self, points: np.ndarray) -> np.ndarray:
+        indices = np.floor(points / self.voxel_size).astype(np.int64)
+
+        if indices.size and (indices.min() < -VOXEL_LIMIT or indices.max() >= VOXEL_LIMIT):
+            raise ValueError(
+                f'The voxel size {self.voxel_size} is too small for the point cloud extent'
+            )
+
+        indices += VOXEL_LIMIT
+        return (indices[:, 0] << (2 * VOXEL_BITS)) | (indices[:, 1] << VOXEL_BITS) | indices[:, 2]
+
+    def add(self, data: PointCloudData):
+        if len(data) == 0:
+            return
+
+        attributes = {'points': np.asarray(data.points, dtype=np.float64)}
+        if data.colors is not None:
+            attributes['colors'] = data.normalized_colors()
+        if data.normals is not None:
+            attributes['normals'] = np.asarray(data.normals, dtype=np.float64)
+
+        if self.sums and set(attributes) != set(self.sums):
+            raise ValueError('All chunks should have the same attributes')
+
+        # Merge the voxels of the chunk with the previous ones in a single reduction
+        keys = np.concatenate([self.keys, self.voxel_keys(attributes['points'])])
+        counts = np.concatenate([self.counts, np.ones(len(data), dtype=np.int64)])
+
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts).astype(np.int64)
+
+        for name, values in attributes.items():
+            previous = self.sums.get(name, np.empty((0, 3)))
+            values = np.concatenate([previous, values])
+            sums = np.empty((len(self.keys), 3))
+
+            for axis in range(3):
+                sums[:, axis] = np.bincount(
+                    inverse, weights=values[:, axis], minlength=len(self.keys)
+                )
+
+            self.sums[name] = sums
+
+    def result(self) -> PointCloudData:
+        if not self.sums:
+            return PointCloudData(points=np.empty((0, 3)))
+
+        means = {name: sums / self.counts[:, None] for name, sums in self.sums.items()}
+
+        if 'normals' in means:
+            norms = np.linalg.norm(means['normals'], axis=1, keepdims=True)
+            means['normals'] = means['normals'] / np.where(norms > 0, norms, 1)
+
+        if 'colors' in means:
+            means['colors'] = np.clip(np.round(means['colors'] * 255), 0, 255).astype(np.uint8)
+
+        return PointCloudData(**means)
+
+
+def stream_point_cloud(
+        file_path: str,
+        voxel_size: Optional[float] = None,
+        min_bound: Optional[Sequence[float]] = None,
+        max_bound: Optional[Sequence[float]] = None,
+        chunk_size=1 << 20
+) -> PointCloudData:
+    """
+    Read a .ply point cloud in chunks, cropping and voxel downsampling each chunk while
+    reading, so the peak memory depends on the output size instead of the file size.
+    Load the result with ``load_data()`` of a strategy.
+
+    :param file_path: The .ply file path
+    :param voxel_size: The voxel size of the downsampling. Not downsampled when empty
+    :param min_bound: Minimum XYZ of the crop bounding box
+    :param max_bound: Maximum XYZ of the crop bounding box
+    :param chunk_size: Number of vertices read at a time
+    :return: The reduced point cloud, with a digest of the file and the options
+    """
+    accumulator = VoxelAccumulator(voxel_size) if voxel_size else None
+    chunks = []
+
+    for chunk in iter_ply_chunks(file_path, chunk_size):
+        chunk = crop(chunk, min_bound, max_bound)
+
+        if accumulator is not None:
+            accumulator.add(chunk)
+        else:
+            chunks.append(chunk)
+
+    if accumulator is not None:
+        data = accumulator.result()
+    elif chunks:
+        data = PointCloudData.concatenate(chunks)
+    else:
+        data = PointCloudData(points=np.empty((0, 3)))
+
+    options = json.dumps([voxel_size, min_bound, max_bound], default=list)
+    data.digest = hashlib.blake2b(
+        f'{file_digest(file_path)}:{options}'.encode(), digest_size=20
+    ).hexdigest()
+
+    return data
@@ -1,17 +1,19 @@
-from typing import Type, TypeVar
+from importlib import import_module
+from typing import Type, TypeVar, Union
 from .singleton_meta import SingletonMeta
 from .surface_strategy import SurfaceStrategy
-from .pymeshlab_surface import PyMeshlabSurface
-from .open3d_surface import Open3dSurface
 
 TStrategy = TypeVar('TStrategy', bound=SurfaceStrategy)
 
 
 class SurfaceReconstruction(metaclass=SingletonMeta):
+    # A strategy class, or the "module:class" path of a strategy imported when first used,
+    # so the package doesn't import the heavy libraries (open3d, pymeshlab) of unused strategies
     _types = {
-      'pymeshlab': PyMeshlabSurface,
-      'open3d': Open3dSurface,
-      'default': Open3dSurface
+      'pymeshlab': 'surface_reconstruction.pymeshlab_surface:PyMeshlabSurface',
+      'open3d': 'surface_reconstruction.open3d_surface:Open3dSurface',
+      'heightfield': 'surface_reconstruction.heightfield_surface:HeightfieldSurface',
+      'default': 'surface_reconstruction.open3d_surface:Open3dSurface'
     }
 
     def __new__(cls, *args, **kwargs) -> Type[TStrategy]:
@@ -20,7 +22,7 @@ class SurfaceReconstruction(metaclass=SingletonMeta):
             method = 'default'
 
         if method in cls._types:
-            return cls._types[method]
+            return cls.strategy_type(method)
         else:
             msg = f"""The method type "{method}" was not registered
               Use {cls.__name__}.{cls.register_type.__name__}() to register this type"""
@@ -28,10 +30,74 @@ class SurfaceReconstruction(metaclass=SingletonMeta):
             raise TypeError(msg)
 
     @classmethod
-    def register_type(cls, type_cls: Type[TStrategy]):
-        name = type_cls.__name__.replace('Surface', '').lower()
+    def strategy_type(cls, method_type: str) -> Type[TStrategy]:
+        """
+        The strategy class of a registered method type, importing its module on the first use
+
+        :raises KeyError: If the method type was not registered
+        """
+        type_cls = cls._types[method_type]
+
+        if isinstance(type_cls, str):
+            module_name, _, class_name = type_cls.partition(':')
+            type_cls = getattr(import_module(module_name), class_name)
+            cls._types[method_type] = type_cls
+
+        return type_cls
+
+    @classmethod
+    def type_path(cls, method_type: str) -> str:
+        """
+        The "module:class" path of a registered method type, without importing its module
+
+        :return: The path, empty if the method type was not registered
+        """
+        type_cls = cls._types.get(method_type, '')
+
+        if isinstance(type_cls, str):
+            return type_cls
+
+        return f'{type_cls.__module__}:{type_cls.__qualname__}'
+
+    @classmethod
+    def method_type(cls, type_cls: Type[TStrategy]) -> str:
+        """
+        The method type of a registered strategy class (e.g to create it in a worker process),
+        without importing the modules of the other strategies. "default" is returned only if the
+        class has no other method type
+
+        :param type_cls: The strategy class
+        :return: The method type, or the default name of register_type() if the class was not
+            registered
+        """
+        path = f'{type_cls.__module__}:{type_cls.__qualname__}'
+        names = [name for name in cls._types if cls.type_path(name) == path]
+
+        if not names:
+            return cls._default_name(type_cls.__name__)
+
+        return next((name for name in names if name != 'default'), names[0])
+
+    @staticmethod
+    def _default_name(class_name: str) -> str:
+        return class_name.replace('Surface', '').lower()
+
+    @classmethod
+    def register_type(cls, type_cls: Union[Type[TStrategy], str], name=''):
+        """
+        Register a strategy class, or its "module:class" path to import it only when used
+
+        :param type_cls: The strategy class or path, e.g ``'my_package.my_module:MyCustomSurface'``
+        :param name: The method type. Defaults to the class name without the "Surface" suffix,
+            lowercase
+        """
+        if not name:
+            class_name = (
+                type_cls.rpartition(':')[2] if isinstance(type_cls, str) else type_cls.__name__
+            )
+            name = cls._default_name(class_name)
+
         if name not in cls._types:
             cls._types[name] = type_cls
         else:
-            raise Warning(f'The type "{type_cls.__name__}" was registered!')
-
+            raise Warning(f'The type "{name}" was registered!')
@@ -1,11 +1,31 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from typing import Union
+from typing import Callable, Iterable, List, Optional, Tuple, Union
 import os
 import json
+import numpy as np
+from . import streaming
+from .auto_depth import (
+    CloudStats,
+    CostModel,
+    DepthBudget,
+    DepthChoice,
+    MemoryDecision,
+    apply_auto_depth,
+    cost_options
+)
+from .lod import reconstruct_levels
+from .memory_budget import apply_memory_budget
+from .mesh_data import MeshData
+from .mesh_writer import MeshWriter, snapshot
+from .normals import orient_normals
+from .outliers import OutlierReport, remove_outliers
+from .point_cloud_io import PointCloudData
+from .profiling import StageMetrics, StageProfiler, memory_usage
+from .strategy_caches import StrategyCaches
 
 
-class SurfaceStrategy(ABC):
+class SurfaceStrategy(StrategyCaches, ABC):
     """
     Surface Reconstruction base class. Should be implemented by Python/C++
     libraries classes that performs a Poisson surface reconstruction algorithm.
@@ -23,11 +43,42 @@ class SurfaceStrategy(ABC):
 
     _parameters_key_values = {}
 
+    # Writes the .ply meshes in a background thread, the next job starts while the mesh is written
+    mesh_writer: Optional[MeshWriter] = None
+
+    # MeshData.write_ply() options of the .ply meshes (e.g the compact encoding), instead of the
+    # library writer
+    mesh_encoding: Optional[dict] = None
+
+    # Stages run by this package on the arrays of the point cloud, instead of a filter of the
+    # library
+    array_stages = ('crop', 'voxel_downsample', 'orient_normals')
+
+    # Stages of this package receiving the resolved filters, e.g to predict or set the Poisson
+    # parameters
+    planning_stages = ('auto_depth', 'memory_budget', 'outlier_removal')
+
+    # Print the decisions of the stages (e.g the predicted and measured cost of auto_depth), which
+    # are recorded in depth_choice, memory_decision and outlier_report either way
+    verbose = False
+
+    # Filter and parameter of the library threads (e.g "n_threads" of open3d), set by the thread
+    # scheduler
+    thread_parameter: Optional[Tuple[str, str]] = None
+
     def __init__(self, point_cloud_file="", output_file="", filter_script_file="", clean_up=True):
+        self.point_cloud_file = point_cloud_file
+        self.point_cloud_data = None
         self.output_file = output_file
         self.filter_script_file = filter_script_file
         self.normals_estimated = False
         self.applied_filters = False
+        self.densities: Optional[np.ndarray] = None
+        self.depth_choice: Optional[DepthChoice] = None
+        self.memory_decision: Optional[MemoryDecision] = None
+        self.outlier_report: Optional[OutlierReport] = None
+        self.pending_write = None
+        self.profiler = StageProfiler()
 
         cls = self.__class__
         cls._parameters_convertion()
@@ -39,12 +90,99 @@ class SurfaceStrategy(ABC):
             if not os.path.exists(point_cloud_file):
                 raise FileNotFoundError(f'The point cloud file "{point_cloud_file}" was not found')
 
-            self.load_file(point_cloud_file)
+            with self.profiler.stage('load_file', self.geometry_sizes):
+                self.load_file(point_cloud_file)
+
+    def reset(self, point_cloud_file="", output_file=""):
+        """
+        Clear the state of a previous reconstruction, so the same instance can
+        reconstruct another point cloud (e.g one instance per worker process)
+
+        :param point_cloud_file: The next point cloud file to load
+        :param output_file: The next output file
+        """
+        self.point_cloud_file = point_cloud_file
+        self.point_cloud_data = None
+        self.normals_estimated = False
+        self.applied_filters = False
+        self.densities = None
+        self.depth_choice = None
+        self.memory_decision = None
+        self.outlier_report = None
+        self.pending_write = None
+        self.profiler.clear()
+
+        # The cache keys of the previous point cloud
+        self._stage_keys = {}
+        self._normals_key = None
+        self._result_key = None
+
+        if output_file:
+            self.output_file = output_file
+
+        # Discard the filters merged by a previous poisson_mesh() call
+        self.__class__._parameters_convertion()
+
+        if len(point_cloud_file) > 0:
+            if not os.path.exists(point_cloud_file):
+                raise FileNotFoundError(f'The point cloud file "{point_cloud_file}" was not found')
+
+            with self.profiler.stage('load_file', self.geometry_sizes):
+                self.load_file(point_cloud_file)
 
     @abstractmethod
     def load_file(self, file_path: str):
         raise NotImplementedError
 
+    def load_arrays(
+            self,
+            points: np.ndarray,
+            colors: Optional[np.ndarray] = None,
+            normals: Optional[np.ndarray] = None
+    ):
+        """
+        Load a point cloud held in NumPy arrays (e.g by an upstream stage), without writing/parsing
+        any file. The ``float64`` contiguous arrays are passed to the library without extra copies
+
+        :param points: The points with shape ``(N, 3)``
+        :param colors: The ``uint8`` RGB colors, or floats in the [0, 1] range, with shape
+            ``(N, 3)``
+        :param normals: The normals with shape ``(N, 3)``
+        :return: The point cloud of the library
+        """
+        data = PointCloudData(
+            points=np.ascontiguousarray(points, dtype=np.float64),
+            colors=None if colors is None else np.ascontiguousarray(colors),
+            normals=None if normals is None else np.ascontiguousarray(normals, dtype=np.float64)
+        )
+
+        self.reset()
+
+        with self.profiler.stage('load_data', self.geometry_sizes):
+            return self.load_data(data)
+
+    def reconstruct_arrays(
+            self,
+            points: np.ndarray,
+            colors: Optional[np.ndarray] = None,
+            normals: Optional[np.ndarray] = None,
+            **params: {}
+    ) -> MeshData:
+        """
+        Reconstruct a surface from NumPy arrays to NumPy arrays, without any file I/O
+
+        :param points: The points with shape ``(N, 3)``
+        :param colors: The ``uint8`` RGB colors, or floats in the [0, 1] range, with shape
+            ``(N, 3)``
+        :param normals: The normals with shape ``(N, 3)``
+        :param params: The poisson_mesh() parameters (e.g "filters")
+        :return: The vertices, faces, normals and colors of the mesh
+        """
+        self.load_arrays(points, colors, normals)
+        self.poisson_mesh(save_file=False, **params)
+
+        return self.mesh_data()
+
     @abstractmethod
     def poisson_mesh(self, save_file=True, **params: {}):
         """
@@ -56,6 +194,92 @@ class SurfaceStrategy(ABC):
         """
         raise NotImplementedError
 
+    def density_threshold(self, quantile=0.0, threshold=0.0) -> Optional[float]:
+        """
+        The density below which the vertices are trimmed: the greatest of the
+        absolute threshold and the quantile of the densities
+
+        :return: The threshold, or None if nothing should be trimmed
+        """
+        if self.densities is None or len(self.densities) == 0 or (quantile <= 0 and threshold <= 0):
+            return None
+
+        if quantile > 0:
+            threshold = max(threshold, float(np.quantile(self.densities, quantile)))
+
+        return threshold
+
+    @staticmethod
+    def simplification_target(triangles: int, target_triangles=0, reduction=0.0) -> Optional[int]:
+        """
+        The number of triangles kept by the simplification: the target, or the fraction of the
+        triangles
+
+        :return: The number of triangles, or None if the mesh should not be simplified
+        """
+        target = int(target_triangles) or int(triangles * reduction)
+
+        if target <= 0 or target >= triangles:
+            return None
+
+        return target
+
+    def crop(
+            self, min_bound: Optional[List[float]] = None, max_bound: Optional[List[float]] = None
+    ):
+        """
+        Keep the points inside an axis-aligned box
+
+        :param min_bound: The minimum x, y, z of the box (unbounded when empty)
+        :param max_bound: The maximum x, y, z of the box (unbounded when empty)
+        """
+        data = self.point_cloud_arrays()
+        cropped = streaming.crop(data, min_bound, max_bound)
+
+        if cropped is not data:
+            self.set_point_cloud_arrays(cropped)
+
+    def voxel_downsample(self, voxel_size: float):
+        """
+        Replace the points of each voxel by their mean point, color and normal
+
+        :param voxel_size: The voxel edge length, in point cloud units
+        """
+        self.set_point_cloud_arrays(
+            streaming.voxel_downsample(self.point_cloud_arrays(), voxel_size)
+        )
+
+    def write_mesh(self, file_path: str) -> bool:
+        """
+        Save the current mesh: handed to the background ``mesh_writer`` (``pending_write`` is the
+        future of the file), or written with the ``mesh_encoding`` options, or by the library writer
+
+        :param file_path: The mesh file path
+        :return: If the file was written or queued
+        """
+        is_ply = os.path.splitext(file_path)[1].lower() in ('', '.ply')
+
+        if self.mesh_writer is not None and is_ply:
+            self.pending_write = self.mesh_writer.submit(
+                snapshot(self.mesh_data()), file_path, **(self.mesh_encoding or {})
+            )
+            return True
+
+        if self.mesh_encoding is not None and is_ply:
+            self.mesh_data().write_ply(file_path, **self.mesh_encoding)
+            return True
+
+        return self.save_mesh(file_path)
+
+    def geometry_sizes(self) -> dict:
+        """
+        Sizes of the current point cloud and mesh (e.g points, vertices, triangles),
+        recorded before and after each profiled stage
+
+        :return: The number of elements by name
+        """
+        return {}
+
     def poisson(self, json_filters: str = ""):
         """
         A surface reconstruction triangle method invoked by each library
@@ -69,6 +293,48 @@ class SurfaceStrategy(ABC):
         data = json.loads(json_filters)
         return self.poisson_mesh(save_file=True, **{'filters': data})
 
+    async def poisson_async(
+            self,
+            json_filters: Union[str, dict] = "",
+            on_progress: Optional[Callable] = None,
+            reconstructor=None
+    ):
+        """
+        Reconstruct the point cloud file of this strategy in a worker process, without blocking the
+        event loop. Cancel the awaiting task to kill the worker process. This instance is not
+        changed: load the output file to use the mesh
+
+        :param json_filters: The filters as a dictionary, a JSON string or a .json file path
+        :param on_progress: Called with the ProgressEvent of each stage
+        :param reconstructor: An AsyncReconstructor of the same strategy, e.g shared to bound the
+            parallel workers
+        :return: The BatchResult of the job
+        """
+        # Imported here, the async module depends on the strategies registered in
+        # SurfaceReconstruction
+        from .async_reconstruction import AsyncReconstructor
+
+        if not self.point_cloud_file:
+            raise ValueError(
+                'poisson_async() reconstructs a point cloud file, load it with reset() or the '
+                'constructor'
+            )
+
+        method_type = self.method_type()
+        script = self.filter_script_file if isinstance(self.filter_script_file, str) else ""
+
+        if reconstructor is None:
+            async with AsyncReconstructor(
+                method_type, workers=1, filter_script_file=script
+            ) as reconstructor:
+                return await reconstructor.poisson(
+                    self.point_cloud_file, self.output_file, json_filters, on_progress
+                )
+
+        return await reconstructor.poisson(
+            self.point_cloud_file, self.output_file, json_filters, on_progress
+        )
+
     def default_parameters(self, return_json=True) -> Union[dict, str]:
         """
         Get all parameters required for all filters/methods to do a
@@ -81,35 +347,331 @@ class SurfaceStrategy(ABC):
         else:
             return self.parameters
 
-    def poisson_filters(self, callback: callable, **params: {}):
+    def resolve_filters(self, **params: {}) -> dict:
+        """
+        Merge the "filters" passed to poisson_mesh() into the parameters of each filter/method.
+        A filter passed with an empty value is disabled
 
-        # cls = self.__class__
+        :param params: The poisson_mesh() parameters
+        :return: The resolved parameters by filter/method name
+        """
+        filters = params.get('filters')
 
         for name in self._parameters_key_values:
 
-            if 'filters' in params:
-                filters = params['filters']
+            if filters and name in filters:
 
                 if not filters[name]:
                     self._parameters_key_values[name] = {}
 
                 if type(filters[name]) is dict:
+                    self._parameters_key_values[name].update(filters[name])
 
-                    if self._parameters_key_values and type(self._parameters_key_values) is dict:
-                        self._parameters_key_values[name].update(filters[name])
+        return self._parameters_key_values
 
-            if self._parameters_key_values[name]:
-                callback(name, self._parameters_key_values[name])
+    def thread_filters(self, filters: dict, threads: int) -> dict:
+        """
+        The filters with the thread count of the library (``thread_parameter``), given by the thread
+        scheduler. The libraries without such a parameter (e.g pymeshlab) are limited by the OpenMP
+        thread limit only
+
+        :param filters: The poisson_mesh() filters
+        :param threads: The threads of the job
+        :return: A copy of the filters
+        """
+        filters = dict(filters or {})
+
+        if self.thread_parameter is not None:
+            name, parameter = self.thread_parameter
+            filters[name] = dict(filters.get(name) or {}, **{parameter: threads})
+
+        return filters
+
+    def poisson_filters(
+            self, callback: callable, names: Optional[Iterable[str]] = None, **params: {}
+    ):
+        """
+        Apply the enabled filters/methods in order, each one profiled as a stage
+
+        :param callback: Applies a filter/method of the library, called with its name and parameters
+        :param names: Apply only these filters/methods. All of them when empty
+        :param params: The poisson_mesh() parameters
+        """
+        # A copy for this run: the planning stages (e.g auto_depth) change the Poisson parameters
+        # of this run only, not the resolved filters of the next runs
+        filters = {
+            name: dict(params_key_values)
+            for name, params_key_values in self.resolve_filters(**params).items()
+        }
+        normal_stages = self.normal_stages_prefix(filters)
+        names = None if names is None else set(names)
+        cached_stages = []
+        mesh_stage = False
+
+        if names is None:
+            cached_stages = self.load_cached_stages(filters)
+        else:
+            # The outputs of the selected stages are stored under the keys of the current parameters
+            # (e.g the depth of a level of detail)
+            self.update_stage_keys(filters)
+
+        runs_normals = names is None or (normal_stages and normal_stages[-1] in names)
+
+        if runs_normals and not set(normal_stages) <= set(cached_stages):
+            cached_stages = self.load_cached_normals(filters) or cached_stages
+
+        for name, params_key_values in filters.items():
+
+            if names is not None and name not in names:
+                continue
+
+            # The stages from the Poisson reconstruction change the mesh, the previous ones the
+            # point cloud
+            mesh_stage = mesh_stage or name == 'surface_reconstruction_screened_poisson'
+
+            if params_key_values and name not in cached_stages:
+                with self.profiler.stage(name, self.geometry_sizes) as metrics:
+                    if name in self.planning_stages:
+                        getattr(self, name)(filters, **params_key_values)
+                    elif name in self.array_stages:
+                        getattr(self, name)(**params_key_values)
+                    else:
+                        callback(name, params_key_values)
+
+                if name == 'surface_reconstruction_screened_poisson':
+                    self.record_poisson(metrics)
+
+                if normal_stages and name == normal_stages[-1]:
+                    self.store_normals()
+
+                self.store_stage(name, mesh_stage)
+
+    def record_poisson(self, metrics: StageMetrics):
+        """
+        Record the measured cost of the Poisson stage in the decisions of the stages before it
+
+        :param metrics: The StageMetrics of the Poisson stage
+        """
+        if self.depth_choice is not None:
+            self.depth_choice.actual_time = metrics.wall_time
+            self.depth_choice.actual_rss = metrics.stage_peak_rss
+
+            if self.verbose:
+                print(self.depth_choice.summary())
+
+        if self.outlier_report is not None:
+            self.outlier_report.poisson_time = metrics.wall_time
+
+        if self.memory_decision is not None:
+            self.memory_decision.actual_rss = metrics.stage_peak_rss
+
+            if self.verbose:
+                print(self.memory_decision.summary())
+
+    def select_point_cloud(self):
+        """
+        Make the point cloud the input of the next Poisson reconstruction again (e.g for another
+        level of detail)
+        """
+        pass
+
+    def poisson_lod(
+            self,
+            depths: Iterable[int] = (6, 7, 8, 9),
+            save_file=True,
+            on_level: Optional[Callable[[int, str], None]] = None,
+            **params: {}
+    ) -> List[str]:
+        """
+        Reconstruct several levels of detail sharing a single load and normal estimation, coarse
+        first (see lod.reconstruct_levels())
+
+        :param depths: The Poisson depth of each level
+        :param save_file: Save each level in "<output file name>_depth<depth>.<extension>"
+        :param on_level: Called with the depth and the file of each level, once saved
+        :param params: The poisson_mesh() parameters (e.g "filters", "output_file")
+        :return: The files of the levels, coarse first
+        """
+        return reconstruct_levels(self, depths, save_file, on_level, **params)
+
+    def cost_model(self) -> CostModel:
+        """
+        The calibrated cost model of the strategy, predicting the Poisson time and memory
+        """
+        return CostModel.load(self.method_type())
+
+    def method_type(self) -> str:
+        """
+        The method type of this strategy in SurfaceReconstruction, e.g "open3d"
+        """
+        # Imported here, the registry module imports this one
+        from .surface_reconstruction import SurfaceReconstruction
+
+        return SurfaceReconstruction.method_type(self.__class__)
+
+    def auto_depth(self, filters: dict, **budget: {}) -> DepthChoice:
+        """
+        Choose the Poisson depth (and the "samplespernode"/"fulldepth" parameters when the method
+        has them) of the current point cloud within a wall time/peak RSS budget, with the calibrated
+        cost model of the strategy. The choice, with the predicted and actual costs, is recorded in
+        ``depth_choice``
+
+        :param filters: The filters of the run, the Poisson parameters are updated
+        :param budget: The DepthBudget fields: "wall_time" (seconds), "peak_rss" (bytes),
+            "min_depth", "max_depth"
+        :return: The depth choice
+        """
+        self.depth_choice = apply_auto_depth(
+            self.point_cloud_arrays().points,
+            filters['surface_reconstruction_screened_poisson'],
+            DepthBudget(**budget),
+            self.cost_model(),
+            start_rss=memory_usage()[0]
+        )
+
+        return self.depth_choice
+
+    def memory_budget(
+            self, filters: dict, peak_rss: int, policy='downsample', min_depth=5, min_points=1000
+    ) -> MemoryDecision:
+        """
+        Fit the Poisson reconstruction in a peak RSS budget, predicted with the cost model of the
+        strategy (see memory_budget.apply_memory_budget()). The decision is recorded in
+        ``memory_decision``, with the measured peak RSS of the Poisson stage
+
+        :param filters: The filters of the run, the Poisson depth is updated
+        :param peak_rss: The peak RSS budget of the process, in bytes
+        :param policy: "downsample" (keep the depth) or "depth" (lower the depth first, down to
+            ``min_depth``)
+        :param min_depth: The minimum depth of the "depth" policy
+        :param min_points: The minimum number of points kept by the downsampling
+        :return: The decision
+        """
+        decision, reduced = apply_memory_budget(
+            self.point_cloud_arrays(),
+            filters['surface_reconstruction_screened_poisson'],
+            peak_rss,
+            self.cost_model(),
+            start_rss=memory_usage()[0],
+            policy=policy,
+            min_depth=min_depth,
+            min_points=min_points
+        )
+
+        if reduced is not None:
+            self.set_point_cloud_arrays(reduced)
+
+        self.memory_decision = decision
+
+        if self.verbose and decision.reduced:
+            print(decision.summary())
+
+        return decision
+
+    def outlier_removal(
+            self,
+            filters: dict,
+            mode='statistical',
+            nb_neighbors=20,
+            std_ratio=2.0,
+            nb_points=16,
+            radius=0.0
+    ) -> OutlierReport:
+        """
+        Remove the isolated points (e.g noisy scan returns), which would refine the Poisson octree
+        around them (see outliers.remove_outliers()). The dropped points and the Poisson time and
+        memory saved (predicted with the cost model of the strategy) are recorded in
+        ``outlier_report``
+
+        :param filters: The resolved filters, the Poisson parameters drive the prediction
+        :param mode: "statistical" or "radius"
+        :param nb_neighbors: The neighbors of the "statistical" mode
+        :param std_ratio: The accepted deviation of the "statistical" mode, in standard deviations
+        :param nb_points: The minimum number of points within the radius of the "radius" mode
+        :param radius: The radius of the "radius" mode. Defaults to 3 times the point spacing
+        :return: The report
+        """
+        data = self.point_cloud_arrays()
+        stats = CloudStats.from_points(data.points)
+        kept, report = remove_outliers(
+            data, mode, nb_neighbors, std_ratio, nb_points, radius, stats.spacing
+        )
+
+        if report.removed > 0:
+            self.set_point_cloud_arrays(kept)
+
+        # The strategies without any Poisson stage (e.g heightfield) have nothing to predict
+        poisson = filters.get('surface_reconstruction_screened_poisson')
+
+        if report.removed > 0 and poisson is not None:
+            model = self.cost_model()
+            before = model.predict(stats, **cost_options(poisson))
+            after = model.predict(CloudStats.from_points(kept.points), **cost_options(poisson))
+            report.predicted_time_saved = before[0] - after[0]
+            report.predicted_memory_saved = before[1] - after[1]
+
+        self.outlier_report = report
+
+        if self.verbose:
+            print(report.summary())
+
+        return report
+
+    def orient_normals(
+            self, mode='up', up=(0, 0, 1), viewpoint=None, ambiguity=0.2, k=10, iterations=100
+    ) -> dict:
+        """
+        Orient the normals of the current point cloud to an up vector or toward a viewpoint, with
+        NumPy only. The "hybrid" mode propagates the orientation from the neighbors only where that
+        rule is ambiguous (see normals.orient_normals())
+
+        :param mode: "up", "viewpoint" or "hybrid"
+        :param up: The up vector
+        :param viewpoint: The sensor/viewpoint position
+        :param ambiguity: The cosine below which the rule is ambiguous, in the "hybrid" mode
+        :param k: The neighbors of the ambiguous normals, in the "hybrid" mode
+        :param iterations: Maximum number of propagation steps, in the "hybrid" mode
+        :return: The number of ``flipped``, ``ambiguous`` and ``propagated`` normals
+        """
+        data = self.point_cloud_arrays()
+
+        if data.normals is None or not np.any(data.normals):
+            raise ValueError('The normals should be estimated before orienting them')
+
+        normals, counts = orient_normals(
+            data.points, data.normals, mode, up, viewpoint, ambiguity, k, iterations
+        )
+        self.set_point_cloud_arrays(
+            PointCloudData(points=data.points, colors=data.colors, normals=normals)
+        )
+
+        if self.verbose:
+            summary = f'Orient normals ({mode}): {counts["flipped"]} of {len(normals)} flipped'
+
+            if mode == 'hybrid':
+                summary += f', {counts["propagated"]} of {counts["ambiguous"]} ambiguous propagated'
+
+            print(summary)
+
+        return counts
 
     @classmethod
     def _parameters_convertion(cls) -> dict:
 
+        # Each strategy resolves its own filters, instead of sharing the base class dictionary
+        if '_parameters_key_values' not in cls.__dict__:
+            cls._parameters_key_values = {}
+
         for param_name in cls.parameters:
             if type(cls.parameters[param_name]) is list:
-                cls._parameters_key_values[param_name] = {item['name']: item['value'] for item in cls.parameters[param_name]}
+                cls._parameters_key_values[param_name] = {
+                    item['name']: item['value'] for item in cls.parameters[param_name]
+                }
             elif type(cls.parameters[param_name]) is dict:
                 if 'name' in cls.parameters[param_name] and 'value' in cls.parameters[param_name]:
-                    cls._parameters_key_values[param_name] = {cls.parameters[param_name]['name']: cls.parameters[param_name]['value']}
+                    cls._parameters_key_values[param_name] = {
+                        cls.parameters[param_name]['name']: cls.parameters[param_name]['value']
+                    }
                 else:
                     cls._parameters_key_values[param_name] = cls.parameters[param_name].copy()
 
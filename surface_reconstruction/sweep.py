@@ -0,0 +1,418 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional, Tuple, Union
+import argparse
+import copy
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+from .batch import init_worker, load_filters, worker_strategy
+from .point_cloud_io import PointCloudData
+from .surface_reconstruction import SurfaceReconstruction
+
+# The stages from the first of these filters/methods run for each combination (the leaves),
+# the ones before are shared by the combinations with the same parameters (the prefixes)
+LEAF_STAGES = ('auto_depth', 'surface_reconstruction_screened_poisson')
+
+
+@dataclass
+class SweepResult:
+    """
+    A row of the sweep table. ``shared_time`` is the time of the load and the prefix stages of the
+    combination (computed once for all the combinations sharing them), ``leaf_time`` the time of
+    its own stages, and the quality metrics compare the points reaching the Poisson stage with the
+    mesh (see quality.compare())
+    """
+
+    id: int
+    parameters: Dict[str, Any]
+    status: str = 'ok'
+    error: str = ''
+    shared_time: float = 0.0
+    leaf_time: float = 0.0
+    total_time: float = 0.0
+    points: int = 0
+    vertices: int = 0
+    triangles: int = 0
+    chamfer: float = 0.0
+    hausdorff: float = 0.0
+    within_tolerance: float = 0.0
+    normal_consistency: Optional[float] = None
+    output_file: str = ''
+    stages: list = field(default_factory=list)
+
+
+@dataclass
+class _PrefixNode:
+    name: str
+    filters: dict
+    children: Dict[str, '_PrefixNode'] = field(default_factory=dict)
+    prefix: Optional[str] = None
+
+
+def grid_combinations(
+        grid: Dict[str, Dict[str, list]], base_filters: Optional[dict] = None
+) -> List[dict]:
+    """
+    The filters of each combination of the grid values, merged in the base filters
+
+    :param grid: Lists of values by filter/method and parameter, e.g
+        ``{'surface_reconstruction_screened_poisson': {'depth': [6, 8]}}``
+    :param base_filters: The filters shared by all the combinations
+    :return: The filters of each combination
+    """
+    keys = [(name, parameter) for name, parameters in grid.items() for parameter in parameters]
+    combinations = []
+
+    for values in itertools.product(*(grid[name][parameter] for name, parameter in keys)):
+        filters = copy.deepcopy(base_filters or {})
+
+        for (name, parameter), value in zip(keys, values):
+            stage = filters.get(name)
+            filters[name] = dict(stage) if isinstance(stage, dict) else {}
+            filters[name][parameter] = value
+
+        combinations.append(filters)
+
+    return combinations
+
+
+def split_stages(stage_names: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Split the filters/methods of a strategy in the prefix stages and the leaf stages
+    """
+    index = next(
+        (index for index, name in enumerate(stage_names) if name in LEAF_STAGES), len(stage_names)
+    )
+    return stage_names[:index], stage_names[index:]
+
+
+def _stage_key(filters: dict, name: str) -> str:
+    return json.dumps(filters.get(name), sort_keys=True, default=str)
+
+
+def build_stage_tree(
+        combinations: List[dict], prefix_stages: List[str]
+) -> Tuple[Dict[str, _PrefixNode], List[str]]:
+    """
+    Build the tree of the prefix stages: each level is a prefix stage and each node a distinct
+    value of its parameters, so the combinations with the same prefix share the same path
+
+    :return: The root nodes (by first stage parameters) and the prefix (leaf node path) of each
+        combination
+    """
+    roots: Dict[str, _PrefixNode] = {}
+    prefixes = []
+
+    if not prefix_stages:
+        # Only the load is shared
+        roots[''] = _PrefixNode('', {}, prefix='[]')
+        return roots, ['[]'] * len(combinations)
+
+    for filters in combinations:
+        nodes = roots
+        path = []
+
+        for name in prefix_stages:
+            key = _stage_key(filters, name)
+            path.append(key)
+
+            if key not in nodes:
+                nodes[key] = _PrefixNode(name, {name: filters[name]} if name in filters else {})
+
+            node = nodes[key]
+            nodes = node.children
+
+        prefix = json.dumps(path)
+        node.prefix = prefix
+        prefixes.append(prefix)
+
+    return roots, prefixes
+
+
+def _sweep_prefix(point_cloud_file: str, root: _PrefixNode, base_filters: dict) -> Dict[str, tuple]:
+    """
+    Walk a branch of the stage tree in a worker: load the point cloud once, then apply each
+    node from the point cloud of its parent node
+
+    :return: The point cloud and the accumulated stage time at the end of each prefix
+    """
+    strategy = worker_strategy()
+    strategy.reset(point_cloud_file)
+
+    load_time = sum(stage['wall_time'] for stage in strategy.profiler.report()['stages'])
+    results = {}
+
+    def walk(node: _PrefixNode, data: PointCloudData, elapsed: float):
+        node_data = data
+
+        if node.name:
+            strategy.set_point_cloud_arrays(data)
+
+            # Each node starts from the point cloud of its parent: a sibling estimate_normals node
+            # computes its own normals, instead of being dispatched to the library point cloud
+            strategy.normals_estimated = False
+
+            # Start from the default parameters, as the filters are merged in the class parameters
+            strategy.__class__._parameters_convertion()
+            strategy.profiler.clear()
+            strategy.poisson_filters(
+                strategy.apply_filter, names=[node.name], filters={**base_filters, **node.filters}
+            )
+
+            elapsed += sum(stage['wall_time'] for stage in strategy.profiler.report()['stages'])
+            node_data = strategy.point_cloud_arrays()
+
+        if node.prefix is not None:
+            results[node.prefix] = (node_data, elapsed)
+
+        for child in node.children.values():
+            walk(child, node_data, elapsed)
+
+    walk(root, strategy.point_cloud_arrays(), load_time)
+    return results
+
+
+def _sweep_leaf(
+        data: PointCloudData, filters: dict, leaf_stages: List[str], output_file: str
+) -> dict:
+    """
+    Run the leaf stages of a combination in a worker, from the point cloud of its prefix
+    """
+    from .quality import compare
+
+    strategy = worker_strategy()
+    result = {}
+    start = time.perf_counter()
+
+    try:
+        strategy.load_arrays(data.points, data.colors, data.normals)
+        strategy.poisson_filters(strategy.apply_filter, names=leaf_stages, filters=filters)
+
+        mesh = strategy.mesh_data()
+        result.update(vertices=mesh.vertex_number, triangles=mesh.face_number)
+
+        if mesh.face_number > 0:
+            quality = compare(data.points, mesh, data.normals)
+            result.update(
+                chamfer=quality.chamfer,
+                hausdorff=quality.hausdorff,
+                within_tolerance=quality.within_tolerance,
+                normal_consistency=quality.normal_consistency
+            )
+
+        if output_file:
+            with strategy.profiler.stage('save_mesh', strategy.geometry_sizes):
+                strategy.write_mesh(output_file)
+    except Exception as error:
+        result['status'] = 'failed'
+        result['error'] = ''.join(traceback.format_exception_only(type(error), error)).strip()
+
+    result['leaf_time'] = time.perf_counter() - start
+    result['stages'] = strategy.profiler.report()['stages']
+
+    return result
+
+
+def flat_parameters(grid: Dict[str, Dict[str, list]], filters: dict) -> Dict[str, Any]:
+    return {
+        f'{name}.{parameter}': filters[name][parameter]
+        for name, parameters in grid.items()
+        for parameter in parameters
+    }
+
+
+def run_sweep(
+        point_cloud_file: str,
+        grid: Dict[str, Dict[str, list]],
+        method_type='default',
+        json_filters: Union[str, dict] = "",
+        workers: Optional[int] = None,
+        output_folder="",
+        verbose=True
+) -> List[SweepResult]:
+    """
+    Reconstruct a point cloud with each combination of a parameter grid. The stages before the
+    Poisson reconstruction (load, simplification, normals...) are computed once for all the
+    combinations sharing their parameters, walking a stage tree, and the leaves (the Poisson
+    reconstruction and the next stages of each combination) run in parallel worker processes
+
+    :param point_cloud_file: The point cloud file
+    :param grid: Lists of values by filter/method and parameter, e.g
+        ``{'estimate_normals': {'fast_normal_computation': [True, False]}}``
+    :param method_type: The strategy registered in SurfaceReconstruction
+    :param json_filters: The filters shared by all the combinations, as a dictionary, a JSON string
+        or .json file path
+    :param workers: Number of worker processes. Defaults to the number of CPUs
+    :param output_folder: Save the mesh of each combination in "<output folder>/sweep_<id>.ply"
+    :param verbose: Print each result
+    :raises ValueError: If the grid has a filter/method unknown by the strategy
+    :return: The table rows, one by combination
+    """
+    stage_names = list(SurfaceReconstruction.strategy_type(method_type).parameters)
+    unknown = [name for name in grid if name not in stage_names]
+
+    if unknown:
+        raise ValueError(
+            f'The filters/methods {unknown} are not parameters of the "{method_type}" strategy: '
+            f'{stage_names}'
+        )
+
+    base_filters = json_filters if isinstance(json_filters, dict) else load_filters(json_filters)
+    combinations = grid_combinations(grid, base_filters)
+    prefix_stages, leaf_stages = split_stages(stage_names)
+    roots, prefixes = build_stage_tree(combinations, prefix_stages)
+
+    if output_folder:
+        os.makedirs(output_folder, exist_ok=True)
+
+    results = [
+        SweepResult(index, flat_parameters(grid, filters))
+        for index, filters in enumerate(combinations)
+    ]
+    context = multiprocessing.get_context('spawn')
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(workers, context, init_worker, (method_type,)) as pool:
+        prefix_futures = {
+            pool.submit(_sweep_prefix, point_cloud_file, root, base_filters): key
+            for key, root in roots.items()
+        }
+        leaf_futures = {}
+
+        # The leaves of a branch start as soon as its prefixes are computed
+        for future in as_completed(prefix_futures):
+            try:
+                prefix_results = future.result()
+            except Exception as error:
+                prefix_results = {}
+                message = ''.join(traceback.format_exception_only(type(error), error)).strip()
+
+                for result, prefix in zip(results, prefixes):
+                    if json.loads(prefix)[:1] in ([prefix_futures[future]], []):
+                        result.status, result.error = 'failed', message
+
+            for result, prefix, filters in zip(results, prefixes, combinations):
+                if prefix not in prefix_results:
+                    continue
+
+                data, result.shared_time = prefix_results[prefix]
+                result.points = len(data)
+
+                output_file = (
+                    os.path.join(output_folder, f'sweep_{result.id}.ply') if output_folder else ''
+                )
+                future = pool.submit(_sweep_leaf, data, filters, leaf_stages, output_file)
+                leaf_futures[future] = result
+
+        for future in as_completed(leaf_futures):
+            result = leaf_futures[future]
+
+            try:
+                values = future.result()
+            except Exception as error:
+                values = {'status': 'failed', 'error': repr(error)}
+
+            for name, value in values.items():
+                setattr(result, name, value)
+
+            result.total_time = result.shared_time + result.leaf_time
+            result.output_file = (
+                os.path.join(output_folder, f'sweep_{result.id}.ply')
+                if output_folder and result.status == 'ok'
+                else ''
+            )
+
+            if verbose:
+                print(
+                    f'[{result.status}] {json.dumps(result.parameters)}: {result.total_time:.3f}s, '
+                    f'{result.triangles} triangles, chamfer {result.chamfer:.4g}',
+                    flush=True
+                )
+
+    if verbose:
+        standalone = sum(result.total_time for result in results)
+        print(f'{len(results)} combinations, {len(set(prefixes))} shared prefixes, '
+              f'{time.perf_counter() - start:.3f}s '
+              f'({standalone:.3f}s of stages when run one by one)')
+
+    return results
+
+
+def write_table(results: List[SweepResult], file_path: str):
+    """
+    Write the sweep table in a .csv file (one column by parameter), or a .json file
+    """
+    rows = [asdict(result) for result in results]
+
+    if file_path.endswith('.json'):
+        with open(file_path, 'w') as file:
+            json.dump(rows, file, indent=2)
+        return
+
+    parameters = list(rows[0]['parameters']) if rows else []
+    columns = [name for name in (rows[0] if rows else {}) if name not in ('parameters', 'stages')]
+
+    with open(file_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['id'] + parameters + columns[1:])
+
+        for row in rows:
+            writer.writerow(
+                [row['id']]
+                + [row['parameters'][name] for name in parameters]
+                + [row[name] for name in columns[1:]]
+            )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m surface_reconstruction.sweep',
+        description='Reconstruct a point cloud with each combination of a parameter grid, sharing '
+                    'the common stages'
+    )
+    parser.add_argument('point_cloud_file')
+    parser.add_argument(
+        'grid',
+        help='The grid as a JSON string or .json file, e.g '
+             '{"surface_reconstruction_screened_poisson": {"depth": [6, 8]}}'
+    )
+    parser.add_argument('-m', '--method-type', default='default')
+    parser.add_argument(
+        '-f',
+        '--filters',
+        default='',
+        help='Filters shared by all the combinations, as a JSON string or .json file'
+    )
+    parser.add_argument('-w', '--workers', type=int, default=None)
+    parser.add_argument(
+        '--output-folder', default='', help='Save the mesh of each combination in this folder'
+    )
+    parser.add_argument(
+        '-o', '--output', default='sweep_results.csv', help='The results table, .csv or .json'
+    )
+    args = parser.parse_args(argv)
+
+    results = run_sweep(
+        args.point_cloud_file,
+        load_filters(args.grid),
+        args.method_type,
+        args.filters,
+        args.workers,
+        args.output_folder
+    )
+    write_table(results, args.output)
+
+    print(f'Results written in "{args.output}"')
+    return 0 if all(result.status == 'ok' for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,256 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import json
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+
+from .batch import init_worker, load_filters, worker_strategy
+from .mesh_data import MeshData
+from .point_cloud_io import read_point_cloud, write_ply
+from .spatial import KDTree
+
+
+@dataclass
+class Tile:
+    """
+    A XY tile of the point cloud. ``core`` is the region ``[xmin, ymin, xmax, ymax)`` kept
+    from the tile mesh, and the points include the ones of the overlap margin around it.
+    The core of the tiles at the border of the grid is unbounded outwards.
+    """
+
+    index: Tuple[int, int]
+    core: np.ndarray
+    point_indices: np.ndarray
+
+
+def split_tiles(
+        points: np.ndarray,
+        tiles=(2, 2),
+        tile_size: Optional[float] = None,
+        overlap: Optional[float] = None
+) -> List[Tile]:
+    """
+    Split the points in a grid of XY tiles, with an overlap margin around each tile
+
+    :param points: The points with shape ``(N, 3)``
+    :param tiles: Number of tiles in X and Y, used when ``tile_size`` is not given
+    :param tile_size: Width/height of the (square) tiles, in point cloud units
+    :param overlap: Margin around each tile, in point cloud units. Defaults to 10% of the tile size
+    :return: The non empty tiles
+    """
+    xy = np.asarray(points)[:, :2]
+    origin = xy.min(axis=0)
+    extent = np.maximum(np.ptp(xy, axis=0), np.finfo(np.float64).eps)
+
+    if tile_size:
+        size = np.array([tile_size, tile_size], dtype=np.float64)
+        counts = np.maximum(np.ceil(extent / size), 1).astype(np.int64)
+    else:
+        counts = np.asarray(tiles, dtype=np.int64)
+        size = extent / counts
+
+    if overlap is None:
+        overlap = 0.1 * size.min()
+    overlap = min(overlap, 0.99 * size.min())
+
+    # A point belongs to the tiles of its position +/- the overlap: at most 2 tiles by axis
+    low = np.clip(np.floor((xy - overlap - origin) / size), 0, counts - 1).astype(np.int64)
+    high = np.clip(np.floor((xy + overlap - origin) / size), 0, counts - 1).astype(np.int64)
+
+    tile_ids = []
+    point_ids = []
+    all_points = np.arange(len(xy))
+
+    for use_high_x in (False, True):
+        for use_high_y in (False, True):
+            ix = high[:, 0] if use_high_x else low[:, 0]
+            iy = high[:, 1] if use_high_y else low[:, 1]
+
+            mask = np.ones(len(xy), dtype=bool)
+            if use_high_x:
+                mask &= high[:, 0] != low[:, 0]
+            if use_high_y:
+                mask &= high[:, 1] != low[:, 1]
+
+            tile_ids.append((ix * counts[1] + iy)[mask])
+            point_ids.append(all_points[mask])
+
+    tile_ids = np.concatenate(tile_ids)
+    point_ids = np.concatenate(point_ids)
+
+    order = np.argsort(tile_ids, kind='stable')
+    tile_ids, point_ids = tile_ids[order], point_ids[order]
+    splits = np.flatnonzero(np.diff(tile_ids)) + 1
+
+    result = []
+    for ids, indices in zip(np.split(tile_ids, splits), np.split(point_ids, splits)):
+        if len(indices) == 0:
+            continue
+
+        ix, iy = divmod(int(ids[0]), int(counts[1]))
+        core = np.array([
+            origin[0] + ix * size[0] if ix > 0 else -np.inf,
+            origin[1] + iy * size[1] if iy > 0 else -np.inf,
+            origin[0] + (ix + 1) * size[0] if ix < counts[0] - 1 else np.inf,
+            origin[1] + (iy + 1) * size[1] if iy < counts[1] - 1 else np.inf
+        ])
+        result.append(Tile((ix, iy), core, np.sort(indices)))
+
+    return result
+
+
+def trim_to_core(mesh: MeshData, core: np.ndarray) -> MeshData:
+    """
+    Keep the faces whose center is inside the core region of a tile. As the cores don't
+    overlap, each face of the overlap margin is kept by a single tile
+    """
+    centers = mesh.face_centers()[:, :2]
+    mask = np.all(centers >= core[:2], axis=1) & np.all(centers < core[2:], axis=1)
+
+    return mesh.select_faces(mask)
+
+
+def boundary_vertices(mesh: MeshData) -> np.ndarray:
+    """
+    Indices of the vertices of the boundary edges (edges of a single face)
+    """
+    edges = np.sort(mesh.faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    unique_edges, counts = np.unique(edges, axis=0, return_counts=True)
+
+    return np.unique(unique_edges[counts == 1])
+
+
+def stitch(meshes: List[MeshData], tolerance: Optional[float] = None, neighbors=8) -> MeshData:
+    """
+    Merge the trimmed tile meshes, welding the boundary vertices of each tile to the nearest
+    boundary vertex of a previous tile within the tolerance, closing the seams between tiles
+
+    :param meshes: The trimmed meshes of each tile
+    :param tolerance: Maximum distance of welded vertices. Defaults to the median edge length
+    :param neighbors: Number of nearest boundary vertices searched for each boundary vertex
+    :return: The stitched mesh
+    """
+    meshes = [mesh for mesh in meshes if mesh.face_number > 0]
+    merged = MeshData.merge(meshes)
+
+    if len(meshes) < 2:
+        return merged
+
+    tile_of_vertex = np.repeat(np.arange(len(meshes)), [mesh.vertex_number for mesh in meshes])
+    offsets = np.cumsum([0] + [mesh.vertex_number for mesh in meshes[:-1]])
+    boundary = np.concatenate(
+        [boundary_vertices(mesh) + offset for mesh, offset in zip(meshes, offsets)]
+    )
+
+    if tolerance is None:
+        tolerance = float(np.median(merged.edge_lengths()))
+
+    distances, indices = KDTree(merged.vertices[boundary]).query(
+        merged.vertices[boundary], k=neighbors + 1
+    )
+    candidates = boundary[indices]
+
+    # Weld only to vertices of previous tiles, so the chains (e.g tile corners) always end
+    earlier_tile = tile_of_vertex[candidates] < tile_of_vertex[boundary][:, None]
+    valid = (distances <= tolerance) & earlier_tile
+    has_target = valid.any(axis=1)
+    first = np.argmax(valid, axis=1)
+
+    remap = np.arange(merged.vertex_number)
+    remap[boundary[has_target]] = candidates[has_target, first[has_target]]
+
+    while True:
+        next_remap = remap[remap]
+        if np.array_equal(next_remap, remap):
+            break
+        remap = next_remap
+
+    faces = remap[merged.faces]
+    degenerate = (
+        (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 2] == faces[:, 0])
+    )
+
+    welded = MeshData(merged.vertices, faces, merged.normals, merged.colors)
+    return welded.select_faces(~degenerate)
+
+
+def _reconstruct_tile(tile_file: str, core: np.ndarray, filters: dict) -> MeshData:
+    strategy = worker_strategy()
+    strategy.reset(tile_file)
+
+    params = {'filters': filters} if filters else {}
+    strategy.poisson_mesh(save_file=False, **params)
+
+    return trim_to_core(strategy.mesh_data(), core)
+
+
+def reconstruct_tiled(
+        point_cloud_file: str,
+        output_file="",
+        method_type='default',
+        json_filters="",
+        tiles=(2, 2),
+        tile_size: Optional[float] = None,
+        overlap: Optional[float] = None,
+        workers: Optional[int] = None,
+        tolerance: Optional[float] = None
+) -> MeshData:
+    """
+    Reconstruct a large point cloud in XY tiles, with an overlap margin around each tile.
+    The tiles are reconstructed in parallel worker processes (each one with a higher depth
+    and a peak memory bounded by the tile size), trimmed to their core region and stitched.
+
+    :param point_cloud_file: The point cloud file
+    :param output_file: The stitched mesh .ply file. Not written when empty
+    :param method_type: The strategy registered in SurfaceReconstruction
+    :param json_filters: The filters applied to each tile, as a JSON string or .json file path
+    :param tiles: Number of tiles in X and Y, used when ``tile_size`` is not given
+    :param tile_size: Width/height of the (square) tiles, in point cloud units
+    :param overlap: Margin around each tile, in point cloud units. Defaults to 10% of the tile size
+    :param workers: Number of worker processes. Defaults to the number of CPUs
+    :param tolerance: Maximum distance of the vertices welded in the seams
+    :raises RuntimeError: If any tile reconstruction fails
+    :return: The stitched mesh
+    """
+    data = read_point_cloud(point_cloud_file)
+    filters = load_filters(json_filters)
+    tiles_list = split_tiles(data.points, tiles, tile_size, overlap)
+
+    context = multiprocessing.get_context('spawn')
+
+    with tempfile.TemporaryDirectory() as temp_folder:
+        tile_files = []
+
+        for tile in tiles_list:
+            tile_file = os.path.join(temp_folder, f'tile_{tile.index[0]}_{tile.index[1]}.ply')
+            write_ply(tile_file, data.select(tile.point_indices))
+            tile_files.append(tile_file)
+
+        with ProcessPoolExecutor(workers, context, init_worker, (method_type,)) as pool:
+            futures = [
+                pool.submit(_reconstruct_tile, tile_file, tile.core, filters)
+                for tile, tile_file in zip(tiles_list, tile_files)
+            ]
+
+            meshes = []
+            errors = []
+            for tile, future in zip(tiles_list, futures):
+                try:
+                    meshes.append(future.result())
+                except Exception as error:
+                    errors.append(f'tile {tile.index}: {error!r}')
+
+    if errors:
+        raise RuntimeError('Tile reconstruction failed: ' + json.dumps(errors))
+
+    mesh = stitch(meshes, tolerance)
+
+    if output_file:
+        mesh.write_ply(output_file)
+
+    return mesh
@@ -0,0 +1,115 @@
+from surface_reconstruction import Open3dSurface
+from surface_reconstruction.async_reconstruction import AsyncReconstructor
+import unittest
+import asyncio
+import tempfile
+import shutil
+import os
+
+
+class AsyncReconstructionTest(unittest.TestCase):
+
+    filters = {'surface_reconstruction_screened_poisson': {'depth': 6}}
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'simple_terrain', 'list_vertex.ply')
+        self.temp_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def test_concurrent_jobs_progress(self):
+        events = []
+        output_files = [
+            os.path.join(self.temp_folder, f'terrain_{index}.ply') for index in range(2)
+        ]
+
+        async def run():
+            async with AsyncReconstructor('open3d', workers=2) as reconstructor:
+                return await asyncio.gather(
+                    *(
+                        reconstructor.poisson(
+                            self.point_cloud_file, output_file, self.filters, events.append
+                        )
+                        for output_file in output_files
+                    )
+                )
+
+        results = asyncio.run(run())
+
+        self.assertTrue(all(result.ok for result in results))
+        self.assertTrue(all(os.path.exists(output_file) for output_file in output_files))
+
+        job_events = [event.event for event in events if event.job_id == events[0].job_id]
+        stages = [
+            event.stage
+            for event in events
+            if event.job_id == events[0].job_id and event.event == 'stage_end'
+        ]
+
+        self.assertEqual(job_events[:2], ['queued', 'started'])
+        self.assertEqual(job_events[-1], 'done')
+        self.assertIn('load_file', stages)
+        self.assertIn('surface_reconstruction_screened_poisson', stages)
+
+    def test_warm_worker_reused(self):
+        async def run():
+            async with AsyncReconstructor('open3d', workers=1) as reconstructor:
+                return [
+                    await reconstructor.poisson(
+                        self.point_cloud_file,
+                        os.path.join(self.temp_folder, f'terrain_{index}.ply'),
+                        self.filters
+                    )
+                    for index in range(2)
+                ]
+
+        results = asyncio.run(run())
+
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(results[0].worker, results[1].worker)
+
+    def test_cancel_running_and_queued_jobs(self):
+        events = []
+
+        async def run():
+            async with AsyncReconstructor('open3d', workers=1) as reconstructor:
+                tasks = [
+                    asyncio.ensure_future(
+                        reconstructor.poisson(
+                            self.point_cloud_file,
+                            os.path.join(self.temp_folder, f'terrain_{index}.ply'),
+                            self.filters,
+                            events.append
+                        )
+                    )
+                    for index in range(2)
+                ]
+
+                # Cancel once the first job runs a stage, the second one is still queued
+                while not any(event.event == 'stage_start' for event in events):
+                    await asyncio.sleep(0.05)
+
+                for task in tasks:
+                    task.cancel()
+
+                return await asyncio.gather(*tasks, return_exceptions=True)
+
+        results = asyncio.run(run())
+
+        self.assertTrue(all(isinstance(result, asyncio.CancelledError) for result in results))
+        self.assertEqual(len([event for event in events if event.event == 'cancelled']), 2)
+        self.assertFalse(any(event.event == 'done' for event in events))
+
+    def test_strategy_poisson_async(self):
+        output_file = os.path.join(self.temp_folder, 'terrain.ply')
+        surface = Open3dSurface(point_cloud_file=self.point_cloud_file, output_file=output_file)
+
+        result = asyncio.run(surface.poisson_async(self.filters))
+
+        self.assertTrue(result.ok, result.error)
+        self.assertTrue(os.path.exists(output_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
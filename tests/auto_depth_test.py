@@ -0,0 +1,211 @@
+from surface_reconstruction import Open3dSurface, PyMeshlabSurface
+from surface_reconstruction.auto_depth import (
+    CloudStats,
+    CostModel,
+    DepthBudget,
+    choose_depth,
+    cost_options,
+    octree_nodes,
+    fit_memory
+)
+from surface_reconstruction.profiling import memory_usage
+from surface_reconstruction.point_cloud_io import read_point_cloud
+import contextlib
+import unittest
+import io
+import os
+import numpy
+
+
+class AutoDepthTest(unittest.TestCase):
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'complex_terrain', 'list_vertex.ply')
+        self.stats = CloudStats.from_points(read_point_cloud(self.point_cloud_file).points)
+        self.model = CostModel([0.1, 1e-6, 1e-5], [1e6, 100, 200])
+
+    def test_octree_nodes_grow_with_depth(self):
+        nodes = [octree_nodes(self.stats, depth) for depth in range(4, 12)]
+
+        self.assertTrue(numpy.all(numpy.diff(nodes) >= 0))
+        self.assertLess(
+            octree_nodes(self.stats, 10, samples_per_node=12), octree_nodes(self.stats, 10)
+        )
+
+    def test_choose_depth_within_budget(self):
+        unlimited = choose_depth(self.stats, DepthBudget(), self.model)
+        self.assertEqual(unlimited.depth, unlimited.useful_depth)
+
+        budget = DepthBudget(wall_time=self.model.predict(self.stats, unlimited.depth - 2)[0])
+        choice = choose_depth(self.stats, budget, self.model)
+
+        self.assertTrue(choice.within_budget)
+        self.assertLessEqual(choice.predicted_time, budget.wall_time)
+        self.assertLessEqual(choice.depth, unlimited.depth - 2)
+
+        impossible = choose_depth(self.stats, DepthBudget(peak_rss=1), self.model)
+        self.assertFalse(impossible.within_budget)
+        self.assertEqual(impossible.depth, DepthBudget().min_depth)
+
+        self.assertRaises(ValueError, DepthBudget, min_depth=9, max_depth=8)
+        self.assertRaises(
+            ValueError, choose_depth, self.stats, DepthBudget(), self.model, samples_per_node=()
+        )
+
+    def test_cost_options(self):
+        # The complete levels of a shallow reconstruction stay below its depth, as in choose_depth()
+        self.assertEqual(cost_options({'depth': 5, 'fulldepth': 5})['full_depth'], 3)
+        self.assertEqual(
+            cost_options({'depth': 10, 'scale': 1.2, 'samplespernode': 4, 'fulldepth': 6}),
+            dict(depth=10, scale=1.2, samples_per_node=4, full_depth=6)
+        )
+        self.assertEqual(
+            cost_options({}, depth=9), dict(depth=9, scale=1.1, samples_per_node=1.5, full_depth=5)
+        )
+
+    def test_fit_recovers_coefficients(self):
+        features = numpy.array(
+            [
+                CostModel.features(self.stats.resampled(points), depth)
+                for points in (1000, 5000, 20000)
+                for depth in (5, 7, 9)
+            ]
+        )
+        model = CostModel.fit(
+            features,
+            features @ self.model.time_coefficients,
+            features @ self.model.memory_coefficients
+        )
+
+        numpy.testing.assert_allclose(
+            model.time_coefficients, self.model.time_coefficients, rtol=1e-3
+        )
+        numpy.testing.assert_allclose(
+            model.memory_coefficients, self.model.memory_coefficients, rtol=1e-3
+        )
+
+    def test_open3d_auto_depth(self):
+        surface = Open3dSurface(point_cloud_file=self.point_cloud_file)
+        output = io.StringIO()
+
+        with contextlib.redirect_stdout(output):
+            surface.poisson_mesh(
+                save_file=False, filters={'auto_depth': {'wall_time': 1e6, 'max_depth': 7}}
+            )
+
+        self.assertEqual(surface.depth_choice.depth, 7)
+        self.assertGreater(surface.depth_choice.actual_time, 0)
+        self.assertGreater(surface.depth_choice.actual_rss, 0)
+
+        # The choice is only printed by a verbose strategy
+        self.assertNotIn(surface.depth_choice.summary(), output.getvalue())
+
+        surface = Open3dSurface(point_cloud_file=self.point_cloud_file)
+        surface.verbose = True
+
+        with contextlib.redirect_stdout(output):
+            surface.poisson_mesh(
+                save_file=False, filters={'auto_depth': {'wall_time': 1e6, 'max_depth': 7}}
+            )
+
+        self.assertIn(surface.depth_choice.summary(), output.getvalue())
+
+    def test_pymeshlab_auto_depth_parameters(self):
+        surface = PyMeshlabSurface(point_cloud_file=self.point_cloud_file)
+        surface.poisson_mesh(
+            save_file=False, filters={'auto_depth': {'min_depth': 5, 'max_depth': 8}}
+        )
+
+        choice = surface.depth_choice
+
+        self.assertIn(choice.samples_per_node, (1.5, 3, 6, 12))
+        self.assertLessEqual(choice.full_depth, choice.depth)
+        self.assertIsNotNone(choice.actual_time)
+
+    def test_auto_depth_run_only(self):
+        surface = Open3dSurface(point_cloud_file=self.point_cloud_file)
+        surface.poisson_mesh(
+            save_file=False, filters={'auto_depth': {'wall_time': 1e6, 'max_depth': 7}}
+        )
+        self.assertEqual(surface.depth_choice.depth, 7)
+
+        applied = {}
+        apply_filter = surface.apply_filter
+
+        def record_filter(name: str, params_key_values: dict):
+            applied[name] = dict(params_key_values)
+            apply_filter(name, params_key_values)
+
+        # A next run without the auto_depth stage is back to the default depth
+        surface.apply_filter = record_filter
+        surface.poisson_mesh(save_file=False, filters={'auto_depth': {}})
+
+        self.assertEqual(applied['surface_reconstruction_screened_poisson']['depth'], 8)
+        self.assertEqual(
+            surface.resolve_filters()['surface_reconstruction_screened_poisson']['depth'], 8
+        )
+
+    def test_fit_memory_policies(self):
+        budget = int(self.model.predict(self.stats.resampled(5000), 10)[1])
+
+        downsample = fit_memory(self.stats, 10, budget, self.model)
+        self.assertEqual(downsample.target_depth, 10)
+        self.assertLess(downsample.target_points, self.stats.points)
+        self.assertTrue(downsample.within_budget)
+        self.assertLessEqual(downsample.predicted_rss, budget)
+
+        depth = fit_memory(self.stats, 10, budget, self.model, policy='depth')
+        self.assertLess(depth.target_depth, 10)
+        self.assertTrue(depth.within_budget)
+
+        unchanged = fit_memory(self.stats, 6, 10 ** 12, self.model)
+        self.assertFalse(unchanged.reduced)
+
+        self.assertFalse(fit_memory(self.stats, 10, 1, self.model, min_points=100).within_budget)
+        self.assertRaises(
+            ValueError, fit_memory, self.stats, 10, budget, self.model, policy='unknown'
+        )
+
+    def test_open3d_memory_budget_downsample(self):
+        surface = Open3dSurface(point_cloud_file=self.point_cloud_file)
+        model = CostModel.load('open3d')
+
+        # The budget of a quarter of the points, above the current RSS
+        budget = memory_usage()[0] + int(
+            model.predict(self.stats.resampled(self.stats.points // 4), 9)[1]
+        )
+        surface.poisson_mesh(save_file=False, filters={
+            'surface_reconstruction_screened_poisson': {'depth': 9},
+            'memory_budget': {'peak_rss': budget}
+        })
+
+        decision = surface.memory_decision
+
+        self.assertEqual(decision.target_depth, 9)
+        self.assertLess(decision.target_points, self.stats.points)
+        self.assertGreater(decision.voxel_size, 0)
+        self.assertEqual(len(surface.point_cloud_arrays()), decision.target_points)
+        self.assertTrue(surface.point_cloud_arrays().normals is not None)
+        self.assertGreater(decision.actual_rss, 0)
+
+    def test_memory_budget_depth_run_only(self):
+        surface = Open3dSurface(point_cloud_file=self.point_cloud_file)
+        model = CostModel.load('open3d')
+
+        # The budget of all the points at depth 7, above the current RSS
+        budget = memory_usage()[0] + int(model.predict(self.stats, 7)[1])
+        surface.poisson_mesh(save_file=False, filters={
+            'surface_reconstruction_screened_poisson': {'depth': 9},
+            'memory_budget': {'peak_rss': budget, 'policy': 'depth'}
+        })
+
+        self.assertLess(surface.memory_decision.target_depth, 9)
+
+        # The lowered depth is used by this run only
+        self.assertEqual(
+            surface.resolve_filters()['surface_reconstruction_screened_poisson']['depth'], 9
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
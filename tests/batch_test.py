@@ -0,0 +1,73 @@
+from surface_reconstruction.batch import reconstruct_batch, output_files, main
+import unittest
+import tempfile
+import shutil
+import json
+import os
+
+
+class BatchTest(unittest.TestCase):
+
+    json_filters = '{"surface_reconstruction_screened_poisson": {"depth": 6}}'
+
+    def setUp(self):
+        self.files_folder = os.path.join('../files', 'simple_terrain')
+        self.temp_folder = tempfile.mkdtemp()
+
+        for name in ('first', 'second'):
+            os.makedirs(os.path.join(self.temp_folder, name))
+            shutil.copy(
+                os.path.join(self.files_folder, 'list_vertex.ply'),
+                os.path.join(self.temp_folder, name, 'list_vertex.ply')
+            )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def test_output_files_without_conflicts(self):
+        files = [
+            os.path.join(self.temp_folder, name, 'list_vertex.ply') for name in ('first', 'second')
+        ]
+        outputs = output_files(files, output_folder='out')
+
+        self.assertEqual(len(set(outputs)), 2)
+        self.assertEqual(os.path.basename(outputs[0]), 'first_list_vertex_mesh.ply')
+
+    def test_batch_continues_after_failure(self):
+        invalid_file = os.path.join(self.temp_folder, 'invalid.ply')
+        with open(invalid_file, 'w') as file:
+            file.write('not a point cloud')
+
+        results = reconstruct_batch(
+            [os.path.join(self.temp_folder, '*', '*.ply'), invalid_file],
+            method_type='open3d',
+            json_filters=self.json_filters,
+            workers=2
+        )
+
+        self.assertEqual([result.status for result in results], ['ok', 'ok', 'failed'])
+        self.assertTrue(all(os.path.exists(result.output_file) for result in results[:2]))
+        self.assertTrue(all(result.elapsed > 0 for result in results))
+
+    def test_batch_entry_point_report(self):
+        report_file = os.path.join(self.temp_folder, 'report.json')
+        output_folder = os.path.join(self.temp_folder, 'meshes')
+
+        exit_code = main([
+            os.path.join(self.temp_folder, '**', '*.ply'),
+            '--method-type', 'pymeshlab',
+            '--output-folder', output_folder,
+            '--workers', '2',
+            '--report', report_file
+        ])
+
+        with open(report_file) as file:
+            report = json.load(file)
+
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(len(report['results']), 2)
+        self.assertEqual(len(os.listdir(output_folder)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
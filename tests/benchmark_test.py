@@ -0,0 +1,84 @@
+from surface_reconstruction.benchmark import (
+    resample,
+    prepare_clouds,
+    benchmark_cases,
+    run_benchmark,
+    compare_results
+)
+from surface_reconstruction.benchmark import startup_benchmark, STARTUP_CASES
+from surface_reconstruction.point_cloud_io import read_point_cloud
+from dataclasses import asdict
+import unittest
+import tempfile
+import shutil
+import os
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'simple_terrain', 'list_vertex.ply')
+        self.temp_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def test_resample(self):
+        data = read_point_cloud(self.point_cloud_file)
+
+        downsampled = resample(data, 100)
+        upsampled = resample(data, 5000)
+
+        self.assertEqual(len(downsampled), 100)
+        self.assertEqual(len(upsampled), 5000)
+        self.assertEqual(upsampled.colors.shape, (5000, 3))
+        self.assertTrue((upsampled.points[:len(data)] == data.points).all())
+
+    def test_benchmark_cases_grid(self):
+        prepared = prepare_clouds([self.point_cloud_file], [1000], self.temp_folder)
+        cases = benchmark_cases(
+            prepared, ['open3d', 'pymeshlab'], {'depth': [5, 6], 'samplenum': [100, 200]}
+        )
+
+        self.assertEqual(len(prepared), 2)
+        # open3d ignores "samplenum": 2 clouds x 2 depths, pymeshlab: 2 clouds x 2 depths x 2
+        # samplenums
+        self.assertEqual(len(cases), 4 + 8)
+        self.assertEqual(cases[-1].filters()['point_cloud_simplification'], {'samplenum': 200})
+
+    def test_run_and_compare(self):
+        prepared = prepare_clouds([self.point_cloud_file], [], self.temp_folder)
+        cases = benchmark_cases(prepared, ['open3d'], {'depth': [5]})
+
+        results = [asdict(result) for result in run_benchmark(cases, verbose=False)]
+
+        self.assertEqual(results[0]['status'], 'ok')
+        self.assertGreater(results[0]['triangles'], 0)
+        self.assertGreater(results[0]['peak_rss'], 0)
+        self.assertGreater(results[0]['chamfer'], 0)
+        self.assertGreater(results[0]['within_tolerance'], 0)
+        self.assertEqual(compare_results(results, results), [])
+
+        slower = [dict(results[0], wall_time=results[0]['wall_time'] * 2)]
+        regressions = compare_results(slower, results)
+
+        self.assertEqual([regression['metric'] for regression in regressions], ['wall_time'])
+
+        worse = [dict(results[0], chamfer=results[0]['chamfer'] * 1.5)]
+        self.assertEqual(
+            [regression['metric'] for regression in compare_results(worse, results)], ['chamfer']
+        )
+
+    def test_startup_lazy_imports(self):
+        cases = {name: STARTUP_CASES[name] for name in ('import', 'cli_help', 'open3d')}
+        results = {result['name']: result for result in startup_benchmark(cases, repeat=1)}
+
+        # The package import doesn't load the libraries, only the first use of a strategy does
+        self.assertEqual(results['import']['modules'], [])
+        self.assertEqual(results['cli_help']['modules'], [])
+        self.assertEqual(results['open3d']['modules'], ['open3d'])
+        self.assertLess(results['import']['import_time'], results['open3d']['import_time'])
+
+
+if __name__ == '__main__':
+    unittest.main()
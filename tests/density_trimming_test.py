@@ -0,0 +1,63 @@
+from surface_reconstruction import Open3dSurface, PyMeshlabSurface
+import unittest
+import tempfile
+import shutil
+import os
+import numpy
+
+
+class DensityTrimmingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'simple_terrain', 'list_vertex.ply')
+        self.temp_folder = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.temp_folder, 'terrain.ply')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def reconstruct(self, surface_class, trimming: dict):
+        surface = surface_class(
+            point_cloud_file=self.point_cloud_file, output_file=self.output_file
+        )
+        surface.poisson_mesh(filters={
+            'surface_reconstruction_screened_poisson': {'depth': 6},
+            'density_trimming': trimming
+        })
+
+        return surface
+
+    def test_open3d_densities_kept(self):
+        surface = self.reconstruct(Open3dSurface, {'quantile': 0, 'threshold': 0})
+
+        self.assertIsInstance(surface.densities, numpy.ndarray)
+        self.assertEqual(len(surface.densities), len(surface.mesh.vertices))
+
+    def test_open3d_quantile_trimming(self):
+        untrimmed = self.reconstruct(Open3dSurface, {'quantile': 0, 'threshold': 0})
+        vertices = len(untrimmed.mesh.vertices)
+        threshold = numpy.quantile(untrimmed.densities, 0.1)
+
+        surface = self.reconstruct(Open3dSurface, {'quantile': 0.1, 'threshold': 0})
+
+        self.assertEqual(
+            len(surface.mesh.vertices), numpy.count_nonzero(untrimmed.densities >= threshold)
+        )
+        self.assertLess(len(surface.mesh.vertices), vertices)
+        self.assertEqual(len(surface.densities), len(surface.mesh.vertices))
+        self.assertGreaterEqual(surface.densities.min(), threshold)
+
+    def test_pymeshlab_threshold_trimming(self):
+        untrimmed = self.reconstruct(PyMeshlabSurface, {'quantile': 0, 'threshold': 0})
+        threshold = float(numpy.median(untrimmed.densities))
+
+        surface = self.reconstruct(PyMeshlabSurface, {'quantile': 0, 'threshold': threshold})
+        mesh = surface.mesh_set.current_mesh()
+
+        self.assertEqual(mesh.vertex_number(), len(surface.densities))
+        self.assertLess(mesh.vertex_number(), len(untrimmed.densities))
+        self.assertGreaterEqual(mesh.vertex_quality_array().min(), threshold)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+from surface_reconstruction import HeightfieldSurface, SurfaceReconstruction
+from surface_reconstruction.heightfield_surface import check_heightfield, rasterize_heightfield
+from surface_reconstruction.point_cloud_io import PointCloudData
+from surface_reconstruction.quality import compare
+import open3d as o3d
+import unittest
+import tempfile
+import shutil
+import time
+import os
+import numpy
+
+
+class HeightfieldTest(unittest.TestCase):
+
+    def setUp(self):
+        # A noisy 100 x 100 terrain with 20000 random samples, colored by height
+        rng = numpy.random.default_rng(0)
+        xy = rng.random((20000, 2)) * 100
+        heights = 3 * numpy.sin(xy[:, 0] / 10) * numpy.cos(xy[:, 1] / 15)
+        heights += rng.normal(0, 0.02, len(xy))
+
+        self.points = numpy.column_stack([xy, heights])
+        self.colors = numpy.repeat(
+            ((heights - heights.min()) / numpy.ptp(heights) * 255).astype(numpy.uint8)[:, None],
+            3,
+            axis=1
+        )
+        self.point_cloud_file = os.path.join('../files', 'simple_terrain', 'list_vertex.ply')
+        self.temp_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def test_check_heightfield(self):
+        self.assertTrue(check_heightfield(self.points, 2.0).is_heightfield)
+
+        # A second layer above half of the terrain
+        roof = self.points[self.points[:, 0] < 50] + [0, 0, 30]
+        check = check_heightfield(numpy.vstack([self.points, roof]), 2.0)
+
+        self.assertFalse(check.is_heightfield)
+        self.assertAlmostEqual(check.multilayer_fraction, 0.5, delta=0.05)
+
+    def test_rasterize_heightfield(self):
+        mesh = rasterize_heightfield(PointCloudData(self.points, self.colors), 4.0, fill_holes=0)
+
+        self.assertEqual(mesh.vertex_number, 625)
+        self.assertEqual(mesh.face_number, 2 * 24 * 24)
+        self.assertTrue((mesh.normals[:, 2] > 0).all())
+
+        # The colors of each vertex: the mean color of its cell
+        self.assertTrue((mesh.colors >= 0).all() and (mesh.colors <= 1).all())
+        self.assertGreater(numpy.corrcoef(mesh.colors[:, 0], mesh.vertices[:, 2])[0, 1], 0.99)
+
+        # A hole in the sampling is closed, without growing the borders
+        holed = self.points[numpy.linalg.norm(self.points[:, :2] - 50, axis=1) > 6]
+        self.assertLess(
+            rasterize_heightfield(PointCloudData(holed), 4.0, fill_holes=0).vertex_number, 625
+        )
+
+        filled = rasterize_heightfield(PointCloudData(holed), 4.0, fill_holes=2)
+        self.assertEqual(filled.vertex_number, 625)
+        self.assertEqual(filled.face_number, 2 * 24 * 24)
+
+    def test_strategy(self):
+        surface = HeightfieldSurface()
+
+        start = time.perf_counter()
+        mesh = surface.reconstruct_arrays(self.points, self.colors)
+        elapsed = time.perf_counter() - start
+
+        self.assertTrue(surface.heightfield_check.is_heightfield)
+        self.assertIsNotNone(mesh.colors)
+        self.assertLess(compare(self.points, mesh).chamfer, 0.5)
+        self.assertLess(elapsed, 5)
+        self.assertEqual(surface.profiler.report()['stages'][-1]['name'], 'heightfield')
+
+    def test_height_axis(self):
+        # The same terrain, with y up
+        surface = HeightfieldSurface()
+        mesh = surface.reconstruct_arrays(self.points[:, [0, 2, 1]])
+
+        self.assertTrue(surface.heightfield_check.is_heightfield)
+        self.assertTrue((mesh.normals[:, 1] > 0).all())
+
+    def test_fallback(self):
+        # A sphere is not a heightfield, so it is reconstructed by Poisson
+        rng = numpy.random.default_rng(0)
+        sphere = rng.normal(size=(5000, 3))
+        sphere /= numpy.linalg.norm(sphere, axis=1)[:, None]
+
+        surface = HeightfieldSurface()
+        mesh = surface.reconstruct_arrays(
+            sphere, filters={'surface_reconstruction_screened_poisson': {'depth': 5}}
+        )
+
+        self.assertFalse(surface.heightfield_check.is_heightfield)
+        self.assertGreater(mesh.face_number, 0)
+        self.assertIsNotNone(surface.densities)
+        self.assertLess(compare(sphere, mesh).hausdorff, 0.2)
+
+        self.assertRaises(
+            ValueError,
+            HeightfieldSurface().reconstruct_arrays,
+            sphere,
+            filters={'heightfield': {'fallback': ''}}
+        )
+
+    def test_method_type(self):
+        output_file = os.path.join(self.temp_folder, 'terrain.ply')
+
+        surface = SurfaceReconstruction(
+            method_type='heightfield',
+            point_cloud_file=self.point_cloud_file,
+            output_file=output_file
+        )
+        self.assertIsInstance(surface, HeightfieldSurface)
+
+        surface.poisson_mesh(filters={'simplify_mesh': {'reduction': 0.5}})
+
+        mesh = o3d.io.read_triangle_mesh(output_file)
+        self.assertTrue(mesh.has_vertex_colors())
+        self.assertEqual(len(mesh.triangles), surface.mesh_data().face_number)
+
+
+if __name__ == '__main__':
+    unittest.main()
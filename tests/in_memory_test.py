@@ -0,0 +1,77 @@
+from surface_reconstruction import Open3dSurface, PyMeshlabSurface, MeshData, ResultCache
+from surface_reconstruction.point_cloud_io import read_point_cloud
+import unittest
+import tempfile
+import shutil
+import os
+import numpy
+
+
+class InMemoryTest(unittest.TestCase):
+
+    filters = {'surface_reconstruction_screened_poisson': {'depth': 6}}
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'simple_terrain', 'list_vertex.ply')
+        self.data = read_point_cloud(self.point_cloud_file, use_cache=False)
+        self.temp_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def test_open3d_arrays_to_arrays(self):
+        surface = Open3dSurface()
+        mesh = surface.reconstruct_arrays(self.data.points, self.data.colors, filters=self.filters)
+
+        file_surface = Open3dSurface(point_cloud_file=self.point_cloud_file)
+        file_surface.poisson_mesh(save_file=False, filters=self.filters)
+
+        self.assertIsInstance(mesh, MeshData)
+        self.assertEqual(mesh.face_number, len(file_surface.mesh.triangles))
+        self.assertEqual(mesh.vertices.dtype, numpy.float64)
+        self.assertEqual(mesh.faces.shape[1], 3)
+        self.assertIsNotNone(mesh.colors)
+        self.assertIn('load_data', [stage.name for stage in surface.profiler.stages])
+
+    def test_pymeshlab_arrays_to_arrays(self):
+        surface = PyMeshlabSurface()
+        mesh = surface.reconstruct_arrays(
+            self.data.points.astype(numpy.float32), filters=self.filters
+        )
+
+        self.assertGreater(mesh.vertex_number, 0)
+        self.assertGreater(mesh.face_number, 0)
+        self.assertEqual(mesh.normals.shape, mesh.vertices.shape)
+
+    def test_pymeshlab_replaces_point_cloud(self):
+        surface = PyMeshlabSurface()
+        surface.load_arrays(self.data.points)
+
+        # Each point cloud replaces the previous layer of the mesh set
+        for _ in range(3):
+            surface.set_point_cloud_arrays(surface.point_cloud_arrays())
+
+        self.assertEqual(surface.mesh_set.number_meshes(), 1)
+        self.assertEqual(surface.point_cloud.vertex_number(), len(self.data.points))
+
+    def test_float_colors(self):
+        surface = Open3dSurface()
+        surface.load_arrays(self.data.points, self.data.colors / 255.0)
+
+        numpy.testing.assert_allclose(
+            numpy.asarray(surface.point_cloud.colors), self.data.colors / 255.0
+        )
+
+    def test_arrays_digest_for_result_cache(self):
+        surface = Open3dSurface()
+        surface.result_cache = ResultCache(os.path.join(self.temp_folder, 'cache'))
+
+        surface.reconstruct_arrays(self.data.points, filters=self.filters)
+        mesh = surface.reconstruct_arrays(self.data.points.copy(), filters=self.filters)
+
+        self.assertEqual(surface.result_cache.stats()['hits'], 1)
+        self.assertGreater(mesh.face_number, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+from surface_reconstruction.incremental import IncrementalReconstruction, reconstruct_incremental
+from surface_reconstruction.point_cloud_io import PointCloudData, read_point_cloud, write_ply
+import unittest
+import tempfile
+import shutil
+import os
+import numpy
+
+
+class IncrementalReconstructionTest(unittest.TestCase):
+
+    filters = {'surface_reconstruction_screened_poisson': {'depth': 6}}
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'complex_terrain', 'list_vertex.ply')
+        self.temp_folder = tempfile.mkdtemp()
+
+        # A survey pass over the corner x >= 6.5, y < 3 appended to the rest of the terrain
+        data = read_point_cloud(self.point_cloud_file)
+        appended = (data.points[:, 0] >= 6.5) & (data.points[:, 1] < 3.0)
+
+        self.first_pass = PointCloudData(
+            points=data.points[~appended], colors=data.colors[~appended]
+        )
+        self.second_pass = PointCloudData(
+            points=data.points[appended], colors=data.colors[appended]
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def test_update_touched_regions_only(self):
+        reconstruction = IncrementalReconstruction(2.0, 0.2, 'open3d', self.filters, workers=2)
+
+        with reconstruction:
+            first = reconstruction.update(self.first_pass)
+            pieces = dict(reconstruction.pieces)
+            pool = reconstruction._pool
+
+            second = reconstruction.update(self.second_pass)
+            mesh = reconstruction.mesh()
+
+            # The worker processes are kept for the next updates
+            self.assertIs(reconstruction._pool, pool)
+
+        self.assertIsNone(reconstruction._pool)
+
+        self.assertEqual(len(reconstruction), len(self.first_pass) + len(self.second_pass))
+        self.assertLess(len(second.regions), len(first.regions))
+        self.assertLess(second.region_points, len(reconstruction))
+        self.assertIn(f'{len(second.regions)} regions', second.summary())
+
+        # The pieces of the regions far from the new points are kept as they were
+        for region, piece in pieces.items():
+            if region not in second.regions:
+                self.assertIs(reconstruction.pieces[region], piece)
+
+        self.assertGreater(mesh.face_number, 0)
+        self.assertEqual(mesh.faces.max(), mesh.vertex_number - 1)
+        self.assertGreater(len(second.regions), 0)
+        self.assertGreater(mesh.vertices[:, 0].max(), 7.5)
+
+    def test_touched_regions_margin(self):
+        reconstruction = IncrementalReconstruction(2.0, 0.2)
+        reconstruction.add_points(
+            PointCloudData(points=numpy.mgrid[0:9:1.0, 0:9:1.0, 0:1].reshape(3, -1).T)
+        )
+
+        self.assertEqual(reconstruction.touched_regions(numpy.array([[3.0, 3.0, 0.0]])), [(1, 1)])
+        self.assertEqual(
+            reconstruction.touched_regions(numpy.array([[3.9, 3.0, 0.0]])), [(1, 1), (2, 1)]
+        )
+        self.assertEqual(len(reconstruction.touched_regions(numpy.array([[4.1, 3.9, 0.0]]))), 4)
+
+    def test_saved_state(self):
+        state_folder = os.path.join(self.temp_folder, 'state')
+        first_file = os.path.join(self.temp_folder, 'first.ply')
+        second_file = os.path.join(self.temp_folder, 'second.ply')
+        output_file = os.path.join(self.temp_folder, 'terrain.ply')
+
+        write_ply(first_file, self.first_pass)
+        write_ply(second_file, self.second_pass)
+
+        self.assertRaises(ValueError, reconstruct_incremental, first_file, state_folder)
+
+        reconstruct_incremental(
+            first_file, state_folder, tile_size=2.0, method_type='open3d', json_filters=self.filters
+        )
+        mesh = reconstruct_incremental(second_file, state_folder, output_file)
+
+        reconstruction = IncrementalReconstruction.load(state_folder)
+
+        self.assertTrue(os.path.exists(output_file))
+        self.assertEqual(len(reconstruction), len(self.first_pass) + len(self.second_pass))
+        self.assertEqual(reconstruction.method_type, 'open3d')
+        self.assertEqual(reconstruction.mesh().face_number, mesh.face_number)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+from surface_reconstruction import Open3dSurface, PyMeshlabSurface
+from surface_reconstruction.result_cache import ResultCache
+import unittest
+import tempfile
+import shutil
+import os
+import open3d as o3d
+
+
+class LodTest(unittest.TestCase):
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'complex_terrain', 'list_vertex.ply')
+        self.temp_folder = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.temp_folder, 'terrain.ply')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def stage_count(self, surface, name: str) -> int:
+        return len([stage for stage in surface.profiler.stages if stage.name == name])
+
+    def test_open3d_levels_share_normals(self):
+        surface = Open3dSurface(
+            point_cloud_file=self.point_cloud_file, output_file=self.output_file
+        )
+        levels = []
+
+        files = surface.poisson_lod(
+            depths=(7, 5, 6), on_level=lambda depth, file_path: levels.append(depth)
+        )
+
+        self.assertEqual(levels, [5, 6, 7])
+        self.assertEqual(
+            [os.path.basename(file_path) for file_path in files],
+            ['terrain_depth5.ply', 'terrain_depth6.ply', 'terrain_depth7.ply']
+        )
+        self.assertEqual(self.stage_count(surface, 'estimate_normals'), 1)
+        self.assertEqual(self.stage_count(surface, 'orient_normals_consistent_tangent_plane'), 1)
+        self.assertEqual(self.stage_count(surface, 'surface_reconstruction_screened_poisson'), 3)
+
+        triangles = [len(o3d.io.read_triangle_mesh(file_path).triangles) for file_path in files]
+        self.assertLess(triangles[0], triangles[-1])
+
+        # The configured depth is restored
+        self.assertEqual(
+            surface.resolve_filters()['surface_reconstruction_screened_poisson']['depth'], 8
+        )
+
+    def test_open3d_levels_stage_cache(self):
+        point_cloud_file = os.path.join('../files', 'simple_terrain', 'list_vertex.ply')
+        cache = ResultCache(os.path.join(self.temp_folder, 'stages'))
+
+        surface = Open3dSurface(point_cloud_file=point_cloud_file, output_file=self.output_file)
+        surface.stage_cache = cache
+        triangles = len(surface.poisson_mesh(save_file=False).triangles)
+
+        # The levels are stored under the keys of their own depth, not of the default depth
+        surface.reset(point_cloud_file)
+        surface.poisson_lod(depths=(4,), filters={'memory_budget': {'peak_rss': 1}})
+
+        self.assertEqual(self.stage_count(surface, 'memory_budget'), 0)
+        self.assertIsNone(surface.memory_decision)
+
+        surface = Open3dSurface(point_cloud_file=point_cloud_file, output_file=self.output_file)
+        surface.stage_cache = cache
+
+        self.assertEqual(len(surface.poisson_mesh(save_file=False).triangles), triangles)
+        self.assertEqual(self.stage_count(surface, 'surface_reconstruction_screened_poisson'), 0)
+
+    def test_pymeshlab_levels(self):
+        surface = PyMeshlabSurface(
+            point_cloud_file=self.point_cloud_file, output_file=self.output_file
+        )
+
+        files = surface.poisson_lod(depths=(5, 7))
+
+        self.assertTrue(all(os.path.exists(file_path) for file_path in files))
+        self.assertEqual(self.stage_count(surface, 'compute_normals_for_point_sets'), 1)
+        self.assertEqual(self.stage_count(surface, 'surface_reconstruction_screened_poisson'), 2)
+        # The original point cloud, the simplified point cloud and the finest level
+        self.assertEqual(surface.mesh_set.number_meshes(), 3)
+        self.assertGreater(surface.mesh_set.current_mesh().face_number(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
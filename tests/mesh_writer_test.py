@@ -0,0 +1,147 @@
+from surface_reconstruction import Open3dSurface
+from surface_reconstruction.batch import reconstruct_batch
+from surface_reconstruction.mesh_data import MeshData
+from surface_reconstruction.mesh_writer import MeshWriter, COMPACT_ENCODING
+import open3d as o3d
+import unittest
+import tempfile
+import shutil
+import os
+import numpy
+
+
+class MeshWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'simple_terrain', 'list_vertex.ply')
+        self.temp_folder = tempfile.mkdtemp()
+
+        rng = numpy.random.default_rng(0)
+        self.mesh = MeshData(
+            vertices=rng.random((1000, 3)) * 100,
+            faces=rng.integers(0, 1000, (2000, 3)).astype(numpy.int32),
+            normals=rng.random((1000, 3)),
+            colors=rng.random((1000, 3))
+        )
+
+    def tearDown(self):
+        Open3dSurface.mesh_writer = None
+        Open3dSurface.mesh_encoding = None
+        shutil.rmtree(self.temp_folder)
+
+    def test_compact_encoding(self):
+        default_file = os.path.join(self.temp_folder, 'default.ply')
+        compact_file = os.path.join(self.temp_folder, 'compact.ply')
+
+        self.mesh.write_ply(default_file)
+        self.mesh.write_ply(compact_file, normals=False, **COMPACT_ENCODING)
+
+        with open(compact_file, 'rb') as file:
+            header = file.read(400).split(b'end_header')[0].decode('ascii')
+
+        self.assertIn('property float x', header)
+        self.assertIn('property list uchar ushort vertex_indices', header)
+        self.assertNotIn('nx', header)
+
+        # Vertices: 3 float32 + 3 uchar, faces: 1 uchar + 3 uint16
+        self.assertEqual(
+            os.path.getsize(compact_file) - len(header) - len('end_header\n'), 1000 * 15 + 2000 * 7
+        )
+        self.assertLess(os.path.getsize(compact_file), os.path.getsize(default_file) / 2)
+
+        mesh = o3d.io.read_triangle_mesh(compact_file)
+        numpy.testing.assert_array_equal(numpy.asarray(mesh.triangles), self.mesh.faces)
+        numpy.testing.assert_allclose(numpy.asarray(mesh.vertices), self.mesh.vertices, rtol=1e-6)
+
+    def test_index_types(self):
+        file_path = os.path.join(self.temp_folder, 'mesh.ply')
+        large = MeshData(numpy.zeros((70000, 3)), numpy.array([[0, 1, 69999]], dtype=numpy.int32))
+
+        large.write_ply(file_path, index_type='auto')
+        self.assertEqual(numpy.asarray(o3d.io.read_triangle_mesh(file_path).triangles).max(), 69999)
+
+        self.assertRaises(ValueError, large.write_ply, file_path, index_type='uint16')
+        self.assertRaises(ValueError, large.write_ply, file_path, index_type='uint8')
+
+    def test_background_writer(self):
+        files = [os.path.join(self.temp_folder, f'mesh_{index}.ply') for index in range(3)]
+
+        with MeshWriter(max_pending=1, float32=True) as writer:
+            futures = [writer.submit(self.mesh, file_path) for file_path in files]
+            failed = writer.submit(self.mesh, os.path.join(self.temp_folder, 'missing', 'mesh.ply'))
+
+            writer.flush()
+
+            self.assertEqual([future.result() for future in futures], files)
+            self.assertIsInstance(failed.exception(), OSError)
+            self.assertEqual(writer.written, 3)
+            self.assertEqual(len(writer.errors), 1)
+
+        self.assertFalse(any(name.endswith('.part') for name in os.listdir(self.temp_folder)))
+        self.assertRaises(RuntimeError, writer.submit, self.mesh, files[0])
+
+    def test_strategy_background_write(self):
+        output_file = os.path.join(self.temp_folder, 'terrain.ply')
+
+        Open3dSurface.mesh_writer = MeshWriter()
+        Open3dSurface.mesh_encoding = COMPACT_ENCODING
+
+        surface = Open3dSurface(point_cloud_file=self.point_cloud_file, output_file=output_file)
+        surface.poisson_mesh(filters={'surface_reconstruction_screened_poisson': {'depth': 6}})
+
+        self.assertEqual(surface.pending_write.result(), output_file)
+        self.assertEqual(
+            len(o3d.io.read_triangle_mesh(output_file).triangles), surface.mesh_data().face_number
+        )
+
+        Open3dSurface.mesh_writer.close()
+
+    def test_batch_background_write(self):
+        results = reconstruct_batch(
+            [self.point_cloud_file],
+            method_type='open3d',
+            json_filters='{"surface_reconstruction_screened_poisson": {"depth": 6}}',
+            output_folder=self.temp_folder,
+            workers=1,
+            background_write=True,
+            encoding=COMPACT_ENCODING
+        )
+
+        self.assertTrue(results[0].ok, results[0].error)
+        self.assertGreater(len(o3d.io.read_triangle_mesh(results[0].output_file).triangles), 0)
+
+    def test_batch_background_write_failure(self):
+        files = []
+        for name in ('first', 'second'):
+            os.makedirs(os.path.join(self.temp_folder, name))
+            files.append(
+                shutil.copy(
+                    self.point_cloud_file, os.path.join(self.temp_folder, name, 'list_vertex.ply')
+                )
+            )
+
+        # A folder in place of the first mesh file: reconstructed, but its mesh can't be written
+        output_folder = os.path.join(self.temp_folder, 'meshes')
+        os.makedirs(os.path.join(output_folder, 'first_list_vertex_mesh.ply'))
+
+        reported = []
+        results = reconstruct_batch(
+            files,
+            method_type='open3d',
+            json_filters='{"surface_reconstruction_screened_poisson": {"depth": 6}}',
+            output_folder=output_folder,
+            workers=1,
+            on_result=lambda result: reported.append((result.output_file, result.status)),
+            background_write=True
+        )
+
+        self.assertEqual([result.status for result in results], ['failed', 'ok'])
+        self.assertIn('was not written', results[0].error)
+        # Reported as failed by its own job, or again by the next job of the worker
+        statuses = [status for file_path, status in reported if file_path == results[0].output_file]
+        self.assertEqual(statuses[-1], 'failed')
+        self.assertGreater(len(o3d.io.read_triangle_mesh(results[1].output_file).triangles), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
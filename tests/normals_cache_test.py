@@ -0,0 +1,81 @@
+from surface_reconstruction import Open3dSurface, PyMeshlabSurface
+from surface_reconstruction.point_cloud_io import PointCloudData, read_point_cloud, write_ply
+from surface_reconstruction.result_cache import ResultCache
+import unittest
+import tempfile
+import shutil
+import os
+import numpy
+
+
+class NormalsCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'simple_terrain', 'list_vertex.ply')
+        self.temp_folder = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.temp_folder, 'terrain.ply')
+        self.cache = ResultCache(os.path.join(self.temp_folder, 'normals'))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def stage_names(self, surface) -> list:
+        return [stage.name for stage in surface.profiler.stages]
+
+    def test_open3d_depth_change_reuses_normals(self):
+        surface = Open3dSurface(
+            point_cloud_file=self.point_cloud_file, output_file=self.output_file
+        )
+        surface.normals_cache = self.cache
+
+        surface.poisson_mesh(filters={'surface_reconstruction_screened_poisson': {'depth': 6}})
+        normals = surface.point_cloud_arrays().normals.copy()
+
+        self.assertIn('orient_normals_consistent_tangent_plane', self.stage_names(surface))
+        self.assertEqual(self.cache.stats()['entries'], 1)
+
+        surface.reset(self.point_cloud_file)
+        mesh = surface.poisson_mesh(
+            filters={'surface_reconstruction_screened_poisson': {'depth': 7}}
+        )
+
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertIn('load_cached_normals', self.stage_names(surface))
+        self.assertNotIn('estimate_normals', self.stage_names(surface))
+        numpy.testing.assert_allclose(surface.point_cloud_arrays().normals, normals)
+        self.assertGreater(len(mesh.triangles), 0)
+
+    def test_normals_key_ignores_poisson_parameters(self):
+        surface = Open3dSurface(point_cloud_file=self.point_cloud_file)
+        filters = surface.resolve_filters()
+
+        key = surface.normals_key(filters)
+        other_filters = dict(filters, surface_reconstruction_screened_poisson={'depth': 10})
+        other_k = dict(filters, orient_normals_consistent_tangent_plane={'k': 20})
+
+        self.assertEqual(key, surface.normals_key(other_filters))
+        self.assertNotEqual(key, surface.normals_key(other_k))
+
+    def test_pymeshlab_reuses_simplified_cloud(self):
+        # Without colors, so old pymeshlab versions can inject the cached point cloud
+        data = read_point_cloud(self.point_cloud_file)
+        point_cloud_file = os.path.join(self.temp_folder, 'points.ply')
+        write_ply(point_cloud_file, PointCloudData(points=numpy.array(data.points)))
+
+        surface = PyMeshlabSurface(point_cloud_file=point_cloud_file, output_file=self.output_file)
+        surface.normals_cache = self.cache
+        surface.poisson_mesh(filters={'surface_reconstruction_screened_poisson': {'depth': 6}})
+
+        surface.reset(point_cloud_file)
+        mesh = surface.poisson_mesh(
+            filters={'surface_reconstruction_screened_poisson': {'depth': 7}}
+        )
+
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertNotIn('compute_normals_for_point_sets', self.stage_names(surface))
+        self.assertNotIn('point_cloud_simplification', self.stage_names(surface))
+        self.assertGreater(mesh.face_number(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+from surface_reconstruction import Open3dSurface, PyMeshlabSurface
+from surface_reconstruction.normals import orient_normals
+import unittest
+import os
+import numpy
+
+
+class NormalsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'simple_terrain', 'list_vertex.ply')
+        rng = numpy.random.default_rng(0)
+
+        # A terrain profile rising to an almost vertical cliff (88 degrees), extruded along y,
+        # with noisy normals of random signs
+        angles = numpy.radians(
+            numpy.concatenate([numpy.zeros(40), numpy.linspace(0, 88, 60), numpy.full(30, 88)])
+        )
+        step = 0.25
+        profile = numpy.cumsum(
+            numpy.column_stack([numpy.cos(angles), numpy.sin(angles)]) * step, axis=0
+        )
+
+        x, y = numpy.meshgrid(profile[:, 0], numpy.arange(0, 10, step))
+        z, _ = numpy.meshgrid(profile[:, 1], numpy.arange(0, 10, step))
+        self.points = numpy.column_stack([x.ravel(), y.ravel(), z.ravel()])
+
+        true_normals = numpy.column_stack(
+            [-numpy.sin(angles), numpy.zeros(len(angles)), numpy.cos(angles)]
+        )
+        self.true_normals = numpy.tile(true_normals, (len(numpy.arange(0, 10, step)), 1))
+
+        noisy = self.true_normals + rng.normal(0, 0.05, self.true_normals.shape)
+        noisy /= numpy.linalg.norm(noisy, axis=1)[:, None]
+        self.normals = noisy * rng.choice([-1, 1], size=(len(noisy), 1))
+
+    def wrong(self, normals) -> int:
+        return int(numpy.count_nonzero(numpy.einsum('ij,ij->i', normals, self.true_normals) < 0))
+
+    def test_hybrid_fixes_ambiguous_normals(self):
+        up, counts = orient_normals(self.points, self.normals, mode='up')
+        hybrid, hybrid_counts = orient_normals(
+            self.points, self.normals, mode='hybrid', ambiguity=0.3
+        )
+
+        # The noise flips the z sign of some cliff normals: the up rule alone gets them wrong
+        self.assertGreater(self.wrong(up), 0)
+        self.assertEqual(self.wrong(hybrid), 0)
+        self.assertGreater(hybrid_counts['ambiguous'], 0)
+        self.assertEqual(hybrid_counts['propagated'], hybrid_counts['ambiguous'])
+        self.assertEqual(counts['flipped'], numpy.count_nonzero(self.normals[:, 2] < 0))
+
+    def test_viewpoint(self):
+        # Points of a sphere seen from its center: all the normals point inward
+        rng = numpy.random.default_rng(1)
+        points = rng.normal(size=(500, 3))
+        points /= numpy.linalg.norm(points, axis=1)[:, None]
+        normals = points * rng.choice([-1, 1], size=(500, 1))
+
+        oriented, _ = orient_normals(points + 5, normals, mode='viewpoint', viewpoint=[5, 5, 5])
+
+        numpy.testing.assert_allclose(oriented, -points)
+        self.assertRaises(ValueError, orient_normals, points, normals, mode='viewpoint')
+        self.assertRaises(ValueError, orient_normals, points, normals, mode='unknown')
+
+    def test_strategies_filters(self):
+        filters = {
+            'orient_normals': {'mode': 'hybrid'},
+            'surface_reconstruction_screened_poisson': {'depth': 6}
+        }
+
+        surface = Open3dSurface(point_cloud_file=self.point_cloud_file)
+        mesh = surface.poisson_mesh(save_file=False, filters=filters)
+        stages = [stage.name for stage in surface.profiler.stages]
+
+        # The fast orientation replaces the tangent plane propagation
+        self.assertIn('orient_normals', stages)
+        self.assertNotIn('orient_normals_consistent_tangent_plane', stages)
+        self.assertGreater(len(mesh.triangles), 0)
+        self.assertGreater(numpy.mean(surface.point_cloud_arrays().normals[:, 2] >= 0), 0.9)
+
+        surface = PyMeshlabSurface(point_cloud_file=self.point_cloud_file)
+        mesh = surface.poisson_mesh(
+            save_file=False, filters=dict(filters, orient_normals={'mode': 'up'})
+        )
+
+        self.assertIn('orient_normals', [stage.name for stage in surface.profiler.stages])
+        self.assertGreater(mesh.face_number(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
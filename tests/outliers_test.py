@@ -0,0 +1,72 @@
+from surface_reconstruction import Open3dSurface, PyMeshlabSurface
+from surface_reconstruction.outliers import statistical_mask, radius_mask
+import open3d as o3d
+import unittest
+import numpy
+
+
+class OutliersTest(unittest.TestCase):
+
+    def setUp(self):
+        # A noisy 40 x 40 terrain grid with 20 isolated returns above it
+        rng = numpy.random.default_rng(0)
+        x, y = numpy.meshgrid(
+            numpy.arange(40, dtype=numpy.float64), numpy.arange(40, dtype=numpy.float64)
+        )
+        terrain = numpy.column_stack(
+            [x.ravel(), y.ravel(), numpy.sin(x.ravel() / 8) * 3 + rng.normal(0, 0.05, x.size)]
+        )
+        outliers = numpy.column_stack([rng.random((20, 2)) * 40, 20 + rng.random(20) * 30])
+
+        self.points = numpy.vstack([terrain, outliers])
+        self.outliers = numpy.arange(len(terrain), len(self.points))
+
+    def test_statistical_mask_matches_open3d(self):
+        mask = statistical_mask(self.points, nb_neighbors=20, std_ratio=2.0, batch_size=100)
+
+        point_cloud = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(self.points))
+        _, kept = point_cloud.remove_statistical_outlier(nb_neighbors=20, std_ratio=2.0)
+        expected = numpy.zeros(len(self.points), dtype=bool)
+        expected[kept] = True
+
+        numpy.testing.assert_array_equal(mask, expected)
+        self.assertFalse(mask[self.outliers].any())
+
+    def test_radius_mask_matches_open3d(self):
+        mask = radius_mask(self.points, radius=2.5, nb_points=6)
+
+        point_cloud = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(self.points))
+        _, kept = point_cloud.remove_radius_outlier(nb_points=6, radius=2.5)
+
+        self.assertEqual(numpy.count_nonzero(mask), len(kept))
+        self.assertEqual(numpy.count_nonzero(mask), len(self.points) - len(self.outliers))
+
+    def test_strategies_filters(self):
+        filters = {
+            'outlier_removal': {'mode': 'radius', 'nb_points': 6},
+            # Deep enough for the 5 complete levels: at depth 6 they are clamped to 4, and the
+            # smaller bounding box of the terrain alone predicts more leaf nodes than the outliers
+            # add
+            'surface_reconstruction_screened_poisson': {'depth': 7}
+        }
+
+        for surface_type in (Open3dSurface, PyMeshlabSurface):
+            surface = surface_type()
+            surface.reconstruct_arrays(self.points, filters=filters)
+            report = surface.outlier_report
+
+            self.assertEqual(report.removed, len(self.outliers), surface_type.__name__)
+            self.assertGreater(report.predicted_time_saved, 0, surface_type.__name__)
+            self.assertIsNotNone(report.poisson_time, surface_type.__name__)
+            self.assertIn('outlier_removal', [stage.name for stage in surface.profiler.stages])
+
+        self.assertRaises(
+            ValueError,
+            Open3dSurface().reconstruct_arrays,
+            self.points,
+            filters={'outlier_removal': {'mode': 'unknown'}}
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+from surface_reconstruction.point_cloud_io import (
+    PointCloudData,
+    read_point_cloud,
+    parse_ply,
+    file_digest,
+    sidecar_path
+)
+import unittest
+import tempfile
+import shutil
+import os
+import numpy
+import open3d as o3d
+
+
+class PointCloudIOTest(unittest.TestCase):
+
+    def setUp(self):
+        self.files_folder = os.path.join('../files', 'complex_terrain')
+        self.temp_folder = tempfile.mkdtemp()
+        self.point_cloud_file = os.path.join(self.temp_folder, 'list_vertex.ply')
+
+        shutil.copy(os.path.join(self.files_folder, 'list_vertex.ply'), self.point_cloud_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def test_parse_ascii_ply(self):
+        data = parse_ply(self.point_cloud_file)
+        expected = o3d.io.read_point_cloud(self.point_cloud_file)
+
+        self.assertEqual(len(data), 51477)
+        numpy.testing.assert_allclose(data.points, numpy.asarray(expected.points), rtol=1e-6)
+        numpy.testing.assert_allclose(
+            data.normalized_colors(), numpy.asarray(expected.colors), atol=1e-6
+        )
+        self.assertIsNone(data.normals)
+
+    def test_parse_binary_ply(self):
+        expected = o3d.io.read_point_cloud(self.point_cloud_file)
+        binary_file = os.path.join(self.temp_folder, 'binary.ply')
+        o3d.io.write_point_cloud(binary_file, expected, write_ascii=False)
+
+        data = parse_ply(binary_file)
+
+        self.assertEqual(len(data), len(expected.points))
+        numpy.testing.assert_allclose(data.points, numpy.asarray(expected.points))
+
+    def test_sidecar_cache_reload(self):
+        data = read_point_cloud(self.point_cloud_file)
+
+        self.assertTrue(os.path.isdir(sidecar_path(self.point_cloud_file)))
+        self.assertIsInstance(data.points, numpy.memmap)
+
+        reloaded = read_point_cloud(self.point_cloud_file)
+
+        self.assertIsInstance(reloaded, PointCloudData)
+        self.assertEqual(data.digest, reloaded.digest)
+        self.assertEqual(file_digest(self.point_cloud_file), data.digest)
+        numpy.testing.assert_array_equal(data.points, reloaded.points)
+
+    def test_sidecar_cache_invalidation(self):
+        data = read_point_cloud(self.point_cloud_file)
+
+        with open(self.point_cloud_file, 'rb') as file:
+            lines = file.read().rstrip().split(b'\n')
+
+        # Remove the last vertex, updating the header count
+        lines = [line.replace(b'element vertex 51477', b'element vertex 51476') for line in lines]
+        with open(self.point_cloud_file, 'wb') as file:
+            file.write(b'\n'.join(lines[:-1]))
+
+        changed = read_point_cloud(self.point_cloud_file)
+
+        self.assertEqual(len(changed), len(data) - 1)
+        self.assertNotEqual(changed.digest, data.digest)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+from surface_reconstruction import Open3dSurface, PyMeshlabSurface
+from surface_reconstruction.profiling import StageProfiler
+import unittest
+import json
+import os
+import numpy
+
+
+class ProfilingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.files_folder = os.path.join('../files', 'simple_terrain')
+        self.point_cloud_file = os.path.join(self.files_folder, 'list_vertex.ply')
+
+    def test_stage_metrics(self):
+        profiler = StageProfiler(trace_python_memory=True)
+
+        with profiler.stage('allocate', lambda: {'points': 10}) as metrics:
+            array = numpy.ones((1000, 1000))
+
+        self.assertEqual(metrics.name, 'allocate')
+        self.assertGreater(metrics.wall_time, 0)
+        self.assertGreaterEqual(metrics.python_memory_peak, array.nbytes)
+        self.assertEqual(metrics.output_sizes, {'points': 10})
+
+    def test_open3d_stages_report(self):
+        surface = Open3dSurface(point_cloud_file=self.point_cloud_file)
+        surface.poisson_mesh(save_file=False, filters={
+            'surface_reconstruction_screened_poisson': {'depth': 6}
+        })
+
+        report = surface.profiler.report()
+        names = [stage['name'] for stage in report['stages']]
+
+        self.assertEqual(names, [
+            'load_file',
+            'estimate_normals',
+            'orient_normals_consistent_tangent_plane',
+            'surface_reconstruction_screened_poisson'
+        ])
+        self.assertEqual(report['stages'][0]['output_sizes']['points'], 506)
+        self.assertGreater(report['stages'][-1]['output_sizes']['triangles'], 0)
+        self.assertIsInstance(json.dumps(report), str)
+        self.assertIn('surface_reconstruction_screened_poisson', surface.profiler.format_report())
+
+    def test_pymeshlab_stages_report(self):
+        surface = PyMeshlabSurface(point_cloud_file=self.point_cloud_file)
+        surface.poisson_mesh(save_file=False)
+
+        stages = surface.profiler.report()['stages']
+
+        self.assertEqual(len(stages), 4)
+        self.assertEqual(stages[1]['name'], 'point_cloud_simplification')
+        self.assertGreater(stages[-1]['output_sizes']['triangles'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
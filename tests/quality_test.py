@@ -0,0 +1,80 @@
+from surface_reconstruction import Open3dSurface, PyMeshlabSurface
+from surface_reconstruction.mesh_data import MeshData
+from surface_reconstruction.point_cloud_io import read_point_cloud
+from surface_reconstruction.quality import compare, sample_surface
+import unittest
+import os
+import numpy
+
+
+class QualityTest(unittest.TestCase):
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'simple_terrain', 'list_vertex.ply')
+
+        # A 10 x 10 square in the z=0 plane
+        self.square = MeshData(
+            vertices=numpy.array(
+                [[0, 0, 0], [10, 0, 0], [10, 10, 0], [0, 10, 0]], dtype=numpy.float64
+            ),
+            faces=numpy.array([[0, 1, 2], [0, 2, 3]], dtype=numpy.int32)
+        )
+
+        rng = numpy.random.default_rng(0)
+        self.points = numpy.column_stack([rng.random((2000, 2)) * 10, numpy.zeros(2000)])
+
+    def test_sample_surface(self):
+        samples, normals = sample_surface(self.square, 1000)
+
+        self.assertEqual(samples.shape, (1004, 3))
+        self.assertTrue((samples[:, :2] >= 0).all() and (samples[:, :2] <= 10).all())
+        numpy.testing.assert_allclose(samples[:, 2], 0)
+        numpy.testing.assert_allclose(numpy.abs(normals[:, 2]), 1)
+
+        # Both triangles have the same area: about half of the samples each
+        self.assertAlmostEqual(numpy.mean(samples[4:, 0] > samples[4:, 1]), 0.5, delta=0.05)
+
+    def test_metrics(self):
+        outlier = numpy.vstack([self.points, [[5, 5, 2]]])
+        normals = numpy.tile([0.0, 0.0, 1.0], (len(outlier), 1))
+        normals[0] = [1, 0, 0]
+
+        metrics = compare(outlier, self.square, normals, tolerance=0.5, samples=20000)
+
+        self.assertEqual(metrics.points, 2001)
+        self.assertAlmostEqual(metrics.hausdorff_points, 2, delta=0.1)
+        self.assertEqual(metrics.hausdorff, metrics.hausdorff_points)
+        self.assertLess(metrics.hausdorff_mesh, 1)
+        self.assertLess(metrics.chamfer, 0.5)
+        self.assertAlmostEqual(metrics.within_tolerance, 2000 / 2001)
+        self.assertAlmostEqual(metrics.normal_consistency, 2000 / 2001)
+
+        # A shifted mesh is further from the points
+        shifted = MeshData(self.square.vertices + [0, 0, 1], self.square.faces)
+        self.assertGreater(compare(self.points, shifted).chamfer, metrics.chamfer + 1.5)
+        self.assertIsNone(compare(self.points, shifted).normal_consistency)
+
+        self.assertRaises(
+            ValueError,
+            compare,
+            self.points,
+            MeshData(self.square.vertices, numpy.zeros((0, 3), dtype=numpy.int32))
+        )
+
+    def test_strategies(self):
+        data = read_point_cloud(self.point_cloud_file)
+
+        for surface_type in (Open3dSurface, PyMeshlabSurface):
+            surface = surface_type(point_cloud_file=self.point_cloud_file)
+            surface.poisson_mesh(
+                save_file=False, filters={'surface_reconstruction_screened_poisson': {'depth': 6}}
+            )
+
+            metrics = compare(data.points, surface.mesh_data(), data.normals)
+
+            self.assertGreater(metrics.within_tolerance, 0, surface_type.__name__)
+            self.assertLess(metrics.chamfer, metrics.hausdorff, surface_type.__name__)
+
+
+if __name__ == '__main__':
+    unittest.main()
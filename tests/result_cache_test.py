@@ -0,0 +1,110 @@
+from surface_reconstruction import Open3dSurface
+from surface_reconstruction.mesh_writer import COMPACT_ENCODING
+from surface_reconstruction.result_cache import ResultCache
+import unittest
+import tempfile
+import shutil
+import os
+import open3d as o3d
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    parameters = {
+        'filters': {
+            'surface_reconstruction_screened_poisson': {
+                'depth': 6
+            }
+        }
+    }
+
+    def setUp(self):
+        self.files_folder = os.path.join('../files', 'simple_terrain')
+        self.point_cloud_file = os.path.join(self.files_folder, 'list_vertex.ply')
+        self.temp_folder = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.temp_folder, 'terrain.ply')
+        self.cache = ResultCache(os.path.join(self.temp_folder, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def create_entry(self, name: str, size: int) -> str:
+        file_path = os.path.join(self.temp_folder, name)
+        with open(file_path, 'wb') as file:
+            file.write(b'0' * size)
+
+        return self.cache.put(ResultCache.key(name=name), file_path)
+
+    def test_lru_eviction(self):
+        self.cache.max_size = 250
+
+        first = self.create_entry('first.ply', 100)
+        second = self.create_entry('second.ply', 100)
+
+        # Use the first entry, so the second one is the least recently used
+        os.utime(second, ns=(1, 1))
+        self.assertIsNotNone(self.cache.get(ResultCache.key(name='first.ply')))
+
+        self.create_entry('third.ply', 100)
+
+        self.assertTrue(os.path.exists(first))
+        self.assertFalse(os.path.exists(second))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        self.assertLessEqual(self.cache.size(), 250)
+
+    def test_poisson_mesh_cache_hit(self):
+        surface = Open3dSurface(
+            point_cloud_file=self.point_cloud_file, output_file=self.output_file
+        )
+        surface.result_cache = self.cache
+
+        mesh = surface.poisson_mesh(**self.parameters)
+
+        self.assertEqual(self.cache.stats()['misses'], 1)
+        self.assertEqual(self.cache.stats()['entries'], 1)
+
+        os.remove(self.output_file)
+
+        cached_surface = Open3dSurface(
+            point_cloud_file=self.point_cloud_file, output_file=self.output_file
+        )
+        cached_surface.result_cache = self.cache
+        cached_mesh = cached_surface.poisson_mesh(**self.parameters)
+
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertFalse(cached_surface.normals_estimated)
+        self.assertTrue(os.path.exists(self.output_file))
+        self.assertIsInstance(cached_mesh, o3d.geometry.TriangleMesh)
+        self.assertEqual(len(cached_mesh.triangles), len(mesh.triangles))
+
+    def test_poisson_mesh_cache_key_filters(self):
+        surface = Open3dSurface(
+            point_cloud_file=self.point_cloud_file, output_file=self.output_file
+        )
+        key = surface.result_key(self.output_file, **self.parameters)
+
+        other_key = surface.result_key(self.output_file, filters={
+            'surface_reconstruction_screened_poisson': {'depth': 7}
+        })
+
+        self.assertIsNotNone(key)
+        self.assertNotEqual(key, other_key)
+
+    def test_poisson_mesh_cache_key_output(self):
+        def result_key(n_threads: int, mesh_encoding=None) -> str:
+            surface = Open3dSurface(
+                point_cloud_file=self.point_cloud_file, output_file=self.output_file
+            )
+            surface.mesh_encoding = mesh_encoding
+
+            return surface.result_key(self.output_file, filters={
+                'surface_reconstruction_screened_poisson': {'depth': 6, 'n_threads': n_threads}
+            })
+
+        # The thread count doesn't change the mesh, its encoding changes the file
+        self.assertEqual(result_key(1), result_key(4))
+        self.assertNotEqual(result_key(1), result_key(1, COMPACT_ENCODING))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+from surface_reconstruction import Open3dSurface, PyMeshlabSurface
+from surface_reconstruction.batch import reconstruct_batch
+from surface_reconstruction.scheduler import (
+    THREAD_ENVIRONMENT,
+    available_cores,
+    compare_policies,
+    core_budget,
+    limit_threads,
+    spawn_environment,
+    thread_plan
+)
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import unittest
+import tempfile
+import shutil
+import sys
+import os
+
+
+class SchedulerTest(unittest.TestCase):
+
+    json_filters = '{"surface_reconstruction_screened_poisson": {"depth": 6}}'
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'simple_terrain', 'list_vertex.ply')
+        self.temp_folder = tempfile.mkdtemp()
+
+        self.files = []
+        for name in ('first', 'second'):
+            os.makedirs(os.path.join(self.temp_folder, name))
+            self.files.append(
+                shutil.copy(
+                    self.point_cloud_file, os.path.join(self.temp_folder, name, 'list_vertex.ply')
+                )
+            )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def test_thread_plan(self):
+        plans = {
+            policy: thread_plan(policy, cores=8)
+            for policy in ('narrow', 'balanced', 'wide', 4, '2')
+        }
+
+        self.assertEqual(
+            [(plan.workers, plan.threads) for plan in plans.values()],
+            [(8, 1), (3, 2), (1, 8), (2, 4), (4, 2)]
+        )
+        self.assertTrue(all(plan.used_cores <= 8 for plan in plans.values()))
+
+        # The threads of a numeric policy are kept when the cores are not a multiple of them
+        self.assertEqual(
+            [(plan.workers, plan.threads) for plan in (thread_plan(3, 8), thread_plan('4', 6))],
+            [(2, 3), (1, 4)]
+        )
+        self.assertEqual(thread_plan(16, cores=8).threads, 8)
+
+        # The cores of the missing jobs are shared by the others
+        plan = thread_plan('narrow', cores=8, jobs=3)
+        self.assertEqual((plan.workers, plan.threads), (3, 2))
+        self.assertEqual(plan.summary(), 'Thread policy narrow: 3 workers x 2 threads of 8 cores')
+        self.assertEqual(thread_plan(3, cores=8, jobs=1).threads, 8)
+
+        self.assertEqual(thread_plan('wide').threads, available_cores())
+        self.assertEqual(core_budget(available_cores() + 8), available_cores())
+        self.assertRaises(ValueError, thread_plan, 'everything')
+
+    def test_thread_filters(self):
+        filters = {'surface_reconstruction_screened_poisson': {'depth': 6}}
+
+        self.assertEqual(
+            Open3dSurface().thread_filters(filters, 2)['surface_reconstruction_screened_poisson'],
+            {'depth': 6, 'n_threads': 2}
+        )
+        self.assertEqual(filters['surface_reconstruction_screened_poisson'], {'depth': 6})
+        self.assertEqual(PyMeshlabSurface().thread_filters(filters, 2), filters)
+
+    @unittest.skipUnless(
+        sys.platform.startswith('linux'), 'The OpenMP runtime of open3d is libgomp on Linux'
+    )
+    def test_limit_threads(self):
+        environment = {name: os.environ.get(name) for name in THREAD_ENVIRONMENT}
+
+        try:
+            # The OpenMP runtime loaded by open3d is limited at run time
+            self.assertIn('libgomp.so.1', limit_threads(1))
+            self.assertTrue(all(os.environ[name] == '1' for name in THREAD_ENVIRONMENT))
+        finally:
+            limit_threads(available_cores())
+
+            for name, value in environment.items():
+                if value is None:
+                    del os.environ[name]
+                else:
+                    os.environ[name] = value
+
+    def test_spawn_environment(self):
+        environment = {name: os.environ.get(name) for name in THREAD_ENVIRONMENT}
+
+        with ProcessPoolExecutor(1, multiprocessing.get_context('spawn')) as pool:
+            with spawn_environment(3):
+                future = pool.submit(os.getenv, 'OPENBLAS_NUM_THREADS')
+
+            # The spawned worker started with the limit, before importing NumPy
+            self.assertEqual(future.result(), '3')
+
+        self.assertEqual({name: os.environ.get(name) for name in THREAD_ENVIRONMENT}, environment)
+
+    def test_batch_thread_policy(self):
+        results = reconstruct_batch(
+            self.files,
+            method_type='open3d',
+            json_filters=self.json_filters,
+            thread_policy='narrow',
+            cores=4
+        )
+
+        # The budget is at most the available cores
+        plan = thread_plan('narrow', core_budget(4), jobs=2)
+
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual([result.threads for result in results], [plan.threads] * 2)
+
+    def test_compare_policies(self):
+        runs = compare_policies(
+            self.files,
+            policies=('narrow', 'wide'),
+            cores=2,
+            method_type='open3d',
+            json_filters=self.json_filters,
+            output_folder=os.path.join(self.temp_folder, 'meshes')
+        )
+
+        expected = [thread_plan(policy, core_budget(2), jobs=2) for policy in ('narrow', 'wide')]
+
+        self.assertEqual(
+            [(run.workers, run.threads) for run in runs],
+            [(plan.workers, plan.threads) for plan in expected]
+        )
+        self.assertEqual(runs[1].workers, 1)
+        self.assertTrue(runs[1].summary().startswith('Thread policy wide: 1 jobs x'))
+        self.assertTrue(
+            all(run.failed == 0 and run.throughput > 0 and run.cpu_time > 0 for run in runs)
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+from surface_reconstruction.point_cloud_io import read_point_cloud
+from surface_reconstruction.server import JobServer, create_http_server, request_json, parse_workers
+import unittest
+import threading
+import signal
+import time
+import tempfile
+import shutil
+import os
+
+
+class JobServerTest(unittest.TestCase):
+
+    filters = {'surface_reconstruction_screened_poisson': {'depth': 6}}
+
+    @classmethod
+    def setUpClass(cls):
+        # The temp folders of the tests are in the output folder
+        cls.job_server = JobServer({'open3d': 1}, output_folder=tempfile.gettempdir()).start()
+        cls.http_server = create_http_server(cls.job_server, port=0)
+        cls.url = f'http://127.0.0.1:{cls.http_server.server_port}'
+
+        cls.thread = threading.Thread(target=cls.http_server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.http_server.shutdown()
+        cls.http_server.server_close()
+        cls.job_server.close()
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'simple_terrain', 'list_vertex.ply')
+        self.temp_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def test_file_job(self):
+        output_file = os.path.join(self.temp_folder, 'terrain.ply')
+
+        job = request_json(f'{self.url}/jobs', 'POST', {
+            'point_cloud_file': self.point_cloud_file,
+            'output_file': output_file,
+            'method_type': 'open3d',
+            'filters': self.filters
+        })
+        self.assertEqual(job['status'], 'queued')
+
+        job = request_json(f'{self.url}/jobs/{job["id"]}?wait=120')
+
+        self.assertEqual(job['status'], 'ok', job['result'])
+        self.assertTrue(os.path.exists(output_file))
+        self.assertIn(
+            'surface_reconstruction_screened_poisson',
+            [stage['name'] for stage in job['result']['stages']]
+        )
+
+    def test_arrays_job(self):
+        data = read_point_cloud(self.point_cloud_file)
+
+        job = request_json(f'{self.url}/jobs', 'POST', {
+            'points': data.points.tolist(),
+            'method_type': 'open3d',
+            'filters': self.filters,
+            'return_mesh': True
+        })
+        job = request_json(f'{self.url}/jobs/{job["id"]}?wait=120')
+
+        self.assertEqual(job['status'], 'ok', job['result'])
+        self.assertGreater(len(job['result']['mesh']['faces']), 0)
+        self.assertEqual(len(job['result']['mesh']['vertices'][0]), 3)
+
+    def test_priority_and_cancel(self):
+        jobs = [
+            self.job_server.submit(
+                'open3d',
+                self.point_cloud_file,
+                os.path.join(self.temp_folder, f'terrain_{index}.ply'),
+                self.filters,
+                priority=priority
+            )
+            for index, priority in enumerate([0, 0, 0, 5])
+        ]
+
+        # The single worker runs the first job, the others wait: cancel one of them
+        cancelled = request_json(f'{self.url}/jobs/{jobs[1].id}', 'DELETE')
+        self.assertEqual(cancelled['status'], 'cancelled')
+
+        for job in jobs:
+            self.job_server.wait(job.id, 120)
+
+        self.assertEqual([job.status for job in jobs], ['ok', 'cancelled', 'ok', 'ok'])
+
+        # The urgent job ran before the earlier queued one
+        self.assertLess(jobs[3].started, jobs[2].started)
+        self.assertEqual(
+            request_json(f'{self.url}/jobs/{jobs[0].id}', 'DELETE')['status_code'], 409
+        )
+
+    def test_metrics(self):
+        metrics = request_json(f'{self.url}/metrics')
+
+        self.assertEqual(metrics['backends']['open3d']['workers'], 1)
+        self.assertIn('throughput', metrics['backends']['open3d'])
+        self.assertIn('queued', metrics)
+
+    def test_invalid_jobs(self):
+        self.assertEqual(
+            request_json(f'{self.url}/jobs', 'POST', {'method_type': 'open3d'})['status_code'], 400
+        )
+        self.assertEqual(
+            request_json(
+                f'{self.url}/jobs',
+                'POST',
+                {'point_cloud_file': self.point_cloud_file, 'method_type': 'pymeshlab'}
+            )['status_code'],
+            400
+        )
+        self.assertEqual(request_json(f'{self.url}/jobs/123456')['status_code'], 404)
+        self.assertEqual(request_json(f'{self.url}/jobs/123456?wait=soon')['status_code'], 400)
+        self.assertEqual(request_json(f'{self.url}/jobs/123456?wait=inf')['status_code'], 400)
+
+    def test_output_folder(self):
+        outside = os.path.join(self.temp_folder, '..', '..', 'terrain.ply')
+
+        self.assertEqual(
+            request_json(f'{self.url}/jobs', 'POST', {
+                'point_cloud_file': self.point_cloud_file,
+                'output_file': outside,
+                'method_type': 'open3d'
+            })['status_code'],
+            400
+        )
+
+        output_folder = os.path.realpath(self.temp_folder)
+        server = JobServer({'open3d': 1}, output_folder=self.temp_folder)
+
+        self.assertEqual(
+            server.output_path('meshes/terrain.ply'),
+            os.path.join(output_folder, 'meshes', 'terrain.ply')
+        )
+        self.assertEqual(
+            server.output_path('', self.point_cloud_file),
+            os.path.join(output_folder, 'list_vertex_mesh.ply')
+        )
+        self.assertRaises(ValueError, server.output_path, '../terrain.ply')
+
+    def test_broken_pool_replaced_once(self):
+        server = JobServer({'open3d': 2}).start()
+        created = []
+        create_pool = server._create_pool
+        server._create_pool = (
+            lambda *args, **options: created.append(args) or create_pool(*args, **options)
+        )
+
+        try:
+            complex_file = os.path.join('../files', 'complex_terrain', 'list_vertex.ply')
+            filters = {'surface_reconstruction_screened_poisson': {'depth': 10}}
+            output_file = os.path.join(self.temp_folder, 'terrain.ply')
+            jobs = [server.submit('open3d', complex_file, output_file, filters) for _ in range(2)]
+
+            while any(job.status == 'queued' for job in jobs):
+                time.sleep(0.01)
+
+            # A crashed worker fails both running jobs of the pool, which is replaced once
+            os.kill(next(iter(server._pools['open3d']._processes)), signal.SIGKILL)
+
+            for job in jobs:
+                server.wait(job.id, 120)
+
+            self.assertEqual([job.status for job in jobs], ['failed', 'failed'])
+            self.assertEqual(created, [])
+
+            # Replaced by the dispatcher, before the next job
+            job = server.submit('open3d', self.point_cloud_file, output_file, self.filters)
+            self.assertEqual(server.wait(job.id, 120).status, 'ok', job.result)
+            self.assertEqual(len(created), 1)
+        finally:
+            server.close()
+
+    def test_default_method_type(self):
+        output_file = os.path.join(self.temp_folder, 'terrain.ply')
+
+        # A job without method type runs on the open3d pool, like the default strategy
+        job = request_json(f'{self.url}/jobs', 'POST', {
+            'point_cloud_file': self.point_cloud_file,
+            'output_file': output_file,
+            'filters': self.filters
+        })
+        self.assertEqual(job['method_type'], 'open3d')
+        self.assertEqual(request_json(f'{self.url}/jobs/{job["id"]}?wait=120')['status'], 'ok')
+
+        self.assertEqual(JobServer({'pymeshlab': 2, 'open3d': 2}).pool_type('default'), 'open3d')
+        self.assertEqual(JobServer({'pymeshlab': 2}).pool_type(''), 'pymeshlab')
+        self.assertEqual(JobServer({'pymeshlab': 2, 'heightfield': 1}).pool_type(''), '')
+
+    def test_parse_workers(self):
+        self.assertEqual(parse_workers(['open3d=4', 'pymeshlab=2']), {'open3d': 4, 'pymeshlab': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
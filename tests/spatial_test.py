@@ -0,0 +1,26 @@
+from surface_reconstruction.spatial import KDTree, neighbor_counts
+import unittest
+import numpy
+
+
+class SpatialTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = numpy.random.default_rng(0)
+        self.points = rng.random((500, 3)) * 10
+        self.queries = rng.random((50, 3)) * 10
+
+    def test_count_within_radius_matches_brute_force(self):
+        radius = 1.5
+        counts = KDTree(self.points).count_within_radius(self.queries, radius, batch_size=16)
+
+        distances = numpy.linalg.norm(self.queries[:, None] - self.points[None], axis=2)
+        numpy.testing.assert_array_equal(counts, numpy.count_nonzero(distances <= radius, axis=1))
+
+    def test_neighbor_counts_layouts(self):
+        # Row splits of the recent open3d versions, and the counts of open3d 0.12
+        numpy.testing.assert_array_equal(neighbor_counts(numpy.array([0, 2, 2, 5]), 3), [2, 0, 3])
+        numpy.testing.assert_array_equal(neighbor_counts(numpy.array([2, 0, 3]), 3), [2, 0, 3])
+
+        with self.assertRaises(ValueError):
+            neighbor_counts(numpy.array([0, 2]), 3)
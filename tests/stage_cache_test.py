@@ -0,0 +1,120 @@
+from surface_reconstruction import Open3dSurface, PyMeshlabSurface
+from surface_reconstruction.point_cloud_io import PointCloudData, read_point_cloud, write_ply
+from surface_reconstruction.result_cache import ResultCache
+import unittest
+import tempfile
+import shutil
+import os
+import numpy
+
+
+class StageCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'simple_terrain', 'list_vertex.ply')
+        self.temp_folder = tempfile.mkdtemp()
+        self.cache = ResultCache(os.path.join(self.temp_folder, 'stages'))
+        self.filters = {
+            'crop': {'max_bound': [60, 10, 30]},
+            'surface_reconstruction_screened_poisson': {'depth': 6},
+            'density_trimming': {'quantile': 0.05},
+            'simplify_mesh': {'reduction': 0.5}
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def stage_names(self, surface) -> list:
+        return [stage.name for stage in surface.profiler.stages]
+
+    def test_open3d_late_stage_change_reuses_earlier_stages(self):
+        surface = Open3dSurface(point_cloud_file=self.point_cloud_file)
+        surface.stage_cache = self.cache
+
+        mesh = surface.poisson_mesh(save_file=False, filters=self.filters)
+        triangles = len(mesh.triangles)
+
+        # crop, estimate_normals, orient_normals_consistent_tangent_plane, Poisson, trimming and
+        # simplification
+        self.assertEqual(self.cache.stats()['entries'], 6)
+        self.assertTrue((surface.point_cloud_arrays().points[:, 0] <= 60).all())
+
+        surface.reset(self.point_cloud_file)
+        mesh = surface.poisson_mesh(
+            save_file=False, filters=dict(self.filters, simplify_mesh={'reduction': 0.25})
+        )
+
+        self.assertEqual(
+            self.stage_names(surface), ['load_file', 'load_cached_stage', 'simplify_mesh']
+        )
+        self.assertAlmostEqual(len(mesh.triangles), triangles / 2, delta=triangles * 0.05)
+
+        # Changing the Poisson depth reuses the point cloud with normals
+        surface.reset(self.point_cloud_file)
+        surface.poisson_mesh(
+            save_file=False,
+            filters=dict(self.filters, surface_reconstruction_screened_poisson={'depth': 5})
+        )
+
+        self.assertEqual(
+            self.stage_names(surface),
+            [
+                'load_file',
+                'load_cached_stage',
+                'surface_reconstruction_screened_poisson',
+                'density_trimming',
+                'simplify_mesh'
+            ]
+        )
+
+    def test_stage_keys_chain(self):
+        surface = Open3dSurface(point_cloud_file=self.point_cloud_file)
+        filters = surface.resolve_filters(filters=self.filters)
+
+        keys = dict(surface.stage_keys(filters))
+        other_crop = dict(surface.stage_keys(dict(filters, crop={'max_bound': [50, 10, 30]})))
+        other_simplify = dict(surface.stage_keys(dict(filters, simplify_mesh={'reduction': 0.1})))
+
+        self.assertEqual(list(keys)[:2], ['crop', 'estimate_normals'])
+        self.assertTrue(all(keys[name] != other_crop[name] for name in keys))
+        self.assertEqual(
+            [name for name in keys if keys[name] != other_simplify[name]], ['simplify_mesh']
+        )
+
+        # The depth chosen at run time: no stage is cached from the auto depth
+        with_budget = dict(surface.stage_keys(dict(filters, auto_depth={'wall_time': 10})))
+        self.assertNotIn('surface_reconstruction_screened_poisson', with_budget)
+        self.assertEqual(
+            with_budget['orient_normals_consistent_tangent_plane'],
+            keys['orient_normals_consistent_tangent_plane']
+        )
+
+    def test_pymeshlab_pipeline(self):
+        # Without colors, so old pymeshlab versions can inject the cached point clouds and meshes
+        data = read_point_cloud(self.point_cloud_file)
+        point_cloud_file = os.path.join(self.temp_folder, 'points.ply')
+        write_ply(point_cloud_file, PointCloudData(points=numpy.array(data.points)))
+
+        filters = dict(self.filters, voxel_downsample={'voxel_size': 2})
+
+        surface = PyMeshlabSurface(point_cloud_file=point_cloud_file)
+        surface.stage_cache = self.cache
+        mesh = surface.poisson_mesh(save_file=False, filters=filters)
+        triangles = mesh.face_number()
+
+        self.assertLess(surface.point_cloud.vertex_number(), len(data))
+
+        surface.reset(point_cloud_file)
+        mesh = surface.poisson_mesh(
+            save_file=False,
+            filters=dict(filters, simplify_mesh={'target_triangles': triangles // 4})
+        )
+
+        self.assertEqual(
+            self.stage_names(surface), ['load_file', 'load_cached_stage', 'simplify_mesh']
+        )
+        self.assertLessEqual(mesh.face_number(), triangles // 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
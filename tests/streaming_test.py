@@ -0,0 +1,83 @@
+from surface_reconstruction.streaming import iter_ply_chunks, stream_point_cloud, VoxelAccumulator
+from surface_reconstruction.point_cloud_io import PointCloudData, parse_ply, write_ply
+from surface_reconstruction.open3d_surface import Open3dSurface
+import unittest
+import tempfile
+import shutil
+import os
+import numpy
+import open3d as o3d
+
+
+class StreamingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'simple_terrain', 'list_vertex.ply')
+        self.temp_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def test_chunks_equal_whole_file(self):
+        data = parse_ply(self.point_cloud_file)
+        binary_file = os.path.join(self.temp_folder, 'binary.ply')
+        write_ply(binary_file, data)
+
+        for file_path in (self.point_cloud_file, binary_file):
+            chunks = list(iter_ply_chunks(file_path, chunk_size=100, block_size=2048))
+
+            self.assertGreater(len(chunks), 1)
+            numpy.testing.assert_allclose(
+                numpy.concatenate([chunk.points for chunk in chunks]), data.points
+            )
+            if data.colors is not None:
+                numpy.testing.assert_array_equal(
+                    numpy.concatenate([chunk.colors for chunk in chunks]), data.colors
+                )
+
+    def test_voxel_downsampling_matches_open3d(self):
+        data = parse_ply(self.point_cloud_file)
+        voxel_size = float(numpy.ptp(data.points, axis=0).max() / 50)
+
+        streamed = stream_point_cloud(self.point_cloud_file, voxel_size=voxel_size, chunk_size=100)
+
+        point_cloud = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(data.points))
+        expected = point_cloud.voxel_down_sample(voxel_size)
+
+        self.assertLess(len(streamed), len(data))
+        # open3d aligns the grid to the minimum bound instead of the origin
+        self.assertAlmostEqual(len(streamed) / len(expected.points), 1, delta=0.1)
+        self.assertTrue(streamed.digest)
+
+    def test_accumulator_means(self):
+        accumulator = VoxelAccumulator(1.0)
+        accumulator.add(PointCloudData(points=numpy.array([[0.1, 0.1, 0.1], [2.5, 0, 0]])))
+        accumulator.add(PointCloudData(points=numpy.array([[0.3, 0.3, 0.3]])))
+
+        result = accumulator.result()
+
+        self.assertEqual(len(result), 2)
+        numpy.testing.assert_allclose(result.points, [[0.2, 0.2, 0.2], [2.5, 0, 0]])
+
+    def test_crop(self):
+        data = parse_ply(self.point_cloud_file)
+        center = data.points.mean(axis=0)
+
+        cropped = stream_point_cloud(self.point_cloud_file, max_bound=center, chunk_size=100)
+
+        self.assertEqual(len(cropped), int(numpy.all(data.points <= center, axis=1).sum()))
+
+    def test_load_data_poisson(self):
+        data = parse_ply(self.point_cloud_file)
+        voxel_size = float(numpy.ptp(data.points, axis=0).max() / 100)
+        output_file = os.path.join(self.temp_folder, 'mesh.ply')
+
+        surface = Open3dSurface(output_file=output_file)
+        surface.load_data(stream_point_cloud(self.point_cloud_file, voxel_size=voxel_size))
+        surface.poisson_mesh(filters={'surface_reconstruction_screened_poisson': {'depth': 6}})
+
+        self.assertTrue(os.path.exists(output_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -44,6 +44,24 @@ class SurfaceReconstructionTest(unittest.TestCase):
         surface_other = SurfaceReconstruction(method_type='otherlibrary')
         self.assertIsInstance(surface_other, OtherLibrarySurface)
 
+    def test_factory_strategy_method_type(self):
+
+        # The registered name, not "default" nor the class name
+        self.assertEqual(SurfaceReconstruction.method_type(Open3dSurface), 'open3d')
+        self.assertEqual(SurfaceReconstruction(method_type='pymeshlab').method_type(), 'pymeshlab')
+
+        class RenamedSurface(SurfaceStrategy):
+
+            def load_file(self, file_path: str):
+                pass
+
+            def poisson_mesh(self, save_file=True, **params: {}):
+                pass
+
+        SurfaceReconstruction.register_type(RenamedSurface, 'renamed_library')
+
+        self.assertEqual(SurfaceReconstruction.method_type(RenamedSurface), 'renamed_library')
+
     def test_factory_strategy_parameters(self):
 
         meshlab_surface: SurfaceStrategy = SurfaceReconstruction(method_type='pymeshlab')
@@ -0,0 +1,117 @@
+from surface_reconstruction.sweep import (
+    grid_combinations,
+    split_stages,
+    build_stage_tree,
+    run_sweep,
+    write_table
+)
+import unittest
+import tempfile
+import shutil
+import csv
+import os
+
+
+class SweepTest(unittest.TestCase):
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'simple_terrain', 'list_vertex.ply')
+        self.temp_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def test_stage_tree_shares_prefixes(self):
+        grid = {
+            'orient_normals_consistent_tangent_plane': {'k': [10, 20]},
+            'surface_reconstruction_screened_poisson': {'depth': [5, 6], 'scale': [1.1, 1.2]}
+        }
+        combinations = grid_combinations(
+            grid, {'estimate_normals': {'fast_normal_computation': False}}
+        )
+        prefix_stages, leaf_stages = split_stages(
+            [
+                'estimate_normals',
+                'orient_normals_consistent_tangent_plane',
+                'auto_depth',
+                'surface_reconstruction_screened_poisson'
+            ]
+        )
+
+        roots, prefixes = build_stage_tree(combinations, prefix_stages)
+
+        self.assertEqual(len(combinations), 8)
+        self.assertEqual(
+            combinations[-1]['surface_reconstruction_screened_poisson'], {'depth': 6, 'scale': 1.2}
+        )
+        self.assertFalse(combinations[0]['estimate_normals']['fast_normal_computation'])
+        self.assertEqual(leaf_stages, ['auto_depth', 'surface_reconstruction_screened_poisson'])
+
+        # A single estimate_normals node, with a child by "k": 2 prefixes shared by 4
+        # combinations each
+        self.assertEqual(len(roots), 1)
+        self.assertEqual(len(next(iter(roots.values())).children), 2)
+        self.assertEqual(len(set(prefixes)), 2)
+        self.assertEqual(prefixes.count(prefixes[0]), 4)
+
+    def test_run_sweep_table(self):
+        grid = {
+            'orient_normals_consistent_tangent_plane': {'k': [10, 20]},
+            'surface_reconstruction_screened_poisson': {'depth': [5, 6]}
+        }
+        table_file = os.path.join(self.temp_folder, 'sweep.csv')
+
+        results = run_sweep(
+            self.point_cloud_file,
+            grid,
+            'open3d',
+            workers=2,
+            output_folder=self.temp_folder,
+            verbose=False
+        )
+        write_table(results, table_file)
+
+        self.assertEqual(len(results), 4)
+        self.assertTrue(
+            all(result.status == 'ok' for result in results), [result.error for result in results]
+        )
+        self.assertTrue(
+            all(
+                result.triangles > 0 and result.chamfer > 0 and 0 < result.within_tolerance <= 1
+                for result in results
+            )
+        )
+        self.assertTrue(all(os.path.exists(result.output_file) for result in results))
+
+        # The combinations with the same "k" share the time of their prefix
+        self.assertEqual(results[0].shared_time, results[1].shared_time)
+        self.assertNotEqual(results[0].shared_time, results[2].shared_time)
+
+        with open(table_file) as file:
+            rows = list(csv.DictReader(file))
+
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[3]['surface_reconstruction_screened_poisson.depth'], '6')
+
+    def test_sibling_normal_stages(self):
+        grid = {
+            'estimate_normals': {'fast_normal_computation': [True, False]},
+            'surface_reconstruction_screened_poisson': {'depth': [5]}
+        }
+
+        results = run_sweep(self.point_cloud_file, grid, 'open3d', workers=1, verbose=False)
+
+        self.assertEqual(len(results), 2)
+        self.assertTrue(
+            all(result.status == 'ok' for result in results), [result.error for result in results]
+        )
+        self.assertTrue(all(result.triangles > 0 for result in results))
+
+    def test_unknown_filter(self):
+        self.assertRaises(
+            ValueError, run_sweep, self.point_cloud_file, {'unknown_filter': {'k': [1]}}, 'open3d'
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
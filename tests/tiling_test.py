@@ -0,0 +1,74 @@
+from surface_reconstruction.tiling import split_tiles, stitch, reconstruct_tiled, boundary_vertices
+from surface_reconstruction.mesh_data import MeshData
+from surface_reconstruction.point_cloud_io import read_point_cloud
+import unittest
+import tempfile
+import shutil
+import os
+import numpy
+
+
+class TilingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.point_cloud_file = os.path.join('../files', 'complex_terrain', 'list_vertex.ply')
+        self.temp_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder)
+
+    def test_split_tiles_cores_cover_all_points(self):
+        points = read_point_cloud(self.point_cloud_file).points
+        tiles = split_tiles(points, tiles=(3, 2), overlap=0.2)
+
+        in_core = numpy.zeros(len(points), dtype=int)
+        for tile in tiles:
+            xy = points[:, :2]
+            in_core += (
+                numpy.all(xy >= tile.core[:2], axis=1) & numpy.all(xy < tile.core[2:], axis=1)
+            )
+
+            tile_xy = xy[tile.point_indices]
+            self.assertTrue(numpy.all(tile_xy >= numpy.maximum(tile.core[:2] - 0.2, -numpy.inf)))
+            self.assertTrue(numpy.all(tile_xy < tile.core[2:] + 0.2))
+
+        self.assertEqual(len(tiles), 6)
+        self.assertTrue(numpy.all(in_core == 1))
+        self.assertGreater(sum(len(tile.point_indices) for tile in tiles), len(points))
+
+    def test_stitch_welds_seam(self):
+        # Two triangle strips side by side, with the seam vertices slightly apart
+        left = MeshData(
+            vertices=numpy.array([[0., 0, 0], [1, 0, 0], [0, 1, 0], [1, 1, 0]]),
+            faces=numpy.array([[0, 1, 2], [1, 3, 2]])
+        )
+        right = MeshData(
+            vertices=numpy.array([[1.01, 0, 0], [2, 0, 0], [1.01, 1, 0], [2, 1, 0]]),
+            faces=numpy.array([[0, 1, 2], [1, 3, 2]])
+        )
+
+        mesh = stitch([left, right], tolerance=0.05)
+
+        self.assertEqual(mesh.vertex_number, 6)
+        self.assertEqual(mesh.face_number, 4)
+        self.assertEqual(len(boundary_vertices(mesh)), 6)
+
+    def test_reconstruct_tiled(self):
+        output_file = os.path.join(self.temp_folder, 'terrain.ply')
+
+        mesh = reconstruct_tiled(
+            self.point_cloud_file,
+            output_file,
+            method_type='open3d',
+            json_filters='{"surface_reconstruction_screened_poisson": {"depth": 6}}',
+            tiles=(2, 2),
+            workers=2
+        )
+
+        self.assertGreater(mesh.face_number, 0)
+        self.assertEqual(mesh.faces.max(), mesh.vertex_number - 1)
+        self.assertTrue(os.path.exists(output_file))
+
+
+if __name__ == '__main__':
+    unittest.main()